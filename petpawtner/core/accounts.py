@@ -0,0 +1,171 @@
+"""
+The signup and signin path.
+Password hashing is CPU bound (PBKDF2 releases the GIL while it runs), so
+the async signup and signin views hand it to a pool of AUTH_HASH_WORKERS
+threads instead of the request thread, and a burst of signups queues
+there rather than on every worker. A new account is logged in with the
+hash it was created with, never hashed a second time. Usernames and
+emails are unique regardless of case through the expression indexes of
+migration 0013_user_unique_ci: a duplicate is an IntegrityError on
+insert instead of two lookups before it.
+SlidingWindow throttles the attempts of an IP and of a username in this
+process, AUTH_THROTTLE_IP and AUTH_THROTTLE_USERNAME are
+(attempts, seconds). Behind AUTH_TRUSTED_PROXIES reverse proxies the IP
+is the one the outermost of them put in X-Forwarded-For, not the peer
+address, which is the proxy itself.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import transaction
+
+from .models import Profile
+
+User = get_user_model()
+
+
+THROTTLE_MAX_KEYS = 100_000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class Throttled(Exception):
+    pass
+
+
+def hash_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix='password-hash')
+        return _executor
+
+
+async def offload(func, *args):
+    """
+    Run a hashing function on the hash pool without blocking the event loop
+    """
+    return await asyncio.get_running_loop().run_in_executor(hash_executor(), func, *args)
+
+
+class SlidingWindow:
+    """
+    At most `attempts` hits per key in any `seconds`, as configured by the
+    setting named `setting`, counted in this process
+    """
+    def __init__(self, setting):
+        self.setting = setting
+        self.hits = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        attempts, seconds = getattr(settings, self.setting)
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            hits = self.hits.get(key)
+            if hits is None:
+                if len(self.hits) >= THROTTLE_MAX_KEYS:
+                    self.prune(now - seconds)
+                hits = self.hits[key] = deque()
+            while hits and hits[0] <= now - seconds:
+                hits.popleft()
+            if len(hits) >= attempts:
+                return False
+            hits.append(now)
+            return True
+
+    def prune(self, since):
+        for key in [key for key, hits in self.hits.items() if not hits or hits[-1] <= since]:
+            del self.hits[key]
+
+    def clear(self):
+        with self.lock:
+            self.hits.clear()
+
+
+ip_throttle = SlidingWindow('AUTH_THROTTLE_IP')
+username_throttle = SlidingWindow('AUTH_THROTTLE_USERNAME')
+
+
+def client_ip(request):
+    """
+    The address of the client, read from the X-Forwarded-For hops added by
+    the trusted proxies: the ones further left were sent by the client and
+    can be forged
+    """
+    hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    if not settings.AUTH_TRUSTED_PROXIES or not hops:
+        return request.META.get('REMOTE_ADDR')
+    return hops[-min(settings.AUTH_TRUSTED_PROXIES, len(hops))]
+
+
+def check_throttle(request, username):
+    """
+    Count an attempt of the client and of the username, raise Throttled
+    when either is over its window
+    """
+    if not ip_throttle.allow(client_ip(request)):
+        raise Throttled
+    if username and not username_throttle.allow(username.lower()):
+        raise Throttled
+
+
+def create_account(username, email, encoded_password):
+    """
+    Create a user with an already hashed password and its profile,
+    IntegrityError when the username or the email is taken
+    """
+    with transaction.atomic():
+        user = User(
+            username=User.normalize_username(username),
+            email=User.objects.normalize_email(email),
+            password=encoded_password,
+        )
+        user.save()
+        Profile.objects.create(user=user)
+    return user
+
+
+def taken_field(username):
+    # Only asked after a failed insert
+    return 'username' if User.objects.filter(username__iexact=username).exists() else 'email'
+
+
+async def signup(username, email, password):
+    return await sync_to_async(create_account)(username, email, await offload(make_password, password))
+
+
+def find_user(username):
+    try:
+        return User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        return None
+
+
+async def authenticate(username, password):
+    """
+    The active user with these credentials or None, checked as
+    ModelBackend does but with the hashing on the hash pool
+    """
+    user = await sync_to_async(find_user)(username)
+    if user is None:
+        # Unknown usernames take as long as wrong passwords
+        await offload(make_password, password)
+        return None
+
+    outdated = []
+    if not await offload(check_password, password, user.password, outdated.append):
+        return None
+    if outdated:
+        # The password was hashed with older hasher settings
+        user.password = await offload(make_password, password)
+        await sync_to_async(user.save)(update_fields=['password'])
+    return user if user.is_active else None
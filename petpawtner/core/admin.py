@@ -1,11 +1,28 @@
 from django.contrib import admin
 from .models import Profile, Pet, Vet, Post, Like
 
+
+class ProfileAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+
+
+class PetAdmin(admin.ModelAdmin):
+    list_select_related = ('owner__user',)
+
+
+class VetAdmin(admin.ModelAdmin):
+    list_select_related = ('profile__user',)
+
+
+class PostAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+
+
 """
 Register the Profile model to the admin site
 """
-admin.site.register(Profile)
-admin.site.register(Pet)
-admin.site.register(Vet)
-admin.site.register(Post)
+admin.site.register(Profile, ProfileAdmin)
+admin.site.register(Pet, PetAdmin)
+admin.site.register(Vet, VetAdmin)
+admin.site.register(Post, PostAdmin)
 admin.site.register(Like)
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect the signal handlers of the app
+        from . import signals
+        post_migrate.connect(signals.setup_search_index, sender=self)
+
+        from . import database
+        connection_created.connect(database.configure_connection)
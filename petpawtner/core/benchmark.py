@@ -0,0 +1,93 @@
+"""
+Endpoint benchmarks, run by the benchmark management command.
+Every endpoint is requested through the test client: first a timed pass
+for the latency percentiles, then a short pass under tracemalloc and
+query capture for the peak memory and queries per request, since both
+slow requests down and would skew the timings.
+"""
+import math
+import statistics
+import time
+import tracemalloc
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+MEMORY_REQUESTS = 5
+WARMUP_REQUESTS = 3
+# Metrics compared against a baseline and the share of the tolerance
+# they get, the tail is noisier. Queries must not grow at all.
+TOLERANCE_SCALE = {'p50_ms': 1, 'p99_ms': 2, 'peak_kib': 1}
+
+
+def endpoints(username):
+    """
+    The benchmarked requests, as the heaviest user of a generated dataset.
+    Only reads: a request that writes would change the data it is timed on.
+    """
+    return {
+        'home': reverse('home'),
+        'profile': reverse('profile', args=[username]),
+        'search': f"{reverse('search')}?q=Terrier",
+    }
+
+
+def percentile(timings, share):
+    ordered = sorted(timings)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def measure(client, path, requests, using=DEFAULT_DB_ALIAS):
+    """
+    Return the p50 and p99 latency in ms, the queries per request
+    and the peak memory in KiB of a request to path
+    """
+    for _ in range(WARMUP_REQUESTS):
+        client.get(path)
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} answered {response.status_code}')
+
+    queries = []
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(MEMORY_REQUESTS):
+            tracemalloc.reset_peak()
+            with CaptureQueriesContext(connections[using]) as captured:
+                client.get(path)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            queries.append(len(captured))
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(timings), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'queries': max(queries),
+        'peak_kib': round(max(peaks), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return a line per metric that got worse than the baseline allows
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {expected['queries']}")
+        for metric, scale in TOLERANCE_SCALE.items():
+            if result[metric] > expected[metric] * (1 + tolerance * scale):
+                regressions.append(f'{name}: {metric} {result[metric]}, baseline {expected[metric]}')
+    return regressions
@@ -0,0 +1,24 @@
+"""
+Per-connection database tuning.
+SQLite reads its tuning from PRAGMA statements run on every new
+connection, there is no server to configure. busy_timeout makes a
+writer wait for the lock instead of failing with "database is locked"
+and synchronous=NORMAL syncs less often. WAL, which lets readers run
+alongside the single writer, is only set with SQLITE_JOURNAL_MODE: the
+journal mode is written into the database file and outlives the
+connection.
+"""
+from django.conf import settings
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    Apply SQLITE_PRAGMAS to a new SQLite connection, connected to the
+    connection_created signal by CoreConfig.ready
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,339 @@
+"""
+Bulk generated datasets for benchmarks and staging, see the seed command.
+Users, profiles, pets and vets come first, from the Random seeded with
+the seed. Posts with their likes and messages follow in chunks of
+CHUNK_POSTS posts, each from its own Random seeded with the seed and the
+chunk number, so chunks can be written by parallel worker processes and
+the same arguments always give the same rows whatever the number of
+workers. Follows are drawn next, then once every post exists the home
+timelines are written as rebuild() in core/timelines.py would, so the
+home page reads timelines as it does in production. Users, profiles,
+pets and vets are written with bulk_create, which hands back the primary
+keys the chunks need; follows, posts, likes, messages and timeline
+entries, the bulk of the rows, go through insert(), a raw executemany in
+batches. The denormalized counters are computed while generating, so
+the dataset is consistent without replaying signals.
+Authors and followees follow a Zipf distribution: a few users write most
+posts and have most followers, like on a real network, so some profiles
+are much heavier than others.
+"""
+import multiprocessing
+import random
+import uuid
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import search
+from .models import Follow, Like, Message, Pet, Post, Profile, TimelineEntry, Vet
+from .pagination import keyset
+
+
+PASSWORD = 'petpawtner'
+BATCH_SIZE = 2000
+CHUNK_POSTS = 10_000
+USERS_PER_POST = 0.05
+LIKES_PER_POST = 5
+MESSAGES_PER_POST = 1
+FOLLOWS_PER_USER = 20
+VET_SHARE = 0.1
+UNREAD_SHARE = 0.1
+WORKER_BUSY_TIMEOUT = 600_000
+
+BREEDS = ['Beagle', 'Terrier', 'Labrador', 'Poodle', 'Bulldog', 'Husky', 'Persian', 'Siamese', 'Collie', 'Boxer']
+LOCATIONS = ['Lagos', 'Abuja', 'Nairobi', 'Accra', 'Kigali', 'Cairo', 'London', 'Berlin']
+WORDS = ['walk', 'park', 'nap', 'treat', 'vet', 'groom', 'play', 'ball', 'bath', 'friend', 'run', 'beach']
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def zipf_weights(users):
+    # Cumulative weights over the users, user0 weighs the most
+    return list(accumulate(1 / (rank + 1) ** 1.1 for rank in range(users)))
+
+
+def draw_follows(users, seed):
+    """
+    The indexes of the users each user follows, about FOLLOWS_PER_USER
+    each, drawn towards the heavy users
+    """
+    rng = random.Random(f'{seed}-follows')
+    cum_weights = zipf_weights(users)
+    following = []
+    for follower in range(users):
+        wanted = min(users - 1, int(rng.expovariate(1 / FOLLOWS_PER_USER)))
+        followees = set()
+        while len(followees) < wanted:
+            followees.update(rng.choices(range(users), cum_weights=cum_weights, k=wanted - len(followees)))
+            followees.discard(follower)
+        following.append(sorted(followees))
+    return following
+
+
+def write_timelines(profiles, following, using, batch_size):
+    """
+    Write the timeline of every profile: the latest TIMELINE_LENGTH posts
+    of itself and of the profiles it follows, celebrities aside. Returns
+    the number of entries written.
+    """
+    written = 0
+    with transaction.atomic(using=using):
+        for profile, followees in zip(profiles, following):
+            authors = [profile.user_id] + [
+                profiles[followee].user_id for followee in followees
+                if profiles[followee].follower_count < settings.TIMELINE_CELEBRITY_FOLLOWERS
+            ]
+            posts = keyset(Post.objects.using(using).filter(user_id__in=authors), 'created_at')
+            entries = [
+                (profile.pk, pk, user_id, created_at)
+                for pk, user_id, created_at in posts.values_list('pk', 'user_id', 'created_at')[:settings.TIMELINE_LENGTH]
+            ]
+            insert(TimelineEntry, ('owner', 'post', 'author', 'created_at'), entries, using, batch_size)
+            written += len(entries)
+    return written
+
+
+def insert(model, names, rows, using, batch_size):
+    """
+    INSERT rows, tuples of the values of the fields named, with
+    executemany. bulk_create builds a model instance and compiles every
+    value, which is most of the time spent on millions of rows. The
+    other fields get their default, the primary key when not named is
+    left to the database.
+    """
+    connection = connections[using]
+    given = [model._meta.get_field(name) for name in names]
+    defaults = [
+        field for field in model._meta.concrete_fields
+        if field not in given and not field.primary_key
+    ]
+    default_values = tuple(field.get_db_prep_save(field.get_default(), connection) for field in defaults)
+    # Only these need adapting to the backend, ints and strings pass as is
+    adapted = [
+        (index, field) for index, field in enumerate(given)
+        if (field.target_field if field.is_relation else field).get_internal_type()
+        in ('UUIDField', 'DateTimeField', 'JSONField')
+    ]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in given + defaults)
+    placeholders = ', '.join(['%s'] * (len(given) + len(defaults)))
+    sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+
+    with connection.cursor() as cursor:
+        for batch in batches(rows, batch_size):
+            params = []
+            for row in batch:
+                if adapted:
+                    row = list(row)
+                    for index, field in adapted:
+                        row[index] = field.get_db_prep_save(row[index], connection)
+                params.append((*row, *default_values))
+            cursor.executemany(sql, params)
+
+
+class Chunk:
+    """
+    The posts, likes and messages of one chunk. Run in a worker process,
+    it only receives plain values and returns the counters it moved,
+    indexed like user_pks. Each batch is its own transaction so parallel
+    writers only wait on each other for a batch.
+    """
+    def __init__(self, number, posts, seed, user_pks, profile_pks, using, batch_size):
+        self.number = number
+        self.posts = posts
+        self.seed = seed
+        self.user_pks = user_pks
+        self.profile_pks = profile_pks
+        self.using = using
+        self.batch_size = batch_size
+
+    def __call__(self):
+        rng = random.Random(f'{self.seed}-{self.number}')
+        users = len(self.user_pks)
+        # user0 writes the most
+        cum_weights = zipf_weights(users)
+        now = timezone.now()
+        counters = {
+            'post_count': [0] * users,
+            'likes_received': [0] * users,
+            'unread_messages': [0] * users,
+        }
+        created = {'posts': 0, 'likes': 0, 'messages': 0}
+
+        authors = rng.choices(range(users), cum_weights=cum_weights, k=self.posts)
+        for batch in batches(authors, self.batch_size):
+            new_posts = []
+            new_likes = []
+            for author in batch:
+                post_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+                likers = rng.sample(range(users), min(users, int(rng.expovariate(1 / LIKES_PER_POST))))
+                new_posts.append((
+                    post_id,
+                    self.user_pks[author],
+                    sentence(rng),
+                    'post_images/sdog.png',
+                    len(likers),
+                    now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                ))
+                new_likes.extend((post_id, self.user_pks[liker]) for liker in likers)
+                counters['post_count'][author] += 1
+                counters['likes_received'][author] += len(likers)
+            with transaction.atomic(using=self.using):
+                insert(Post, ('id', 'user', 'caption', 'image', 'no_of_likes', 'created_at'), new_posts, self.using, self.batch_size)
+                insert(Like, ('post', 'user'), new_likes, self.using, len(new_likes) or 1)
+            created['posts'] += len(new_posts)
+            created['likes'] += len(new_likes)
+
+        for batch in batches(range(self.posts * MESSAGES_PER_POST), self.batch_size):
+            new_messages = []
+            for _ in batch:
+                sender, receiver = rng.sample(range(users), 2)
+                is_read = rng.random() >= UNREAD_SHARE
+                counters['unread_messages'][receiver] += not is_read
+                new_messages.append((
+                    self.profile_pks[sender], self.profile_pks[receiver], sentence(rng), is_read, now,
+                ))
+            with transaction.atomic(using=self.using):
+                insert(Message, ('sender', 'receiver', 'content', 'is_read', 'timestamp'), new_messages, self.using, self.batch_size)
+            created['messages'] += len(new_messages)
+        return created, counters
+
+
+def run_chunk(chunk):
+    connection = connections[chunk.using]
+    if connection.vendor == 'sqlite':
+        # Workers take turns on the single SQLite writer lock, they are
+        # expected to wait for it longer than requests should
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA busy_timeout = {WORKER_BUSY_TIMEOUT}')
+    try:
+        return chunk()
+    finally:
+        connections.close_all()
+
+
+def generate(posts, seed=0, using=DEFAULT_DB_ALIAS, batch_size=BATCH_SIZE, workers=1, password=PASSWORD):
+    """
+    Create about posts * USERS_PER_POST users with their profiles, pets,
+    vets and follows, then the posts, their likes and messages, in worker
+    processes when workers > 1, and last the home timelines. Returns the
+    number of rows created per model.
+    """
+    rng = random.Random(seed)
+    user_count = max(10, int(posts * USERS_PER_POST))
+    # Hashed once, hashing per user would dominate the run
+    password = make_password(password, salt='fixtures')
+    created = {}
+
+    with transaction.atomic(using=using):
+        users = User.objects.using(using).bulk_create(
+            (User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(user_count)),
+            batch_size=batch_size,
+        )
+        pets = [1 + int(rng.expovariate(1)) for _ in range(user_count)]
+        profiles = Profile.objects.using(using).bulk_create(
+            (
+                Profile(
+                    user_id=user.pk,
+                    bio=sentence(rng, 12),
+                    location=rng.choice(LOCATIONS),
+                    role='vet' if rng.random() < VET_SHARE else 'owner',
+                    pet_count=pets[i],
+                )
+                for i, user in enumerate(users)
+            ),
+            batch_size=batch_size,
+        )
+        created['users'] = created['profiles'] = len(users)
+
+        created['vets'] = len(Vet.objects.using(using).bulk_create(
+            (
+                Vet(
+                    profile_id=profile.pk,
+                    clinic_name=f'{rng.choice(LOCATIONS)} Pet Clinic',
+                    specialty=f'{rng.choice(BREEDS)} care',
+                    years_of_experience=rng.randrange(1, 30),
+                    location=profile.location,
+                )
+                for profile in profiles if profile.role == 'vet'
+            ),
+            batch_size=batch_size,
+        ))
+        created['pets'] = len(Pet.objects.using(using).bulk_create(
+            (
+                Pet(
+                    owner_id=profile.pk,
+                    name=f'Pet {i}-{n}',
+                    breed=rng.choice(BREEDS),
+                    age=str(rng.randrange(1, 15)),
+                    bio=sentence(rng),
+                    location=profile.location,
+                )
+                for i, profile in enumerate(profiles) for n in range(pets[i])
+            ),
+            batch_size=batch_size,
+        ))
+
+        following = draw_follows(user_count, seed)
+        now = timezone.now()
+        insert(
+            Follow, ('follower', 'followee', 'created_at'),
+            (
+                (profiles[follower].pk, profiles[followee].pk, now)
+                for follower, followees in enumerate(following) for followee in followees
+            ),
+            using, batch_size,
+        )
+        for follower, followees in enumerate(following):
+            profiles[follower].following_count = len(followees)
+            for followee in followees:
+                profiles[followee].follower_count += 1
+        created['follows'] = sum(map(len, following))
+
+    user_pks = [user.pk for user in users]
+    profile_pks = [profile.pk for profile in profiles]
+    chunks = [
+        Chunk(number, min(CHUNK_POSTS, posts - start), seed, user_pks, profile_pks, using, batch_size)
+        for number, start in enumerate(range(0, posts, CHUNK_POSTS))
+    ]
+    if workers > 1:
+        # Forked workers must not share the connections of this process
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.map(run_chunk, chunks, chunksize=1)
+    else:
+        results = [chunk() for chunk in chunks]
+
+    for name in ('posts', 'likes', 'messages'):
+        created[name] = sum(result[name] for result, _ in results)
+    for field in ('post_count', 'likes_received', 'unread_messages'):
+        totals = [sum(values) for values in zip(*(counters[field] for _, counters in results))]
+        for profile, total in zip(profiles, totals):
+            setattr(profile, field, total)
+    Profile.objects.using(using).bulk_update(
+        profiles, ['post_count', 'likes_received', 'unread_messages', 'follower_count', 'following_count'],
+        batch_size=batch_size,
+    )
+    created['timeline entries'] = write_timelines(profiles, following, using, batch_size)
+
+    # bulk_create skips the signals that keep the search index
+    for kind in search.SEARCHABLE.values():
+        search.rebuild(kind, using)
+    return created
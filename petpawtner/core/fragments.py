@@ -0,0 +1,53 @@
+"""
+Cached post card fragments for the home feed.
+A card only depends on its post, so its rendered HTML is cached under
+the post id and Post.version. Every write that changes a card moves the
+version (likes in services.toggle_like, edits in the Post pre_save hook,
+new image variants in images.process), which makes the old entry
+unreachable; it then simply expires with the TIMEOUT of the cache. A
+page of cards costs one get_many and, for the misses only, a template
+render and one set_many.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+
+CARD_TEMPLATE = 'partials/post_card.html'
+
+
+def fragment_cache():
+    """
+    Return the cache holding the fragments, settings.FRAGMENT_CACHE names
+    its alias in settings.CACHES
+    """
+    return caches[getattr(settings, 'FRAGMENT_CACHE', 'default')]
+
+
+def card_key(post):
+    return f'post-card:{post.pk}:{post.version}'
+
+
+def render_post_cards(posts):
+    """
+    Return the HTML of every post card in order, rendering and caching
+    only those missing from the cache
+    """
+    cache = fragment_cache()
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys) if keys else {}
+
+    cards = []
+    rendered = {}
+    template = None
+    for post, key in zip(posts, keys):
+        html = cached.get(key)
+        if html is None:
+            template = template or get_template(CARD_TEMPLATE)
+            html = rendered[key] = template.render({'post': post})
+        cards.append(mark_safe(html))
+
+    if rendered:
+        cache.set_many(rendered)
+    return cards
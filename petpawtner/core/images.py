@@ -0,0 +1,150 @@
+"""
+Image pipeline for uploads.
+After an image is saved the row is handed to a local thread pool which
+writes resized JPEG and WebP variants without metadata next to the
+original and records them on the row (see models.ImageVariantsMixin),
+so the upload request never waits for the resizing and templates can
+serve srcset thumbnails.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from .models import Blob
+
+logger = logging.getLogger(__name__)
+
+
+VARIANT_WIDTHS = (320, 640, 1080)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_executor = None
+
+
+def _encode(image, fmt, quality):
+    buffer = BytesIO()
+    # No exif or icc_profile is passed, so the variants carry no metadata
+    image.save(buffer, format=fmt, quality=quality, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(field_file):
+    """
+    Write the resized variants of an image file and return its
+    width, height and the variants list
+    """
+    storage = field_file.storage
+    stem, _ = os.path.splitext(field_file.name)
+    directory, basename = os.path.split(stem)
+
+    with field_file.open('rb') as handle:
+        with Image.open(handle) as original:
+            original = ImageOps.exif_transpose(original)
+            width, height = original.size
+            image = original.convert('RGB')
+
+    variants = []
+    for target in VARIANT_WIDTHS:
+        if target >= width and variants:
+            break
+        resized = image
+        if target < width:
+            resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+        variant_width = min(target, width)
+        base = os.path.join(directory, 'variants', f'{basename}_{variant_width}')
+        jpeg = storage.save(f'{base}.jpg', _encode(resized, 'JPEG', JPEG_QUALITY))
+        webp = storage.save(f'{base}.webp', _encode(resized, 'WEBP', WEBP_QUALITY))
+        variants.append({'width': variant_width, 'jpeg': jpeg, 'webp': webp})
+    return width, height, variants
+
+
+def process(model_label, pk):
+    """
+    Render the variants of one row and record them, unless its image
+    changed again in the meantime
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not instance.needs_variants():
+        return
+
+    field = getattr(instance, model.variants_field)
+    blob = Blob.objects.filter(name=field.name).first()
+    if blob is not None and blob.variants:
+        # Byte-identical upload, reuse what was rendered the first time
+        width, height, variants = blob.variants['width'], blob.variants['height'], blob.variants['variants']
+    elif field.storage.exists(field.name):
+        width, height, variants = render_variants(field)
+        if blob is not None:
+            Blob.objects.filter(pk=blob.pk).update(
+                variants={'width': width, 'height': height, 'variants': variants}
+            )
+    else:
+        return
+
+    updates = {
+        'image_width': width,
+        'image_height': height,
+        'image_variants': {'source': field.name, 'variants': variants},
+    }
+    if hasattr(model, 'version'):
+        # The srcsets are part of the cached post card
+        updates['version'] = F('version') + 1
+    model.objects.filter(pk=pk, **{model.variants_field: field.name}).update(**updates)
+
+
+def _run(model_label, pk):
+    try:
+        process(model_label, pk)
+    except Exception:
+        # An unreadable upload must not fail the request or kill a worker
+        logger.exception('Could not render image variants of %s %s', model_label, pk)
+
+
+def _run_in_worker(model_label, pk):
+    try:
+        _run(model_label, pk)
+    finally:
+        # Worker threads own their connections, do not leak them
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def schedule(instance):
+    """
+    Queue the variants of a saved instance once its transaction commits.
+    With settings.IMAGE_WORKERS = 0 they are rendered inline instead.
+    """
+    name = getattr(instance, instance.variants_field).name
+    # Saving the same instance twice in a request queues it once
+    if getattr(instance, '_variants_scheduled', None) == name:
+        return
+    instance._variants_scheduled = name
+    model_label = instance._meta.label
+    pk = instance.pk
+
+    def submit():
+        if getattr(settings, 'IMAGE_WORKERS', 2) == 0:
+            _run(model_label, pk)
+        else:
+            get_executor().submit(_run_in_worker, model_label, pk)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ArchivedMessage, Message
+
+FIELDS = ('id', 'sender_id', 'receiver_id', 'content', 'timestamp', 'is_read')
+
+
+class Command(BaseCommand):
+    """
+    Move old read messages out of the live Message table, so its indexes
+    stay small enough to be cached. Messages are walked in primary key
+    order, which follows their timestamps, and moved in batches into
+    ArchivedMessage or appended to a gzip compressed JSONL file.
+
+    Every batch is its own unit of work: into the table it is one
+    transaction, into a file it is one gzip member recorded in a
+    checkpoint before its rows are deleted. An interrupted run is resumed
+    by running the command again. Unread messages stay, they still count
+    towards Profile.unread_messages.
+    """
+    help = 'Move read messages older than --days into the archive table or a JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--output',
+            help='Append to this .jsonl.gz file instead of the ArchivedMessage table',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['output']:
+            archive = FileArchive(options['output'])
+        else:
+            archive = TableArchive()
+
+        moved = 0
+        for batch in self.batches(cutoff, options['batch_size']):
+            archive.store(batch)
+            moved += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'{moved} message(s) archived'))
+
+    def batches(self, cutoff, batch_size):
+        """
+        Yield lists of old read messages. The walk is a primary key range
+        scan that stops at the first message newer than the cutoff.
+        """
+        last_pk = 0
+        while True:
+            rows = list(
+                Message.objects.filter(pk__gt=last_pk).order_by('pk').values(*FIELDS)[:batch_size]
+            )
+            if not rows:
+                return
+            last_pk = rows[-1]['id']
+            batch = []
+            for row in rows:
+                if row['timestamp'] >= cutoff:
+                    if batch:
+                        yield batch
+                    return
+                if row['is_read']:
+                    batch.append(row)
+            if batch:
+                yield batch
+
+
+class TableArchive:
+    """
+    Copy a batch into ArchivedMessage and delete it in one transaction
+    """
+    def store(self, batch):
+        with transaction.atomic():
+            ArchivedMessage.objects.bulk_create(
+                [ArchivedMessage(**row) for row in batch],
+                ignore_conflicts=True,
+            )
+            Message.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+
+
+class FileArchive:
+    """
+    Append batches to a gzip JSONL file, one gzip member per batch.
+    The checkpoint next to the file holds its committed length and the
+    ids of the batch being deleted, so resuming first drops a partially
+    written member and finishes deleting the last written batch.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = f'{path}.checkpoint'
+        checkpoint = self.read_checkpoint()
+
+        with open(self.path, 'ab') as handle:
+            handle.truncate(checkpoint['offset'])
+        self.offset = checkpoint['offset']
+        if checkpoint['pending']:
+            self.delete(checkpoint['pending'])
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            return {'offset': size, 'pending': []}
+        with open(self.checkpoint_path) as handle:
+            return json.load(handle)
+
+    def write_checkpoint(self, pending):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'offset': self.offset, 'pending': pending}, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.checkpoint_path)
+
+    def delete(self, pks):
+        Message.objects.filter(pk__in=pks).delete()
+        self.write_checkpoint([])
+
+    def store(self, batch):
+        lines = ''.join(
+            json.dumps({**row, 'timestamp': row['timestamp'].isoformat()}) + '\n'
+            for row in batch
+        )
+        with open(self.path, 'ab') as handle:
+            handle.write(gzip.compress(lines.encode()))
+            handle.flush()
+            os.fsync(handle.fileno())
+            self.offset = handle.tell()
+        pks = [row['id'] for row in batch]
+        self.write_checkpoint(pks)
+        self.delete(pks)
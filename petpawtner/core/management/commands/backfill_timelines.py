@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import timelines
+from core.models import Profile
+
+
+class Command(BaseCommand):
+    """
+    Rebuild home timelines from the follow graph: every profile, or those
+    of --username, gets the latest posts of itself and of the profiles it
+    follows. Needed once for the posts written before timelines existed,
+    for rows inserted without signals (seed) and after failed fan-outs.
+    """
+    help = 'Rebuild the home timelines of every profile, or of --username'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', action='append', help='Only rebuild this user, can be repeated')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        profiles = Profile.objects.order_by('pk')
+        if options['username']:
+            profiles = profiles.filter(user__username__in=options['username'])
+
+        rebuilt = entries = 0
+        last_pk = 0
+        while True:
+            batch = list(profiles.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for profile in batch:
+                entries += timelines.rebuild(profile)
+                rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timeline(s) with {entries} post(s)'))
@@ -0,0 +1,89 @@
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, override_settings
+
+from core import benchmark, fixtures
+
+# The heaviest author of a generated dataset
+USERNAME = 'user0'
+
+
+class Command(BaseCommand):
+    """
+    Benchmark home, profile and search on a generated dataset.
+    The dataset lives in its own database, created like the test runner
+    creates one and named after its size, so --keepdb reuses it.
+    Results can be saved as the baseline of that size and later runs
+    compared to it with --compare, which fails on a regression.
+    """
+    help = 'Measure latency, queries and memory of the core endpoints on a generated dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=100, help='Timed requests per endpoint')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the dataset for the next run')
+        parser.add_argument('--host', default='localhost', help='A host allowed by ALLOWED_HOSTS')
+        parser.add_argument('--baseline', help='Baseline file, benchmarks/baseline-<posts>.json by default')
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--compare', action='store_true', help='Fail when a metric regressed')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown, doubled for p99')
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1 or options['requests'] < 1:
+            raise CommandError('--posts and --requests must be positive')
+        path = options['baseline'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f"baseline-{options['posts']}.json",
+        )
+        if options['compare'] and not os.path.exists(path):
+            raise CommandError(f'No baseline at {path}, run with --save-baseline first')
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.settings_dict['TEST']['NAME'] = f"benchmark_{options['posts']}"
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Replicas hold the real data, not the dataset
+            with override_settings(DATABASE_REPLICAS=[]):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        self.report(results)
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f'Baseline saved to {path}')
+        if options['compare']:
+            with open(path) as handle:
+                regressions = benchmark.compare(results, json.load(handle), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regression against the baseline'))
+
+    def run(self, options):
+        if not User.objects.filter(username=USERNAME).exists():
+            self.stdout.write(f"Generating a dataset of {options['posts']} posts")
+            created = fixtures.generate(options['posts'], seed=options['seed'])
+            self.stdout.write(', '.join(f'{count} {name}' for name, count in created.items()))
+
+        client = Client(HTTP_HOST=options['host'])
+        client.force_login(User.objects.get(username=USERNAME))
+        return {
+            name: benchmark.measure(client, path, options['requests'])
+            for name, path in benchmark.endpoints(USERNAME).items()
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'endpoint':<12}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}{'peak KiB':>12}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<12}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+                f"{result['queries']:>10}{result['peak_kib']:>12}"
+            )
@@ -0,0 +1,147 @@
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+from core.models import Post, Profile
+
+USERNAME = 'benchmark'
+
+
+class Command(BaseCommand):
+    """
+    Measure the throughput of the like and feed endpoints against the
+    configured database. Requests go through the WSGI handler, so every
+    request opens or reuses its connection as configured (CONN_MAX_AGE,
+    health checks, pragmas). Run it once per configuration and compare, e.g.
+
+        CONN_MAX_AGE=0 python manage.py benchmark_db
+        python manage.py benchmark_db
+        DATABASE_ENGINE=postgresql python manage.py benchmark_db
+    """
+    help = 'Measure requests per second of the like and feed endpoints on the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--posts', type=int, default=100, help='Posts created when there are none')
+        parser.add_argument('--host', default='localhost', help='A host allowed by ALLOWED_HOSTS')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests and --threads must be positive')
+        self.host = options['host']
+        user = self.benchmark_user(options['posts'])
+        self.cookie, self.csrf_token = self.session_cookie(user)
+        self.factory = RequestFactory()
+        self.handler = WSGIHandler()
+        post_ids = [str(pk) for pk in Post.objects.values_list('pk', flat=True)[:options['posts']]]
+
+        self.stdout.write(self.describe())
+        endpoints = [
+            ('feed', lambda i: self.factory.get(reverse('feed'))),
+            ('like', lambda i: self.factory.post(reverse('like'), {'post_id': post_ids[i % len(post_ids)]})),
+        ]
+        for name, build in endpoints:
+            elapsed, errors = self.run(build, options['requests'], options['threads'])
+            self.stdout.write(
+                f'{name}: {options["requests"]} requests in {elapsed:.2f}s, '
+                f'{options["requests"] / elapsed:.1f} req/s, {errors} error(s)'
+            )
+        connection.close()
+
+    def benchmark_user(self, posts):
+        user, created = User.objects.get_or_create(username=USERNAME)
+        if created:
+            user.set_unusable_password()
+            user.save()
+            Profile.objects.create(user=user)
+        if not Post.objects.exists():
+            now = timezone.now()
+            Post.objects.bulk_create(
+                Post(user=user, caption=f'Benchmark post {i}', image='post_images/sdog.png', created_at=now)
+                for i in range(posts)
+            )
+        return user
+
+    def session_cookie(self, user):
+        """
+        A session logging the benchmark user in and a CSRF token
+        """
+        store = import_string(f'{settings.SESSION_ENGINE}.SessionStore')()
+        store[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        csrf_token = get_random_string(32)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={store.session_key}; {settings.CSRF_COOKIE_NAME}={csrf_token}'
+        return cookie, csrf_token
+
+    def describe(self):
+        database = connection.settings_dict
+        line = f"{connection.vendor} {database['NAME']}, CONN_MAX_AGE={database['CONN_MAX_AGE']}"
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute('PRAGMA synchronous')
+                synchronous = cursor.fetchone()[0]
+            line += f', journal_mode={journal_mode}, synchronous={synchronous}'
+        return line
+
+    def request(self, request):
+        """
+        Send one request through the WSGI handler, return its status code
+        """
+        environ = request.environ
+        environ['HTTP_HOST'] = self.host
+        environ['HTTP_COOKIE'] = self.cookie
+        environ['HTTP_X_CSRFTOKEN'] = self.csrf_token
+        environ['wsgi.input'] = BytesIO(environ['wsgi.input'].read())
+        status = []
+        response = self.handler(environ, lambda code, headers: status.append(code))
+        for _ in response:
+            pass
+        response.close()
+        return int(status[0].split()[0])
+
+    def run(self, build, count, threads):
+        """
+        Send count requests from threads workers, return the elapsed time
+        and the number of failed requests
+        """
+        errors = []
+        counter = iter(range(count))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                try:
+                    if self.request(build(i)) >= 400:
+                        errors.append(i)
+                except Exception:
+                    errors.append(i)
+            connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - start, len(errors)
@@ -0,0 +1,113 @@
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import storage
+from core.models import Profile, Pet, Vet, Post, Blob
+
+MODELS = (Post, Profile, Pet, Vet)
+LEGACY_DIRECTORIES = ('post_images', 'pet_images', 'profile_image', 'vet_images')
+
+
+class Command(BaseCommand):
+    """
+    Move uploads stored before the content-addressed storage into it.
+    Byte-identical files collapse into one blob, rows are repointed in
+    batches and already converted rows are skipped, so an interrupted
+    run can simply be started again.
+    """
+    help = 'Move existing media into the content-addressed storage and deduplicate it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--delete-originals', action='store_true',
+            help='Delete legacy files no row references any more',
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Recompute every blob reference count from the image fields',
+        )
+
+    def handle(self, *args, **options):
+        for model in MODELS:
+            moved = self.convert(model, options['batch_size'])
+            self.stdout.write(f'{model.__name__}: {moved} file(s) moved')
+
+        if options['recount']:
+            self.recount()
+        if options['delete_originals']:
+            self.delete_originals()
+        self.stdout.write(self.style.SUCCESS('Media deduplicated'))
+
+    def convert(self, model, batch_size):
+        field = model.variants_field
+        moved = 0
+        last_pk = None
+        while True:
+            batch = model.objects.exclude(**{f'{field}__startswith': f'{storage.BLOB_PREFIX}/'}).exclude(**{field: ''})
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            rows = list(batch.order_by('pk').values_list('pk', field, 'image_variants')[:batch_size])
+            if not rows:
+                return moved
+            last_pk = rows[-1][0]
+
+            with transaction.atomic():
+                for pk, name, variants in rows:
+                    if not default_storage.exists(name):
+                        continue
+                    with default_storage.open(name, 'rb') as content:
+                        blob = default_storage.save(name, content)
+                    if variants.get('source') == name:
+                        # Same bytes, the rendered variants stay valid
+                        variants['source'] = blob
+                    model.objects.filter(pk=pk).update(**{field: blob, 'image_variants': variants})
+                    storage.retain(blob)
+                    moved += 1
+
+    def recount(self):
+        references = Counter()
+        for model in MODELS:
+            field = model.variants_field
+            names = model.objects.filter(**{f'{field}__startswith': f'{storage.BLOB_PREFIX}/'}).values_list(field, flat=True)
+            references.update(names.iterator())
+
+        with transaction.atomic():
+            for blob in Blob.objects.iterator():
+                count = references.pop(blob.name, 0)
+                if blob.refcount != count:
+                    Blob.objects.filter(pk=blob.pk).update(refcount=count)
+                    if count == 0:
+                        transaction.on_commit(lambda name=blob.name: storage.collect(name))
+            for name, count in references.items():
+                if default_storage.exists(name):
+                    Blob.objects.create(name=name, size=default_storage.size(name), refcount=count)
+        self.stdout.write('Blob reference counts recomputed')
+
+    def delete_originals(self):
+        referenced = set()
+        for model in MODELS:
+            for name, variants in model.objects.values_list(model.variants_field, 'image_variants').iterator():
+                referenced.add(name)
+                for variant in variants.get('variants', []):
+                    referenced.update((variant['jpeg'], variant['webp']))
+
+        freed = 0
+        for directory in LEGACY_DIRECTORIES:
+            for name in self.walk(directory):
+                if name not in referenced:
+                    freed += default_storage.size(name)
+                    default_storage.delete(name)
+        self.stdout.write(f'{freed} byte(s) of legacy files deleted')
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        subdirectories, files = default_storage.listdir(directory)
+        for name in files:
+            yield f'{directory}/{name}'
+        for subdirectory in subdirectories:
+            yield from self.walk(f'{directory}/{subdirectory}')
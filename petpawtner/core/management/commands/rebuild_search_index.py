@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core import search
+
+
+class Command(BaseCommand):
+    """
+    Drop and rebuild the search documents of pets, vets and profiles
+    """
+    help = 'Rebuild the pet, vet and profile search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        search.get_backend().setup(using)
+        for kind in search.SEARCHABLE.values():
+            with transaction.atomic(using=using):
+                search.rebuild(kind, using, batch_size=options['batch_size'])
+            self.stdout.write(f'Indexed {kind.name}s')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Post, Like
+
+
+class Command(BaseCommand):
+    """
+    Recompute Post.no_of_likes from the Like table, walking posts in
+    primary key batches so no single transaction locks the whole table
+    """
+    help = 'Recompute no_of_likes of every post from its Like rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        like_count = Coalesce(
+            Subquery(
+                Like.objects.filter(post=OuterRef('pk'))
+                .order_by()
+                .values('post')
+                .annotate(total=Count('pk'))
+                .values('total'),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = Post.objects.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            with transaction.atomic():
+                drifted = list(
+                    Post.objects.filter(pk__in=pks)
+                    .annotate(actual=like_count)
+                    .exclude(no_of_likes=F('actual'))
+                    .values_list('pk', flat=True)
+                )
+                if drifted:
+                    fixed += Post.objects.filter(pk__in=drifted).update(
+                        no_of_likes=like_count,
+                        version=F('version') + 1,
+                    )
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled like counts, {fixed} post(s) fixed'))
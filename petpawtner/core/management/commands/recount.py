@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Profile, Pet, Post, Like, Message, Follow
+
+
+def count_of(queryset, outer, field):
+    """
+    Correlated COUNT of the rows of queryset whose field is the outer
+    profile column, 0 when there is none
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def counters():
+    """
+    The true value of every Profile counter as an expression
+    """
+    return {
+        'post_count': count_of(Post.objects.all(), 'user', 'user'),
+        'pet_count': count_of(Pet.objects.all(), 'pk', 'owner'),
+        'likes_received': count_of(Like.objects.all(), 'user', 'post__user'),
+        'unread_messages': count_of(Message.objects.filter(is_read=False), 'pk', 'receiver'),
+        'follower_count': count_of(Follow.objects.all(), 'pk', 'followee'),
+        'following_count': count_of(Follow.objects.all(), 'pk', 'follower'),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Recompute the denormalized Profile counters from the rows they count,
+    walking profiles in primary key batches and only writing the profiles
+    that drifted
+    """
+    help = 'Repair the post, pet, likes received, unread message and follow counters of every profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = Profile.objects.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            with transaction.atomic():
+                actual = counters()
+                drifted = Q()
+                for name in actual:
+                    drifted |= ~Q(**{name: F(f'actual_{name}')})
+                drifted = list(
+                    Profile.objects.filter(pk__in=pks)
+                    .annotate(**{f'actual_{name}': value for name, value in actual.items()})
+                    .filter(drifted)
+                    .values_list('pk', flat=True)
+                )
+                if drifted:
+                    fixed += Profile.objects.filter(pk__in=drifted).update(**counters())
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted profiles, {fixed} profile(s) fixed'))
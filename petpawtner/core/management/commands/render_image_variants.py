@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import Profile, Pet, Vet, Post
+
+
+class Command(BaseCommand):
+    """
+    Render the resized variants of images uploaded before the image
+    pipeline existed, or whose variants are missing
+    """
+    help = 'Render missing resized variants of uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in (Post, Profile, Pet, Vet):
+            done = 0
+            queryset = model.objects.only('pk', model.variants_field, 'image_variants').order_by('pk')
+            for instance in queryset.iterator(chunk_size=options['batch_size']):
+                if instance.needs_variants():
+                    images.process(model._meta.label, instance.pk)
+                    done += 1
+            self.stdout.write(f'{model.__name__}: {done} image(s) processed')
+        self.stdout.write(self.style.SUCCESS('Image variants rendered'))
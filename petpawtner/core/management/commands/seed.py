@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core import fixtures
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with a generated dataset, see core/fixtures.py.
+    The same --posts and --seed always give the same rows, whatever the
+    number of --workers. Every user logs in with --password.
+    """
+    help = 'Bulk create users, profiles, pets, posts, likes and messages for benchmarks and staging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1, help='Processes writing the post chunks')
+        parser.add_argument('--batch-size', type=int, default=fixtures.BATCH_SIZE)
+        parser.add_argument('--password', default=fixtures.PASSWORD)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1 or options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--posts, --workers and --batch-size must be positive')
+        using = options['database']
+        if User.objects.using(using).filter(username='user0').exists():
+            raise CommandError('The database is already seeded')
+
+        start = time.perf_counter()
+        created = fixtures.generate(
+            options['posts'],
+            seed=options['seed'],
+            using=using,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            password=options['password'],
+        )
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(', '.join(f'{count} {name}' for name, count in created.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {sum(created.values())} rows in {elapsed:.1f}s'
+        ))
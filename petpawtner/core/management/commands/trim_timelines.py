@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Exists, F, OuterRef
+
+from core import timelines
+from core.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    """
+    Keep home timelines bounded: drop the entries past the newest
+    TIMELINE_LENGTH of each timeline, and the entries of authors that are
+    neither followed by nor the owner of the timeline, left behind when an
+    unfollow raced a fan-out. Meant to run periodically.
+    """
+    help = 'Trim home timelines to TIMELINE_LENGTH posts and drop entries of unfollowed authors'
+
+    def handle(self, *args, **options):
+        followed = Follow.objects.filter(follower=OuterRef('owner'), followee__user=OuterRef('author'))
+        stale, _ = (
+            TimelineEntry.objects.exclude(Exists(followed))
+            .exclude(author=F('owner__user'))
+            .delete()
+        )
+
+        owners = (
+            TimelineEntry.objects.order_by().values('owner')
+            .annotate(entries=Count('pk')).filter(entries__gt=settings.TIMELINE_LENGTH)
+            .values_list('owner', flat=True)
+        )
+        trimmed = sum(timelines.trim(owner_id) for owner_id in list(owners))
+
+        self.stdout.write(self.style.SUCCESS(f'Trimmed {trimmed} old and {stale} unfollowed timeline entries'))
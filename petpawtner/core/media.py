@@ -0,0 +1,140 @@
+"""
+Serving of uploaded media.
+Blobs are named after the SHA-256 of their content (see core/storage.py),
+so the digest is their strong ETag and they are cached forever. Other
+files get an ETag from their size and modification time. Conditional
+requests are answered with 304 before the file is opened.
+With MEDIA_ACCEL the bytes are left to the front proxy: nginx gets an
+X-Accel-Redirect to MEDIA_ACCEL_PREFIX, an internal location aliasing
+MEDIA_ROOT, Apache and lighttpd an X-Sendfile with the file path, and the
+proxy also answers the byte ranges. Without it the file is streamed from
+Python, honouring a single byte range.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .storage import blob_digest
+
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=3600'
+RANGE_CHUNK_SIZE = 64 * 1024
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """
+    The inclusive (start, end) of a Range header, None when the whole
+    file should be sent. Several ranges are answered with the whole file,
+    which RFC 9110 allows.
+    """
+    match = BYTE_RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        if not int(last):
+            raise UnsatisfiableRange
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size:
+        raise UnsatisfiableRange
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, path):
+    """
+    Serve a file of MEDIA_ROOT with validators, caching headers and
+    byte ranges, or hand it to the front proxy
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = safe_join(settings.MEDIA_ROOT, path)
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        stat = None
+    if stat is None or not S_ISREG(stat.st_mode):
+        raise Http404('No such file')
+
+    digest = blob_digest(path)
+    etag = f'"{digest}"' if digest else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if digest else CACHE_CONTROL,
+    }
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    accel = settings.MEDIA_ACCEL
+    if accel == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + path)
+    elif accel == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = fullpath
+    else:
+        response = stream(request, fullpath, stat.st_size, etag, headers['Last-Modified'], content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def stream(request, fullpath, size, etag, last_modified, content_type):
+    requested = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    # A range of a file that changed since the client's copy would mix versions
+    if requested and (not if_range or if_range in (etag, last_modified)):
+        try:
+            span = byte_range(requested, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if span is not None:
+            start, end = span
+            response = StreamingHttpResponse(
+                read_range(fullpath, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    # FileResponse lets the WSGI server use sendfile() when it can
+    response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,75 @@
+"""
+Read side of the messaging inbox.
+A conversation is every message between two profiles. The inbox is one
+windowed query over the messages of the viewer: they are partitioned by
+the other party, the newest message of each partition is kept and the
+unread messages of each partition are summed alongside it. Both sides
+of the OR are served by the (sender, receiver, timestamp) and
+(receiver, is_read, timestamp) indexes, so the cost follows the viewer's
+own messages, not the size of the table.
+"""
+from django.db.models import Case, F, IntegerField, Q, Sum, When, Window
+from django.db.models.functions import RowNumber
+
+from .models import ArchivedMessage, Message
+from .pagination import encode_cursor, keyset
+
+
+INBOX_SIZE = 50
+THREAD_PAGE_SIZE = 30
+
+
+class Conversation:
+    """
+    One inbox row: the other profile, the latest message between
+    the two and how many messages from them are unread
+    """
+    def __init__(self, other, latest, unread):
+        self.other = other
+        self.latest = latest
+        self.unread = unread
+
+
+def conversations(profile, limit=INBOX_SIZE):
+    """
+    Return the conversations of a profile, most recently active first
+    """
+    other = Case(When(sender=profile, then=F('receiver')), default=F('sender'), output_field=IntegerField())
+    unread = Case(When(receiver=profile, is_read=False, then=1), default=0, output_field=IntegerField())
+    latest = (
+        Message.objects.filter(Q(sender=profile) | Q(receiver=profile))
+        .annotate(other_id=other)
+        .annotate(
+            rank=Window(RowNumber(), partition_by=F('other_id'), order_by=[F('timestamp').desc(), F('pk').desc()]),
+            unread=Window(Sum(unread), partition_by=F('other_id')),
+        )
+        .filter(rank=1)
+        .select_related('sender__user', 'receiver__user')
+        .order_by('-timestamp', '-pk')[:limit]
+    )
+    return [
+        Conversation(
+            message.receiver if message.sender_id == profile.pk else message.sender,
+            message,
+            message.unread,
+        )
+        for message in latest
+    ]
+
+
+def thread(profile, other, cursor=None, page_size=THREAD_PAGE_SIZE):
+    """
+    Return one page of the messages between two profiles, newest first,
+    and the cursor of the older page (see pagination.paginate).
+    Archived messages keep their id, so one keyset walks the live and
+    the archived messages merged.
+    """
+    between = Q(sender=profile, receiver=other) | Q(sender=other, receiver=profile)
+    rows = [
+        *keyset(Message.objects.filter(between), 'timestamp', cursor, int)[:page_size + 1],
+        *keyset(ArchivedMessage.objects.filter(between), 'timestamp', cursor, int)[:page_size + 1],
+    ]
+    rows.sort(key=lambda message: (message.timestamp, message.pk), reverse=True)
+    page = rows[:page_size]
+    next_cursor = encode_cursor(page[-1], 'timestamp') if len(rows) > page_size else None
+    return page, next_cursor
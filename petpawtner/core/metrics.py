@@ -0,0 +1,225 @@
+"""
+Request performance metrics.
+Every request counts towards the request counter and the wall time
+histogram, which only cost two clock reads. A sampled share of the
+requests (PERF_SAMPLE_RATE) is instrumented further: every query goes
+through an execute wrapper timing it and spotting duplicates, and
+template rendering is timed by InstrumentedTemplates. Sampled requests
+slower than PERF_SLOW_REQUEST_SECONDS are logged to core.performance as
+one JSON object holding their slowest and duplicated SQL.
+
+The registry lives in the process, each worker exports its own series
+on /metrics in the Prometheus text format.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger('core.performance')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Statements kept in the slow request log
+SLOW_LOG_QUERIES = 10
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class Registry:
+    """
+    Thread safe store of counters and histograms keyed by name and labels
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}
+        self.types = {}
+        self.values = {}
+
+    def describe(self, name, kind, text):
+        self.types[name] = kind
+        self.help[name] = text
+
+    def inc(self, name, labels, amount=1):
+        key = (name, '', tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            for bucket in (*DURATION_BUCKETS, '+Inf'):
+                key = (name, '_bucket', labels + (('le', str(bucket)),))
+                hit = bucket == '+Inf' or value <= bucket
+                self.values[key] = self.values.get(key, 0) + hit
+            for suffix, amount in (('_sum', value), ('_count', 1)):
+                key = (name, suffix, labels)
+                self.values[key] = self.values.get(key, 0) + amount
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self):
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        with self.lock:
+            values = list(self.values.items())
+        lines = []
+        for name in sorted(self.types):
+            lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} {self.types[name]}')
+            for (metric, suffix, labels), value in values:
+                if metric != name:
+                    continue
+                rendered = ','.join(f'{key}="{label}"' for key, label in labels)
+                # Counts stay exact, sums of seconds keep every digit
+                value = value if isinstance(value, int) else repr(float(value))
+                lines.append(f'{name}{suffix}{{{rendered}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+registry.describe('petpawtner_requests_total', 'counter', 'Requests served')
+registry.describe('petpawtner_request_duration_seconds', 'histogram', 'Wall time of requests')
+registry.describe('petpawtner_sampled_requests_total', 'counter', 'Requests instrumented for database and template time')
+registry.describe('petpawtner_db_duration_seconds', 'histogram', 'Database time of sampled requests')
+registry.describe('petpawtner_db_queries_total', 'counter', 'Queries run by sampled requests')
+registry.describe('petpawtner_duplicate_queries_total', 'counter', 'Queries of sampled requests repeating an earlier one with the same parameters')
+registry.describe('petpawtner_template_render_seconds_total', 'counter', 'Template render time of sampled requests')
+registry.describe('petpawtner_slow_requests_total', 'counter', 'Sampled requests slower than PERF_SLOW_REQUEST_SECONDS')
+
+
+class RequestMetrics:
+    """
+    Instrumentation of one sampled request. Entering it wraps the
+    query execution of every database connection of the thread, or
+    with async with of the thread sync_to_async runs queries in.
+    """
+    def __init__(self):
+        self.queries = []
+        self.seen = set()
+        self.duplicates = []
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.stack = ExitStack()
+
+    def __enter__(self):
+        self.token = _current.set(self)
+        self.wrap_connections()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+        _current.reset(self.token)
+
+    async def __aenter__(self):
+        # Async views query through sync_to_async, on the connections of
+        # the thread it runs them in
+        self.token = _current.set(self)
+        await sync_to_async(self.wrap_connections)()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await sync_to_async(self.stack.close)()
+        _current.reset(self.token)
+
+    def wrap_connections(self):
+        for alias in connections:
+            self.stack.enter_context(connections[alias].execute_wrapper(self.execute))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+            key = (sql, repr(params))
+            if key in self.seen:
+                self.duplicates.append(sql)
+            else:
+                self.seen.add(key)
+
+
+def record(request, response, duration, sampled=None):
+    """
+    Add a finished request to the registry, and to the slow request
+    log when it was sampled and slow
+    """
+    match = request.resolver_match
+    view = match.view_name if match else 'unmatched'
+    registry.inc('petpawtner_requests_total', {
+        'view': view, 'method': request.method, 'status': str(response.status_code),
+    })
+    registry.observe('petpawtner_request_duration_seconds', {'view': view}, duration)
+    if sampled is None:
+        return
+
+    labels = {'view': view}
+    registry.inc('petpawtner_sampled_requests_total', labels)
+    registry.observe('petpawtner_db_duration_seconds', labels, sampled.db_time)
+    registry.inc('petpawtner_db_queries_total', labels, len(sampled.queries))
+    registry.inc('petpawtner_duplicate_queries_total', labels, len(sampled.duplicates))
+    registry.inc('petpawtner_template_render_seconds_total', labels, sampled.render_time)
+    if duration < settings.PERF_SLOW_REQUEST_SECONDS:
+        return
+
+    registry.inc('petpawtner_slow_requests_total', labels)
+    slowest = sorted(sampled.queries, key=lambda query: query[1], reverse=True)[:SLOW_LOG_QUERIES]
+    logger.warning(json.dumps({
+        'event': 'slow_request',
+        'method': request.method,
+        'path': request.path,
+        'view': view,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'db_ms': round(sampled.db_time * 1000, 2),
+        'queries': len(sampled.queries),
+        'duplicate_queries': len(sampled.duplicates),
+        'template_ms': round(sampled.render_time * 1000, 2),
+        'slowest_sql': [{'sql': sql, 'ms': round(took * 1000, 2)} for sql, took in slowest],
+        'duplicate_sql': sorted(set(sampled.duplicates))[:SLOW_LOG_QUERIES],
+    }))
+
+
+class InstrumentedTemplate(Template):
+    """
+    Template timing its top level renders into the sampled request
+    """
+    def render(self, context=None, request=None):
+        sampled = _current.get()
+        if sampled is None:
+            return super().render(context, request)
+        sampled.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sampled.render_depth -= 1
+            if sampled.render_depth == 0:
+                sampled.render_time += time.perf_counter() - start
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """
+    The Django template backend returning InstrumentedTemplate,
+    set as the BACKEND of TEMPLATES
+    """
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
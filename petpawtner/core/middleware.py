@@ -0,0 +1,116 @@
+"""
+Project middleware, listed in settings.MIDDLEWARE.
+Every class serves sync and async requests alike: under ASGI the async
+signup and signin views are awaited through the whole stack instead of
+being handed to a thread by each layer.
+"""
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics, profiles, routers
+
+
+STICKY_COOKIE = 'primary_reads'
+
+
+class HybridMiddleware:
+    """
+    Base of middleware that is async when the handler it wraps is
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+class ReplicaStickinessMiddleware(HybridMiddleware):
+    """
+    Track the database routing of each request. A request that wrote
+    sets a short lived cookie, and while the client sends it back its
+    reads stay on the primary. A cookie is used rather than the session
+    because the session itself is read before routing is decided.
+    Listed before the session and message middleware, so their writes
+    are seen too.
+    """
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token = routers.start_request(sticky=STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+        return self.stick(state, response)
+
+    async def __acall__(self, request):
+        state, token = routers.start_request(sticky=STICKY_COOKIE in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.end_request(token)
+        return self.stick(state, response)
+
+    def stick(self, state, response):
+        if state.wrote and routers.replicas():
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """
+    Time every request and instrument a PERF_SAMPLE_RATE share of them
+    for database and template time, see core/metrics.py.
+    Listed first, so the time of the other middleware is included.
+    """
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            response = self.get_response(request)
+            metrics.record(request, response, time.perf_counter() - start)
+            return response
+
+        with metrics.RequestMetrics() as sampled:
+            response = self.get_response(request)
+        metrics.record(request, response, time.perf_counter() - start, sampled)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            response = await self.get_response(request)
+            metrics.record(request, response, time.perf_counter() - start)
+            return response
+
+        async with metrics.RequestMetrics() as sampled:
+            response = await self.get_response(request)
+        metrics.record(request, response, time.perf_counter() - start, sampled)
+        return response
+
+
+class ProfileMiddleware(HybridMiddleware):
+    """
+    Set request.profile, the profile of the signed-in user, loaded with
+    request.user by core.profiles.ProfileBackend. It is lazy like
+    request.user and false for anonymous users and users without a
+    profile, so test it with `if not request.profile`.
+    Listed after AuthenticationMiddleware.
+    """
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: profiles.get_profile(request))
+        # The coroutine of the async handler is returned as is
+        return self.get_response(request)
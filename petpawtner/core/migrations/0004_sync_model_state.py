@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:23
+# The state of models.py that no earlier migration recorded
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0003_merge_20240924_2130'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.CharField(max_length=500)),
+                ('username', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='caption',
+            field=models.TextField(max_length=300),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='vet',
+            name='profile',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='vet_profile', to='core.profile'),
+        ),
+    ]
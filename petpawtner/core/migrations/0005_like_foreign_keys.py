@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def link_likes(apps, schema_editor):
+    """
+    Point every like at its post and user, dropping likes whose post or
+    user no longer exists and duplicate likes of the same post by one user
+    """
+    Like = apps.get_model('core', 'Like')
+    Post = apps.get_model('core', 'Post')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    seen = set()
+    for like in Like.objects.order_by('pk').iterator():
+        try:
+            post_pk = uuid.UUID(like.legacy_post_id)
+        except ValueError:
+            post_pk = None
+        post = Post.objects.filter(pk=post_pk).only('pk').first() if post_pk else None
+        user = User.objects.filter(username=like.legacy_username).only('pk').first()
+
+        if post is None or user is None or (post.pk, user.pk) in seen:
+            like.delete()
+            continue
+
+        seen.add((post.pk, user.pk))
+        like.post = post
+        like.user = user
+        like.save(update_fields=['post', 'user'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0004_post_feed_idx'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='like',
+            old_name='post_id',
+            new_name='legacy_post_id',
+        ),
+        migrations.RenameField(
+            model_name='like',
+            old_name='username',
+            new_name='legacy_username',
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.post'),
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_likes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='like',
+            name='legacy_post_id',
+        ),
+        migrations.RemoveField(
+            model_name='like',
+            name='legacy_username',
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.post'),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='unique_post_like'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def count_unread_messages(apps, schema_editor):
+    Profile = apps.get_model('core', 'Profile')
+    Message = apps.get_model('core', 'Message')
+    unread = (
+        Message.objects.filter(receiver=OuterRef('pk'), is_read=False)
+        .order_by().values('receiver').annotate(count=Count('pk')).values('count')
+    )
+    Profile.objects.filter(received_messages__is_read=False).distinct().update(unread_messages=Subquery(unread))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_post_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_messages',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['receiver', 'is_read', 'timestamp'], name='message_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', 'timestamp'], name='message_thread_idx'),
+        ),
+        migrations.RunPython(count_unread_messages, migrations.RunPython.noop),
+    ]
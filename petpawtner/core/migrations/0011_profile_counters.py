@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_profile_rows(apps, schema_editor):
+    Profile = apps.get_model('core', 'Profile')
+    Post = apps.get_model('core', 'Post')
+    Pet = apps.get_model('core', 'Pet')
+    Like = apps.get_model('core', 'Like')
+
+    def count_of(model, outer, field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{field: OuterRef(outer)})
+                .order_by().values(field).annotate(total=Count('pk')).values('total'),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+
+    Profile.objects.update(
+        post_count=count_of(Post, 'user', 'user'),
+        pet_count=count_of(Pet, 'pk', 'owner'),
+        likes_received=count_of(Like, 'user', 'post__user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_archived_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='likes_received',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='pet_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_profile_rows, migrations.RunPython.noop),
+    ]
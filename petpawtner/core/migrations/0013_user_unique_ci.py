@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import IntegrityError, migrations
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+
+def dedupe_users(apps, schema_editor):
+    """
+    Case variants of a username must be resolved by hand, the accounts
+    are different people. A shared email stays with the oldest account
+    and is blanked on the others.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    users = User.objects.using(schema_editor.connection.alias)
+
+    clashes = (
+        users.annotate(key=Lower('username')).values('key')
+        .annotate(total=Count('pk')).filter(total__gt=1).values_list('key', flat=True)
+    )
+    duplicates = sorted(users.annotate(key=Lower('username')).filter(key__in=list(clashes)).values_list('username', flat=True))
+    if duplicates:
+        raise IntegrityError(
+            'Rename the usernames that differ only in case before migrating: ' + ', '.join(duplicates)
+        )
+
+    shared = (
+        users.exclude(email='').annotate(key=Lower('email')).values('key')
+        .annotate(total=Count('pk'), first=Min('pk')).filter(total__gt=1)
+    )
+    for row in shared:
+        users.annotate(key=Lower('email')).filter(key=row['key']).exclude(pk=row['first']).update(email='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0012_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_users, migrations.RunPython.noop),
+        # Usernames and emails are unique regardless of case, see core/accounts.py
+        migrations.RunSQL(
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS auth_user_username_ci ON auth_user (LOWER(username))',
+                # Accounts may have no email
+                "CREATE UNIQUE INDEX IF NOT EXISTS auth_user_email_ci ON auth_user (LOWER(email)) WHERE email <> ''",
+            ],
+            [
+                'DROP INDEX IF EXISTS auth_user_username_ci',
+                'DROP INDEX IF EXISTS auth_user_email_ci',
+            ],
+        ),
+    ]
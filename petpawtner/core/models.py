@@ -7,7 +7,55 @@ from datetime import datetime
 User = get_user_model()
 
 
-class Profile(models.Model):
+class ImageVariantsMixin(models.Model):
+    """
+    Abstract model adding the dimensions and resized variants of the image
+    stored in the field named by variants_field, filled in by core.images
+    """
+    variants_field = 'image'
+
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # {'source': <original name>, 'variants': [{'width', 'jpeg', 'webp'}, ...]}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def _variant_srcset(self, fmt):
+        field = getattr(self, self.variants_field)
+        if self.image_variants.get('source') != field.name:
+            return ''
+        return ', '.join(
+            f"{field.storage.url(variant[fmt])} {variant['width']}w"
+            for variant in self.image_variants.get('variants', [])
+        )
+
+    @property
+    def jpeg_srcset(self):
+        return self._variant_srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self._variant_srcset('webp')
+
+    @property
+    def thumbnail_url(self):
+        """
+        URL of the smallest variant, or of the original until variants exist
+        """
+        field = getattr(self, self.variants_field)
+        variants = self.image_variants.get('variants')
+        if variants and self.image_variants.get('source') == field.name:
+            return field.storage.url(variants[0]['jpeg'])
+        return field.url
+
+    def needs_variants(self):
+        field = getattr(self, self.variants_field)
+        return bool(field.name) and self.image_variants.get('source') != field.name
+
+
+class Profile(ImageVariantsMixin):
     """Create a profile class to inherit from the model.Model class
     automatically created by Django as default user
     and link the user using a FK
@@ -22,12 +70,37 @@ class Profile(models.Model):
     profileimg = models.ImageField(upload_to='profile_image', default='dog_paw-pp.png')
     location = models.CharField(max_length=50)
     role = models.CharField(max_length=5, choices=USER_ROLES, default='owner')
+    # Denormalized counters, only ever moved with F() updates by core/services.py
+    # and core/signals.py, the recount command repairs them
+    unread_messages = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
+    pet_count = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    variants_field = 'profileimg'
+    counter_fields = (
+        'unread_messages', 'post_count', 'pet_count', 'likes_received', 'follower_count', 'following_count',
+    )
 
     def __str__(self):
         return self.user.username
+
+    def save(self, *args, **kwargs):
+        """
+        Leave the counters out of saves of loaded profiles, so saving a
+        form never writes back a stale count over a concurrent update
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
     
 
-class Pet(models.Model):
+class Pet(ImageVariantsMixin):
     """
     Create a pet class to inherit from the model.Model class
     and link the pet to the owner using a FK
@@ -41,11 +114,13 @@ class Pet(models.Model):
     profileimg = models.ImageField(upload_to='pet_images', default='dog_paw-pp.png')
     location = models.CharField(max_length=50)
 
+    variants_field = 'profileimg'
+
     def __str__(self):
         return f"{self.name} ({self.breed}) - {self.owner.user.username}"
     
 
-class Vet(models.Model):
+class Vet(ImageVariantsMixin):
     """
     Create a vet class to inherit from the model.Model class
     and link the vet to the profile using a OneToOneField
@@ -58,11 +133,13 @@ class Vet(models.Model):
     profileimg = models.ImageField(upload_to='vet_images', default='vet-icon.png')
     location = models.CharField(max_length=50)
 
+    variants_field = 'profileimg'
+
     def __str__(self):
-        return self.user.username
+        return self.profile.user.username
 
 
-class Post(models.Model):
+class Post(ImageVariantsMixin):
     """
     Create a post class to inherit from the model.Model class
     and link the post to the Pets
@@ -73,6 +150,17 @@ class Post(models.Model):
     no_of_likes = models.IntegerField(default=0)
     image = models.ImageField(upload_to='post_images')
     created_at = models.DateTimeField(default=datetime.now)
+    # Moves whenever the rendered post card changes, see core/fragments.py
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Backs the keyset-paginated home feed (newest first)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            # Posts of one author newest first: profile grids and the
+            # timelines read from the posts of popular authors
+            models.Index(fields=['user', '-created_at', '-id'], name='post_author_idx'),
+        ]
 
     def __str__(self):
         return str(self.user.username)
@@ -80,13 +168,79 @@ class Post(models.Model):
 class Like(models.Model):
     """
     Create a like class to inherit from the model.Model class
-    and link the like to the post
+    and link the like to the post and the user who liked it
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        # A user likes a post at most once, the unique index also serves
+        # the (post, user) lookup done on every like toggle
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name='unique_post_like'),
+        ]
+
+    def __str__(self):
+        return str(self.user.username)
+
+class Follow(models.Model):
+    """
+    A profile following another one, an owner following a vet or the
+    owner of a pet, whose posts then reach their home timeline
+    """
+    follower = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='following')
+    followee = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='unique_follow'),
+        ]
+        indexes = [
+            # The followers of an author, walked when a post is fanned out
+            models.Index(fields=['followee', 'follower'], name='follow_followers_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower} follows {self.followee}"
+
+class TimelineEntry(models.Model):
+    """
+    A post in the precomputed home timeline of a profile, written when the
+    post is fanned out to the followers of its author, see core.timelines
     """
-    post_id = models.CharField(max_length=500)
-    username = models.CharField(max_length=100)
+    owner = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    # Copied from the post so a timeline page is one range scan of the index
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_page_idx'),
+        ]
 
     def __str__(self):
-        return str(self.username)
+        return f"{self.post_id} in the timeline of {self.owner_id}"
+
+class Blob(models.Model):
+    """
+    A file of the content-addressed media storage and the number of
+    image fields referencing it, see core.storage
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    # Resized variants rendered from this file, shared by every row using it
+    # {'width', 'height', 'variants': [{'width', 'jpeg', 'webp'}, ...]}
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
 
 class Message(models.Model):
     """
@@ -98,6 +252,36 @@ class Message(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)  
 
+    class Meta:
+        indexes = [
+            # Unread messages of a receiver and the receiving side of the inbox
+            models.Index(fields=['receiver', 'is_read', 'timestamp'], name='message_unread_idx'),
+            # One direction of a conversation, newest last
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='message_thread_idx'),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender.user.username} to {self.receiver.user.username} at {self.timestamp}"
 
+
+class ArchivedMessage(models.Model):
+    """
+    Old read messages moved out of Message by the archive_messages
+    command, keeping their original id
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='archived_sent_messages')
+    receiver = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='archived_received_messages')
+    content = models.TextField()
+    timestamp = models.DateTimeField()
+    is_read = models.BooleanField(default=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='archived_thread_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived message {self.pk}"
+
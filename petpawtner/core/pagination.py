@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination.
+Rows are walked newest first on (timestamp column, primary key), so every
+page is an indexed range scan no matter how deep the reader scrolls.
+The home feed and profile grids walk posts on created_at, conversations
+messages on timestamp.
+"""
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+
+
+FEED_PAGE_SIZE = 10
+PROFILE_PAGE_SIZE = 12
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor sent by the client cannot be decoded
+    """
+
+
+def encode_cursor(obj, field='created_at'):
+    """
+    Turn the (timestamp, pk) of the last row on a page into an opaque token
+    """
+    pk = obj.pk.hex if isinstance(obj.pk, uuid.UUID) else obj.pk
+    raw = f"{getattr(obj, field).isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, pk_type=uuid.UUID):
+    """
+    Reverse encode_cursor, returning a (timestamp, pk) tuple
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), pk_type(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def keyset(queryset, field, cursor=None, pk_type=uuid.UUID, key='pk'):
+    """
+    Order the queryset newest first on (field, key) and keep the rows
+    after the cursor. key is the primary key unless the rows stand for
+    the rows of another table, such as timeline entries for their posts.
+    """
+    queryset = queryset.order_by(f'-{field}', f'-{key}')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor, pk_type)
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, f'{key}__lt': pk})
+        )
+    return queryset
+
+
+def paginate(queryset, field, cursor=None, page_size=FEED_PAGE_SIZE, pk_type=uuid.UUID):
+    """
+    Return one page of the queryset, newest first on field, and the cursor
+    of the next page (None when this is the last page).
+    One extra row is fetched to know if another page exists without a COUNT.
+    """
+    rows = list(keyset(queryset, field, cursor, pk_type)[:page_size + 1])
+    page = rows[:page_size]
+    next_cursor = encode_cursor(page[-1], field) if len(rows) > page_size else None
+    return page, next_cursor
+
+
+def paginate_feed(queryset, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Page through posts newest first, see paginate()
+    """
+    return paginate(queryset, 'created_at', cursor, page_size)
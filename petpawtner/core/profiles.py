@@ -0,0 +1,69 @@
+"""
+The profile of the signed-in user, loaded once per request.
+ProfileBackend fetches the session user together with its profile in one
+joined query. When PROFILE_CACHE names a cache shared by the worker
+processes both are kept there for PROFILE_CACHE_SECONDS, so most
+requests authenticate without touching the database; with None every
+request runs the query. Saving a profile or a user drops its entry (see
+core/signals.py), counters moved by UPDATE statements may lag for up to
+the timeout unless the code moving them invalidates too.
+ProfileMiddleware exposes the profile as request.profile.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from .models import Profile
+
+
+# Cached for users without a profile, such as superusers made by createsuperuser
+NO_PROFILE = 'none'
+
+
+def cache_key(user_id):
+    return f'profile:user:{user_id}'
+
+
+def profile_cache():
+    return caches[settings.PROFILE_CACHE]
+
+
+def cached_profile(user_id):
+    """
+    The profile of a user with its user loaded, None when the user has
+    no profile
+    """
+    if settings.PROFILE_CACHE is None:
+        return Profile.objects.select_related('user').filter(user_id=user_id).first()
+    profile = profile_cache().get(cache_key(user_id))
+    if profile is None:
+        profile = Profile.objects.select_related('user').filter(user_id=user_id).first() or NO_PROFILE
+        profile_cache().set(cache_key(user_id), profile, settings.PROFILE_CACHE_SECONDS)
+    return None if profile == NO_PROFILE else profile
+
+
+def invalidate(user_id):
+    if settings.PROFILE_CACHE is not None:
+        profile_cache().delete(cache_key(user_id))
+
+
+class ProfileBackend(ModelBackend):
+    """
+    ModelBackend whose session user comes from cached_profile(), with
+    user.profile already set
+    """
+    def get_user(self, user_id):
+        profile = cached_profile(user_id)
+        if profile is None:
+            return super().get_user(user_id)
+        user = profile.user
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_profile(request):
+    if not request.user.is_authenticated:
+        return None
+    try:
+        return request.user.profile
+    except Profile.DoesNotExist:
+        return None
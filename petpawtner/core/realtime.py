@@ -0,0 +1,198 @@
+"""
+In-process publish/subscribe for real-time events.
+Every WebSocket connection (see core/websocket.py) subscribes to the
+channel of its profile; write paths publish small JSON-able events once
+their transaction commits. The broker set by settings.REALTIME_BROKER
+does the fan-out: LocalBroker delivers inside the current process only,
+a broker backed by a shared bus (Redis pub/sub, PostgreSQL NOTIFY) can
+implement the same interface to reach every worker.
+
+Each subscription buffers at most settings.REALTIME_QUEUE_SIZE events.
+A client that falls further behind is dropped instead of making the
+server buffer for it without bound, and it resyncs over HTTP on reconnect.
+"""
+import asyncio
+import threading
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+REALTIME_QUEUE_SIZE = 100
+
+
+def profile_channel(profile_id):
+    return f'profile:{profile_id}'
+
+
+class Subscription:
+    """
+    Bounded buffer of the events of one channel for one consumer,
+    read with `async for`. Iteration ends once the subscription is closed.
+    """
+    __slots__ = ('broker', 'channel', 'loop', 'maxsize', 'events', 'waiter', 'closed', 'overflowed')
+
+    def __init__(self, broker, channel, loop, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.maxsize = maxsize
+        self.events = deque()
+        self.waiter = None
+        self.closed = False
+        self.overflowed = False
+
+    def push(self, event):
+        """
+        Buffer an event, must run in the thread of the subscription's loop
+        """
+        if self.closed:
+            return
+        if len(self.events) >= self.maxsize:
+            self.overflowed = True
+            self.close()
+            return
+        self.events.append(event)
+        self._wake()
+
+    def deliver(self, event):
+        """
+        Buffer an event from any thread
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.push(event)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.push, event)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.events.clear()
+        self.broker.unsubscribe(self)
+        self._wake()
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.events:
+            if self.closed:
+                raise StopAsyncIteration
+            self.waiter = self.loop.create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.events.popleft()
+
+
+class BaseBroker:
+    """
+    Interface of a broker. subscribe() is called from the event loop
+    that consumes the subscription, publish() from any thread.
+    """
+    def __init__(self, queue_size=REALTIME_QUEUE_SIZE):
+        self.queue_size = queue_size
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    """
+    Broker delivering to the subscriptions of the current process
+    """
+    def __init__(self, queue_size=REALTIME_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+        return len(subscriptions)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._channels.values())
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Return the configured broker instance
+    """
+    path = getattr(settings, 'REALTIME_BROKER', 'core.realtime.LocalBroker')
+    return import_string(path)(queue_size=getattr(settings, 'REALTIME_QUEUE_SIZE', REALTIME_QUEUE_SIZE))
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting in ('REALTIME_BROKER', 'REALTIME_QUEUE_SIZE'):
+        get_broker.cache_clear()
+
+
+def publish_message(message):
+    """
+    Push a new message to both of its participants, the sender's
+    other tabs included
+    """
+    event = {
+        'type': 'message',
+        'id': message.pk,
+        'sender': message.sender.user.username,
+        'receiver': message.receiver.user.username,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    }
+    broker = get_broker()
+    broker.publish(profile_channel(message.receiver_id), event)
+    broker.publish(profile_channel(message.sender_id), event)
+
+
+def publish_read_receipt(reader, sender, count):
+    """
+    Tell sender that reader has read count of their messages
+    """
+    get_broker().publish(profile_channel(sender.pk), {
+        'type': 'read',
+        'reader': reader.user.username,
+        'count': count,
+    })
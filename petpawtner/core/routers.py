@@ -0,0 +1,90 @@
+"""
+Read replica routing.
+The default alias is the primary and writes always go to it. Reads go
+to a replica only inside the views wrapped with replica_reads, which
+render pages that tolerate a few seconds of replication lag. A request that writes marks its client
+sticky (see core.middleware.ReplicaStickinessMiddleware), and the reads
+of a sticky client stay on the primary for REPLICA_STICKY_SECONDS, so a
+user sees their own like or post right away.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+_routing = ContextVar('database_routing', default=None)
+
+
+class RoutingState:
+    """
+    Routing of the current request, mutated in place by the router
+    so writes made in sync_to_async threads are seen by the middleware
+    """
+    def __init__(self, sticky=False):
+        self.sticky = sticky
+        self.replica_reads = False
+        self.wrote = False
+
+
+def start_request(sticky=False):
+    """
+    Begin routing a request, return its state and the token to pass to end_request
+    """
+    state = RoutingState(sticky)
+    return state, _routing.set(state)
+
+
+def end_request(token):
+    _routing.reset(token)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_reads(view):
+    """
+    Let the reads of a view go to a replica. Apply it below login_required,
+    so the session user is still resolved on the primary.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _routing.get()
+        if state is None:
+            return view(request, *args, **kwargs)
+        previous = state.replica_reads
+        state.replica_reads = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica_reads = previous
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Route reads of replica_reads views to a random replica alias of
+    DATABASE_REPLICAS, everything else to the primary
+    """
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        aliases = replicas()
+        if state is None or not aliases or not state.replica_reads or state.sticky or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
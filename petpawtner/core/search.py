@@ -0,0 +1,261 @@
+"""
+Search subsystem for pets, vets and profiles.
+Every searchable kind is described once in SEARCHABLE, the backend set by
+settings.SEARCH_BACKEND decides how the documents are stored and matched.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Profile, Pet, Vet
+
+
+SEARCH_PAGE_SIZE = 20
+
+
+class SearchKind:
+    """
+    Describe one searchable model: the columns of its documents,
+    their ranking weights and the ORM lookups used when no index exists
+    """
+    def __init__(self, name, model, columns, weights, document, lookups, related):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.weights = weights
+        self.document = document
+        self.lookups = lookups
+        self.related = related
+
+
+SEARCHABLE = {
+    'pet': SearchKind(
+        name='pet',
+        model=Pet,
+        columns=('name', 'breed', 'bio', 'location'),
+        weights=(10.0, 8.0, 1.0, 2.0),
+        document=lambda pet: (pet.name, pet.breed, pet.bio, pet.location),
+        lookups=('name', 'breed'),
+        related=('owner__user',),
+    ),
+    'vet': SearchKind(
+        name='vet',
+        model=Vet,
+        columns=('username', 'clinic_name', 'specialty', 'location'),
+        weights=(10.0, 6.0, 8.0, 2.0),
+        document=lambda vet: (vet.profile.user.username, vet.clinic_name, vet.specialty, vet.location),
+        lookups=('profile__user__username', 'specialty'),
+        related=('profile__user',),
+    ),
+    'profile': SearchKind(
+        name='profile',
+        model=Profile,
+        columns=('username', 'bio', 'location'),
+        weights=(10.0, 1.0, 2.0),
+        document=lambda profile: (profile.user.username, profile.bio, profile.location),
+        lookups=('user__username', 'bio', 'location'),
+        related=('user',),
+    ),
+}
+
+
+def kind_for(instance):
+    """
+    Return the SearchKind of a model instance, or None if it is not searchable
+    """
+    for kind in SEARCHABLE.values():
+        if isinstance(instance, kind.model):
+            return kind
+    return None
+
+
+def tokenize(query):
+    """
+    Split a raw user query into plain word tokens, dropping
+    every character FTS or LIKE could treat as syntax
+    """
+    return re.findall(r'\w+', query.lower())
+
+
+class BaseSearchBackend:
+    """
+    Interface of a search backend. Backends store one document per
+    searchable row and answer ranked, paginated queries with primary keys.
+    """
+    def setup(self, using):
+        """
+        Create whatever storage the backend needs, return True
+        if it did not exist before
+        """
+        return False
+
+    def index(self, kind, pk, document, using):
+        pass
+
+    def remove(self, kind, pk, using):
+        pass
+
+    def clear(self, kind, using):
+        pass
+
+    def bulk_index(self, kind, rows, using):
+        for pk, document in rows:
+            self.index(kind, pk, document, using)
+
+    def search(self, kind, tokens, offset, limit, using):
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Index-less backend running icontains lookups on the models,
+    for databases without a full-text engine. Results are unranked.
+    """
+    def search(self, kind, tokens, offset, limit, using):
+        queryset = kind.model.objects.using(using)
+        for token in tokens:
+            match = Q()
+            for lookup in kind.lookups:
+                match |= Q(**{f'{lookup}__icontains': token})
+            queryset = queryset.filter(match)
+        return list(queryset.order_by('pk').values_list('pk', flat=True)[offset:offset + limit])
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 backend. Each kind gets its own virtual table
+    whose rowid is the primary key of the indexed row,
+    so updates and deletes are rowid lookups and matching is an index
+    probe ranked with bm25. Two and three letter prefixes are indexed
+    to keep "search as you type" queries cheap.
+    """
+    def table(self, kind):
+        return f'core_search_{kind.name}'
+
+    def setup(self, using):
+        created = False
+        with connections[using].cursor() as cursor:
+            for kind in SEARCHABLE.values():
+                table = self.table(kind)
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+                if cursor.fetchone():
+                    continue
+                columns = ', '.join(kind.columns)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {table} USING fts5("
+                    f"{columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+                created = True
+        return created
+
+    def index(self, kind, pk, document, using):
+        self.bulk_index(kind, [(pk, document)], using)
+
+    def bulk_index(self, kind, rows, using):
+        table = self.table(kind)
+        placeholders = ', '.join(['%s'] * (len(kind.columns) + 1))
+        rows = [(pk, *[value or '' for value in document]) for pk, document in rows]
+        with connections[using].cursor() as cursor:
+            # FTS5 has no upsert, replace the old document by rowid first
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, {', '.join(kind.columns)}) VALUES ({placeholders})",
+                rows,
+            )
+
+    def remove(self, kind, pk, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table(kind)} WHERE rowid = %s', [pk])
+
+    def clear(self, kind, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table(kind)}')
+
+    def search(self, kind, tokens, offset, limit, using):
+        table = self.table(kind)
+        # Every token must match, each one as a prefix
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in kind.weights)
+        # The whole match set is ranked, newest first among equal scores
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+                f'ORDER BY bm25({table}, {weights}), rowid DESC LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """
+    Return the configured search backend instance
+    """
+    path = getattr(settings, 'SEARCH_BACKEND', 'core.search.SQLiteFTSBackend')
+    return import_string(path)()
+
+
+def index_instance(instance):
+    """
+    Write or refresh the search document of a model instance
+    """
+    kind = kind_for(instance)
+    if kind is not None:
+        using = router.db_for_write(kind.model, instance=instance)
+        get_backend().index(kind, instance.pk, kind.document(instance), using)
+
+
+def remove_instance(instance):
+    """
+    Drop the search document of a deleted model instance
+    """
+    kind = kind_for(instance)
+    if kind is not None:
+        using = router.db_for_write(kind.model, instance=instance)
+        get_backend().remove(kind, instance.pk, using)
+
+
+def rebuild(kind, using, batch_size=2000):
+    """
+    Re-index every row of a kind from scratch in batches
+    """
+    backend = get_backend()
+    backend.clear(kind, using)
+    batch = []
+    queryset = kind.model.objects.using(using).select_related(*kind.related)
+    for instance in queryset.iterator(chunk_size=batch_size):
+        batch.append((instance.pk, kind.document(instance)))
+        if len(batch) >= batch_size:
+            backend.bulk_index(kind, batch, using)
+            batch = []
+    if batch:
+        backend.bulk_index(kind, batch, using)
+
+
+def search(query, kinds=SEARCHABLE, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Run a ranked search on every kind and return a dict of
+    {kind: [instances in rank order]} plus whether a next page exists
+    """
+    results = {name: [] for name in kinds}
+    tokens = tokenize(query)
+    if not tokens:
+        return results, False
+
+    backend = get_backend()
+    offset = (page - 1) * page_size
+    has_next = False
+    for name in kinds:
+        kind = SEARCHABLE[name]
+        using = router.db_for_read(kind.model)
+        # One extra hit tells if another page exists without counting
+        pks = backend.search(kind, tokens, offset, page_size + 1, using)
+        has_next = has_next or len(pks) > page_size
+        pks = pks[:page_size]
+        objects = kind.model.objects.using(using).select_related(*kind.related).in_bulk(pks)
+        results[name] = [objects[pk] for pk in pks if pk in objects]
+    return results, has_next
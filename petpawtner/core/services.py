@@ -0,0 +1,116 @@
+"""
+Write paths shared by the views and management commands
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from . import profiles, realtime, timelines
+from .models import Profile, Post, Like, Message, Follow, TimelineEntry
+
+
+def toggle_like(post_id, user):
+    """
+    Like the post for the user, or unlike it if they already did.
+    The counter is moved with an F() expression so concurrent likes of a
+    hot post never overwrite each other and only no_of_likes, the card
+    version and the likes_received counter of the author are written.
+    Returns a (liked, no_of_likes) tuple.
+    """
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(post_id=post_id, user=user).delete()
+        if deleted:
+            liked, delta = False, -1
+        else:
+            try:
+                # Savepoint so a lost race on the unique constraint does not
+                # break the outer transaction
+                with transaction.atomic():
+                    Like.objects.create(post_id=post_id, user=user)
+                liked, delta = True, 1
+            except IntegrityError:
+                # A concurrent request of the same user already liked it
+                liked, delta = True, 0
+
+        if delta:
+            # Bumping the version in the same statement invalidates the
+            # cached post card atomically with the count it displays
+            Post.objects.filter(pk=post_id).update(
+                no_of_likes=F('no_of_likes') + delta,
+                version=F('version') + 1,
+            )
+            Profile.objects.filter(user__post=post_id).update(
+                likes_received=Greatest(F('likes_received') + delta, 0)
+            )
+        # Raises Post.DoesNotExist for an unknown post, rolling the like back
+        # before its deferred foreign key is ever checked
+        no_of_likes = Post.objects.values_list('no_of_likes', flat=True).get(pk=post_id)
+
+    return liked, no_of_likes
+
+
+def send_message(sender, receiver, content):
+    """
+    Store a message and count it as unread for the receiver,
+    both in one transaction, then push it to connected clients
+    """
+    with transaction.atomic():
+        message = Message.objects.create(sender=sender, receiver=receiver, content=content)
+        Profile.objects.filter(pk=receiver.pk).update(unread_messages=F('unread_messages') + 1)
+        transaction.on_commit(lambda: profiles.invalidate(receiver.user_id))
+        transaction.on_commit(lambda: realtime.publish_message(message))
+    return message
+
+
+def mark_conversation_read(profile, other, up_to=None):
+    """
+    Mark the messages other sent to profile as read, all of them or those
+    sent up to a timestamp, in one UPDATE and take them off the unread
+    counter of profile. Returns how many were marked.
+    """
+    unread = Message.objects.filter(sender=other, receiver=profile, is_read=False)
+    if up_to is not None:
+        unread = unread.filter(timestamp__lte=up_to)
+    with transaction.atomic():
+        marked = unread.update(is_read=True)
+        if marked:
+            # Never below zero, even if messages were added behind send_message
+            Profile.objects.filter(pk=profile.pk).update(
+                unread_messages=Greatest(F('unread_messages') - marked, 0)
+            )
+            transaction.on_commit(lambda: profiles.invalidate(profile.user_id))
+            transaction.on_commit(lambda: realtime.publish_read_receipt(profile, other, marked))
+    return marked
+
+
+def toggle_follow(profile, target):
+    """
+    Follow target for profile, or unfollow it if they already do, moving
+    the follower and following counters with F() updates. A new follow
+    brings the latest posts of target into the timeline of profile once
+    committed, an unfollow takes them out. Returns whether profile now
+    follows target.
+    """
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=profile, followee=target).delete()
+        if deleted:
+            following, delta = False, -1
+            TimelineEntry.objects.filter(owner=profile, author_id=target.user_id).delete()
+        else:
+            try:
+                # Savepoint, see toggle_like()
+                with transaction.atomic():
+                    Follow.objects.create(follower=profile, followee=target)
+                following, delta = True, 1
+                first = not Follow.objects.filter(follower=profile).exclude(followee=target).exists()
+                timelines.schedule(timelines.backfill, profile.pk, target.pk, first)
+            except IntegrityError:
+                following, delta = True, 0
+
+        if delta:
+            Profile.objects.filter(pk=profile.pk).update(following_count=Greatest(F('following_count') + delta, 0))
+            Profile.objects.filter(pk=target.pk).update(follower_count=Greatest(F('follower_count') + delta, 0))
+            transaction.on_commit(lambda: profiles.invalidate(profile.user_id))
+            transaction.on_commit(lambda: profiles.invalidate(target.user_id))
+
+    return following
@@ -0,0 +1,181 @@
+"""
+Signal handlers keeping derived data in sync with the models
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import images, profiles, search, storage, timelines
+from .models import Profile, Pet, Vet, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=Vet)
+@receiver(post_save, sender=Profile)
+def index_searchable(sender, instance, **kwargs):
+    search.index_instance(instance)
+
+
+@receiver(post_delete, sender=Pet)
+@receiver(post_delete, sender=Vet)
+@receiver(post_delete, sender=Profile)
+def unindex_searchable(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+@receiver(post_save, sender=User)
+def reindex_username(sender, instance, created, update_fields=None, **kwargs):
+    """
+    The username is part of profile and vet documents. Logins only write
+    last_login, so saves that name their fields without the username are skipped.
+    """
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    # Post cards show the username
+    Post.objects.filter(user=instance).update(version=F('version') + 1)
+    profile = Profile.objects.filter(user=instance).select_related('user').first()
+    if profile is None:
+        return
+    search.index_instance(profile)
+    vet = Vet.objects.filter(profile=profile).select_related('profile__user').first()
+    if vet is not None:
+        search.index_instance(vet)
+
+
+@receiver(pre_save, sender=Post)
+def bump_card_version(sender, instance, **kwargs):
+    """
+    An edited post gets a new cached card. The bump is done by the UPDATE
+    itself so it is never lost to a concurrent like.
+    """
+    if not instance._state.adding:
+        instance.version = F('version') + 1
+
+
+@receiver(post_save, sender=Post)
+def read_card_version(sender, instance, created, **kwargs):
+    if not created:
+        instance.refresh_from_db(fields=['version'])
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.filter(user_id=instance.user_id).update(post_count=F('post_count') + 1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timelines.schedule(timelines.fan_out, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    """
+    The likes of a deleted post go with it, no_of_likes is their count
+    """
+    Profile.objects.filter(user_id=instance.user_id).update(
+        post_count=Greatest(F('post_count') - 1, 0),
+        likes_received=Greatest(F('likes_received') - instance.no_of_likes, 0),
+    )
+
+
+@receiver(post_save, sender=Pet)
+def count_pet(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.filter(pk=instance.owner_id).update(pet_count=F('pet_count') + 1)
+
+
+@receiver(post_delete, sender=Pet)
+def uncount_pet(sender, instance, **kwargs):
+    Profile.objects.filter(pk=instance.owner_id).update(pet_count=Greatest(F('pet_count') - 1, 0))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=Vet)
+@receiver(post_save, sender=Profile)
+def render_image_variants(sender, instance, **kwargs):
+    if instance.needs_variants():
+        images.schedule(instance)
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=Pet)
+@receiver(post_init, sender=Vet)
+@receiver(post_init, sender=Profile)
+def remember_stored_file(sender, instance, **kwargs):
+    """
+    Remember which file a row loaded from the database references.
+    __dict__ is read directly so deferred fields are not fetched.
+    """
+    value = instance.__dict__.get(sender.variants_field)
+    if not value:
+        instance._stored_file = ''
+    else:
+        instance._stored_file = value if isinstance(value, str) else value.name
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Pet)
+@receiver(pre_save, sender=Vet)
+@receiver(pre_save, sender=Profile)
+def remember_upload(sender, instance, **kwargs):
+    """
+    Keep the file this save uploads, storage.retain() writes it again if
+    its blob is collected before the reference is counted
+    """
+    field = getattr(instance, sender.variants_field)
+    instance._upload = field.file if field and not field._committed else None
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=Vet)
+@receiver(post_save, sender=Profile)
+def count_blob_references(sender, instance, created, **kwargs):
+    name = getattr(instance, sender.variants_field).name or ''
+    # A new row references nothing yet, whatever it was built with
+    stored = '' if created else instance._stored_file
+    if name != stored:
+        storage.retain(name, getattr(instance, '_upload', None))
+        storage.release(stored)
+        instance._stored_file = name
+    instance._upload = None
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Pet)
+@receiver(post_delete, sender=Vet)
+@receiver(post_delete, sender=Profile)
+def release_blob(sender, instance, **kwargs):
+    storage.release(instance._stored_file)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    profiles.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # The cached user carries the password hash sessions are checked against
+    profiles.invalidate(instance.pk)
+
+
+def setup_search_index(sender, using, **kwargs):
+    """
+    Create the search index after migrate and fill it
+    the first time it is created
+    """
+    if search.get_backend().setup(using):
+        for kind in search.SEARCHABLE.values():
+            search.rebuild(kind, using)
+
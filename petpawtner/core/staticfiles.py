@@ -0,0 +1,222 @@
+"""
+Static asset pipeline, run by collectstatic when STATIC_PIPELINE is on.
+The stylesheets and scripts of each page are concatenated into the
+bundles of settings.STATIC_BUNDLES and minified, then every file is
+copied under a content-hashed name so it can be cached forever. Text
+files get gzip and, when the brotli package is installed, brotli
+siblings compressed once at build time, and PNG and JPEG images are
+re-encoded losslessly when that makes them smaller.
+serve() answers with the best precompressed sibling the client accepts.
+"""
+import gzip
+import io
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views import static
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+
+# Hashed names change with their content, anything else may change in place
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=3600'
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+COMPRESSED_TYPES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico')
+COMPRESS_MIN_SIZE = 512
+# A sibling must save at least this share of the bytes to be written
+COMPRESS_MIN_SAVING = 0.05
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_TOKENS = re.compile(
+    r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*!.*?\*/)'''  # strings and /*! licenses */, kept
+    r'|/\*.*?\*/'                                             # other comments
+    r'|\s*([{};,])\s*'                                        # punctuation and its blanks
+    r'|(\s+)',
+    re.S,
+)
+CSS_IMPORT = re.compile(r'''@import\s+(?:"[^"]*"|'[^']*'|url\((?:"[^"]*"|'[^']*'|[^)]*)\))[^;]*;''')
+CSS_CHARSET = re.compile(r'@charset\s+"[^"]*";')
+
+
+def minify_css(text):
+    def replace(match):
+        kept, punctuation, blank = match.groups()
+        return kept or punctuation or (' ' if blank else '')
+    return CSS_TOKENS.sub(replace, text).strip()
+
+
+def minify_js(text):
+    # Without a JavaScript parser the scripts are only concatenated,
+    # gzip and brotli still remove most of the redundancy
+    return rjsmin.jsmin(text) if rjsmin else text
+
+
+def join_css(sources):
+    """
+    Concatenate stylesheets. @import rules only apply at the top of a
+    stylesheet, so they are moved there, and @charset is dropped.
+    """
+    imports = []
+    bodies = []
+    for text in sources:
+        for rule in CSS_IMPORT.findall(text):
+            if rule not in imports:
+                imports.append(rule)
+        bodies.append(CSS_CHARSET.sub('', CSS_IMPORT.sub('', text)))
+    return minify_css('\n'.join(imports + bodies))
+
+
+def join_js(sources):
+    # A script without a trailing semicolon must not run into the next one
+    return minify_js('\n;\n'.join(sources))
+
+
+def compress(data):
+    """
+    Yield the (suffix, bytes) siblings worth writing for data
+    """
+    limit = len(data) * (1 - COMPRESS_MIN_SAVING)
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < limit:
+        yield '.gz', compressed
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < limit:
+            yield '.br', compressed
+
+
+def optimize_image(data, ext):
+    """
+    Re-encode a PNG or JPEG without losing anything, or return None
+    when that does not make it smaller
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        output = io.BytesIO()
+        if ext == '.png':
+            image.save(output, 'PNG', optimize=True)
+        elif image.format == 'JPEG':
+            image.save(
+                output, 'JPEG', quality='keep', subsampling='keep', optimize=True, progressive=True,
+                exif=image.info.get('exif', b''), icc_profile=image.info.get('icc_profile'),
+            )
+        else:
+            return None
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(data) else None
+
+
+class BundlingStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that first writes the bundles, then
+    optimizes the images and precompresses the hashed copies
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+
+        for name, sources in settings.STATIC_BUNDLES.items():
+            self.build(name, sources, paths)
+            paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        for name in set(self.hashed_files.values()):
+            self.finish(name)
+
+    def build(self, name, sources, paths):
+        texts = []
+        for source in sources:
+            if source not in paths:
+                raise ImproperlyConfigured(f'Static bundle {name} includes {source}, which was not found')
+            if name.endswith('.css') and posixpath.dirname(source) != posixpath.dirname(name):
+                # Relative url() references would resolve against the bundle
+                raise ImproperlyConfigured(f'Static bundle {name} must be in the directory of {source}')
+            storage, path = paths[source]
+            with storage.open(path) as handle:
+                texts.append(handle.read().decode('utf-8'))
+
+        content = join_css(texts) if name.endswith('.css') else join_js(texts)
+        if self.exists(name):
+            self.delete(name)
+        self.save(name, ContentFile(content.encode('utf-8')))
+
+    def finish(self, name):
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in COMPRESSED_TYPES + ('.png', '.jpg', '.jpeg'):
+            return
+        with self.open(name) as handle:
+            data = handle.read()
+
+        if ext in COMPRESSED_TYPES:
+            if len(data) >= COMPRESS_MIN_SIZE:
+                for suffix, compressed in compress(data):
+                    self.replace(name + suffix, compressed)
+            return
+        try:
+            optimized = optimize_image(data, ext)
+        except (OSError, SyntaxError):
+            # Not an image Pillow can read, served as collected
+            return
+        if optimized is not None:
+            self.replace(name, optimized)
+
+    def replace(self, name, data):
+        if self.exists(name):
+            self.delete(name)
+        self.save(name, ContentFile(data))
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # The bundled third party stylesheets reference images and
+            # fonts that were never shipped, leave those urls as they are
+            if content is not None:
+                raise
+            return name
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def serve(request, path):
+    """
+    Serve a file from STATIC_ROOT, the precompressed sibling the client
+    accepts when there is one. Hashed names are cached forever.
+    """
+    accepted = accepted_encodings(request)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(safe_join(settings.STATIC_ROOT, path + suffix)):
+            # guess_type() reads the suffix as the Content-Encoding
+            response = static.serve(request, path + suffix, document_root=settings.STATIC_ROOT)
+            break
+    else:
+        response = static.serve(request, path, document_root=settings.STATIC_ROOT)
+
+    patch_vary_headers(response, ['Accept-Encoding'])
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(path) else CACHE_CONTROL
+    return response
@@ -0,0 +1,127 @@
+"""
+Content-addressed media storage.
+Uploads are stored once under the SHA-256 of their bytes, so uploading
+the same picture again reuses the existing file instead of writing a copy
+with a random suffix. Blob rows count how many image fields reference each
+file and the file is deleted when the last reference goes away.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob
+
+
+BLOB_PREFIX = 'blobs'
+BLOB_NAME = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(?:\.\w+)?$')
+
+
+def file_digest(content):
+    """
+    SHA-256 of a Django File, read in chunks so large uploads are never
+    held in memory. Upload handlers that already hashed the stream while
+    receiving it set content.sha256 and skip the second pass.
+    """
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/')
+
+
+def blob_digest(name):
+    """
+    The SHA-256 a blob is stored under, None for any other file
+    """
+    match = BLOB_NAME.match(name)
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that ignores the requested file name and stores
+    the content at blobs/<2 hex>/<sha256><ext>
+    """
+    def blob_name(self, digest, name):
+        _, ext = os.path.splitext(name)
+        return f'{BLOB_PREFIX}/{digest[:2]}/{digest}{ext.lower()}'
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed
+        return name
+
+    def _save(self, name, content):
+        name = self.blob_name(file_digest(content), name)
+        if self.exists(name):
+            return name
+
+        # Write under a unique temporary name and rename, so two identical
+        # uploads racing each other both end up with one complete file
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+def retain(name, content=None):
+    """
+    Count one more reference to a blob. The counting UPDATE locks the row
+    until the transaction commits, so collect() cannot delete the file
+    meanwhile. A file collected between the upload reusing it and this
+    call is written again from content, the uploaded file.
+    """
+    if not is_blob(name):
+        return
+    with transaction.atomic():
+        counted = Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+        if not default_storage.exists(name):
+            if content is None:
+                raise FileNotFoundError(f'Blob {name} was collected')
+            default_storage.save(name, content)
+        if counted:
+            return
+        try:
+            with transaction.atomic():
+                Blob.objects.create(name=name, size=default_storage.size(name), refcount=1)
+        except IntegrityError:
+            # Created by a concurrent upload of the same content
+            Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release(name):
+    """
+    Drop one reference to a blob. Once the transaction commits, a blob
+    nobody references any more is deleted along with its resized variants.
+    """
+    if not is_blob(name):
+        return
+    Blob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+    transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    """
+    Delete the blob file and its variants if no field references it.
+    The row is locked and deleted before the files, see retain().
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name, refcount=0).first()
+        if blob is None:
+            return
+        blob.delete()
+        default_storage.delete(name)
+        for variant in blob.variants.get('variants', []):
+            for path in (variant['jpeg'], variant['webp']):
+                # A variant can be byte-identical to an upload of its own
+                if not Blob.objects.filter(name=path).exists():
+                    default_storage.delete(path)
@@ -0,0 +1,75 @@
+"""
+"Vets And Pet Owners Near You" suggestions on the home page.
+A small pool of profiles is sampled with random primary key ranges and
+cached, each page load then only picks from the pool, so the cost of
+the widget does not grow with the number of users.
+"""
+import random
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from .models import Profile
+
+
+SUGGESTION_COUNT = 4
+SUGGESTION_POOL_SIZE = 200
+SUGGESTION_POOL_TTL = 300
+SUGGESTION_POOL_CACHE_KEY = 'core:suggestion_pool'
+
+# Profiles read per random range probe
+_PROBE_SIZE = 20
+
+
+def build_pool(size=SUGGESTION_POOL_SIZE):
+    """
+    Sample up to size distinct profiles with a profile image.
+    Every probe is an indexed range scan starting at a random primary key,
+    so building the pool is a handful of small queries on any table size.
+    """
+    bounds = Profile.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+
+    profiles = (
+        Profile.objects.exclude(profileimg='')
+        .select_related('user')
+        .only('pk', 'profileimg', 'image_variants', 'location', 'user__username')
+        .order_by('pk')
+    )
+    # Small tables fit in the pool whole
+    if bounds['high'] - bounds['low'] < size:
+        return list(profiles[:size])
+
+    pool = {}
+    # Bounded number of probes, sparse tables simply return a smaller pool
+    for _ in range(max(size // _PROBE_SIZE, 1) * 2):
+        start = random.randint(bounds['low'], bounds['high'])
+        probe = list(profiles.filter(pk__gte=start)[:_PROBE_SIZE])
+        if len(probe) < _PROBE_SIZE:
+            # Wrap around to the start of the table
+            probe += profiles.filter(pk__lt=start)[:_PROBE_SIZE - len(probe)]
+        for profile in probe:
+            pool[profile.pk] = profile
+        if len(pool) >= size:
+            break
+    return list(pool.values())[:size]
+
+
+def get_pool():
+    """
+    Return the cached suggestion pool, rebuilding it when the TTL ran out
+    """
+    pool = cache.get(SUGGESTION_POOL_CACHE_KEY)
+    if pool is None:
+        pool = build_pool()
+        cache.set(SUGGESTION_POOL_CACHE_KEY, pool, SUGGESTION_POOL_TTL)
+    return pool
+
+
+def suggest_profiles(viewer, count=SUGGESTION_COUNT):
+    """
+    Return up to count distinct profiles, never the viewer's own
+    """
+    candidates = [profile for profile in get_pool() if profile.user_id != viewer.pk]
+    return random.sample(candidates, min(count, len(candidates)))
@@ -0,0 +1,27 @@
+"""
+{% bundle 'css/site.css' %} links a bundle of settings.STATIC_BUNDLES.
+Once collectstatic built the bundles it is a single hashed file,
+without the pipeline every source is linked on its own.
+"""
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from core.staticfiles import BundlingStorage
+
+register = template.Library()
+
+
+TAGS = {
+    '.css': '<link rel="stylesheet" href="{}">',
+    '.js': '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def bundle(name):
+    tag = TAGS[name[name.rindex('.'):]]
+    sources = [name] if isinstance(staticfiles_storage, BundlingStorage) else settings.STATIC_BUNDLES[name]
+    return format_html_join('\n', tag, ((static(source),) for source in sources))
@@ -0,0 +1,45 @@
+"""
+Test helpers shared by the test suite
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _QueryBudgetContext(CaptureQueriesContext):
+    """
+    Capture the queries run inside the block and fail the test
+    if there are more than the budget allows
+    """
+    def __init__(self, test_case, budget, connection):
+        self.test_case = test_case
+        self.budget = budget
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        executed = len(self)
+        queries = '\n'.join(
+            f"{i}. {query['sql']}" for i, query in enumerate(self.captured_queries, start=1)
+        )
+        self.test_case.assertLessEqual(
+            executed, self.budget,
+            f"{executed} queries executed, budget is {self.budget}\nCaptured queries were:\n{queries}"
+        )
+
+
+class QueryBudgetMixin:
+    """
+    Mixin for TestCase classes that pins how many queries a view may run.
+    Unlike assertNumQueries the budget is an upper bound, so it keeps passing
+    when a view gets cheaper and only fails when queries creep back in
+    (for example a template that walks a relation per row again).
+    """
+    def assertQueryBudget(self, budget, func=None, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+        context = _QueryBudgetContext(self, budget, connections[using])
+        if func is None:
+            return context
+
+        with context:
+            return func(*args, **kwargs)
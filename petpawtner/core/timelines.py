@@ -0,0 +1,195 @@
+"""
+Precomputed home timelines (fan-out on write).
+Once a post commits it is handed to a local thread pool which writes it
+into the timeline of its author and of every follower, so the home page
+of a profile is one range scan of its TimelineEntry rows instead of a
+join over everyone it follows. Authors with TIMELINE_CELEBRITY_FOLLOWERS
+followers or more are not fanned out, their posts are merged in when the
+timeline is read (fan-out on read). Profiles following nobody see the
+global feed. Timelines keep about TIMELINE_LENGTH posts: the
+trim_timelines command drops older entries and backfill_timelines
+rebuilds timelines from the follow graph.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import Follow, Post, Profile, TimelineEntry
+from .pagination import FEED_PAGE_SIZE, encode_cursor, keyset, paginate_feed
+
+logger = logging.getLogger(__name__)
+
+
+_executor = None
+
+
+def is_celebrity(profile):
+    return profile.follower_count >= settings.TIMELINE_CELEBRITY_FOLLOWERS
+
+
+def write_entries(owner_ids, posts):
+    """
+    Add (pk, user_id, created_at) posts to the timelines of owner_ids,
+    skipping the ones already there
+    """
+    entries = [
+        TimelineEntry(owner_id=owner_id, post_id=pk, author_id=user_id, created_at=created_at)
+        for owner_id in owner_ids
+        for pk, user_id, created_at in posts
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE, ignore_conflicts=True)
+    return len(entries)
+
+
+def latest_posts(user_ids):
+    """
+    The newest TIMELINE_LENGTH posts of some authors as (pk, user_id, created_at)
+    """
+    posts = keyset(Post.objects.filter(user_id__in=user_ids), 'created_at')
+    return list(posts.values_list('pk', 'user_id', 'created_at')[:settings.TIMELINE_LENGTH])
+
+
+def fan_out(post_id):
+    """
+    Write a post into the timeline of its author and, unless the author is
+    a celebrity, of its followers, walking them in batches on the
+    (followee, follower) index. Returns how many entries were written.
+    """
+    post = Post.objects.filter(pk=post_id).values_list('pk', 'user_id', 'created_at').first()
+    # Deleted before the worker got to it, or written by a user without a profile
+    author = Profile.objects.filter(user_id=post[1]).first() if post else None
+    if author is None:
+        return 0
+
+    written = write_entries([author.pk], [post])
+    if is_celebrity(author):
+        return written
+    last_follower = 0
+    while True:
+        followers = list(
+            Follow.objects.filter(followee=author, follower_id__gt=last_follower)
+            .order_by('follower_id')
+            .values_list('follower_id', flat=True)[:settings.TIMELINE_FANOUT_BATCH_SIZE]
+        )
+        if not followers:
+            return written
+        written += write_entries(followers, [post])
+        last_follower = followers[-1]
+
+
+def backfill(follower_id, followee_id, own=False):
+    """
+    Bring the latest posts of a newly followed profile into the timeline
+    of its follower. With own, on the first follow, the latest posts of
+    the follower too: until then its home was the global feed, and its
+    timeline may lack the posts it wrote before timelines were kept.
+    """
+    authors = []
+    followee = Profile.objects.filter(pk=followee_id).first()
+    if followee is not None and not is_celebrity(followee):
+        authors.append(followee.user_id)
+    if own:
+        authors += Profile.objects.filter(pk=follower_id).values_list('user_id', flat=True)
+    return write_entries([follower_id], latest_posts(authors)) if authors else 0
+
+
+def rebuild(profile):
+    """
+    Replace the timeline of a profile with the latest posts of itself and
+    of the profiles it follows, celebrities aside
+    """
+    authors = [profile.user_id] + list(
+        Follow.objects.filter(
+            follower=profile, followee__follower_count__lt=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+        ).values_list('followee__user_id', flat=True)
+    )
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner=profile).delete()
+        return write_entries([profile.pk], latest_posts(authors))
+
+
+def trim(owner_id):
+    """
+    Drop the entries of a timeline past its newest TIMELINE_LENGTH posts
+    """
+    entries = keyset(TimelineEntry.objects.filter(owner_id=owner_id), 'created_at', key='post')
+    cutoff = entries.values_list('created_at', 'post_id')[settings.TIMELINE_LENGTH:settings.TIMELINE_LENGTH + 1].first()
+    if cutoff is None:
+        return 0
+    created_at, post_id = cutoff
+    older = TimelineEntry.objects.filter(owner_id=owner_id, created_at__lte=created_at).exclude(
+        created_at=created_at, post_id__gt=post_id,
+    )
+    return older.delete()[0]
+
+
+def home_feed(profile, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    One page of the home timeline of a profile and the cursor of the next
+    page, with the posts of followed celebrities merged in. The cursor is
+    the one of paginate_feed(), both walk posts on (created_at, pk).
+    """
+    if not profile or not profile.following_count:
+        return paginate_feed(Post.objects.select_related('user'), cursor, page_size)
+
+    celebrities = list(
+        Follow.objects.filter(
+            follower=profile, followee__follower_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+        ).values_list('followee__user_id', flat=True)
+    )
+    entries = TimelineEntry.objects.filter(owner=profile).select_related('post__user')
+    if celebrities:
+        # Fanned out before the author became a celebrity, read below instead
+        entries = entries.exclude(author_id__in=celebrities)
+    posts = [entry.post for entry in keyset(entries, 'created_at', cursor, key='post')[:page_size + 1]]
+
+    if celebrities:
+        posts += keyset(Post.objects.filter(user_id__in=celebrities).select_related('user'), 'created_at', cursor)[:page_size + 1]
+        posts.sort(key=lambda post: (post.created_at, post.pk), reverse=True)
+
+    page = posts[:page_size]
+    next_cursor = encode_cursor(page[-1]) if len(posts) > page_size else None
+    return page, next_cursor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        # A failed fan-out must not fail the request or kill a worker,
+        # backfill_timelines repairs the timelines it missed
+        logger.exception('Could not run %s%r', func.__name__, args)
+
+
+def _run_in_worker(func, *args):
+    try:
+        _run(func, *args)
+    finally:
+        # Worker threads own their connections, do not leak them
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'TIMELINE_WORKERS', 2),
+            thread_name_prefix='timeline-fanout',
+        )
+    return _executor
+
+
+def schedule(func, *args):
+    """
+    Queue a timeline write once the current transaction commits.
+    With settings.TIMELINE_WORKERS = 0 it runs inline instead.
+    """
+    def submit():
+        if getattr(settings, 'TIMELINE_WORKERS', 2) == 0:
+            _run(func, *args)
+        else:
+            get_executor().submit(_run_in_worker, func, *args)
+
+    transaction.on_commit(submit)
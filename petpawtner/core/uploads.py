@@ -0,0 +1,160 @@
+"""
+Upload handling for images.
+ImageUploadHandler (installed through settings.FILE_UPLOAD_HANDLERS)
+streams every uploaded file to a temporary file in small chunks while
+hashing it, checks its magic bytes and pixel size from the first chunk
+and rejects it as soon as it crosses settings.MAX_UPLOAD_SIZE, so no
+upload is ever held in memory. Rejected files never reach request.FILES,
+views read the reason with upload_error().
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+
+# Bytes looked at to find the format and the dimensions
+HEADER_SIZE = 64 * 2 ** 10
+
+# (format, content type, magic bytes at offset 0, extra bytes at offset 8)
+IMAGE_SIGNATURES = (
+    ('JPEG', 'image/jpeg', b'\xff\xd8\xff', None),
+    ('PNG', 'image/png', b'\x89PNG\r\n\x1a\n', None),
+    ('GIF', 'image/gif', b'GIF87a', None),
+    ('GIF', 'image/gif', b'GIF89a', None),
+    ('WEBP', 'image/webp', b'RIFF', b'WEBP'),
+)
+UNSUPPORTED = 'Only JPEG, PNG, GIF and WebP images can be uploaded.'
+
+
+def sniff(header):
+    """
+    Return the (format, content type) of an image header, or None
+    if its magic bytes are not one of the accepted formats
+    """
+    for fmt, content_type, magic, extra in IMAGE_SIGNATURES:
+        if header.startswith(magic) and (extra is None or header[8:12] == extra):
+            return fmt, content_type
+    return None
+
+
+def upload_error(request, field_name):
+    """
+    Return why the file sent in field_name was rejected, or None
+    """
+    return getattr(request, 'upload_errors', {}).get(field_name)
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Stream uploaded images to a temporary file, hashing and validating
+    them on the way. The SHA-256 is left on the file as .sha256 so the
+    content-addressed storage does not read it a second time.
+    """
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None and not hasattr(request, 'upload_errors'):
+            request.upload_errors = {}
+
+    def discard(self, message):
+        """
+        Record why the current file was rejected and delete what was written
+        """
+        if self.request is not None:
+            self.request.upload_errors[self.field_name] = message
+        self.file.close()
+
+    def reject(self, message, stop=False):
+        self.discard(message)
+        # Stopping skips reading the rest of the request body entirely
+        raise StopUpload(connection_reset=True) if stop else SkipFile()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.max_size = settings.MAX_UPLOAD_SIZE
+        self.max_pixels = settings.MAX_UPLOAD_PIXELS
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.format = None
+        self.header = b''
+        self.checked = False
+        if content_length is not None and content_length > self.max_size:
+            self.reject(self.too_large(), stop=True)
+
+    def too_large(self):
+        return f'Images must be smaller than {filesizeformat(self.max_size)}.'
+
+    def too_many_pixels(self):
+        return f'Images must have at most {self.max_pixels:,} pixels.'
+
+    def inspect(self, data):
+        """
+        Look at the start of the file until its format and dimensions
+        are known, header is set to None once it is done
+        """
+        self.header += data
+        if self.format is None:
+            if len(self.header) < 12:
+                return
+            detected = sniff(self.header)
+            if detected is None:
+                self.reject(UNSUPPORTED)
+            self.format, self.file.content_type = detected
+
+        try:
+            # Image.open only parses the header, no pixel is decoded
+            with Image.open(BytesIO(self.header), formats=[self.format]) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.reject(self.too_many_pixels())
+        except (OSError, SyntaxError, ValueError):
+            if len(self.header) < HEADER_SIZE:
+                # The header is not complete yet
+                return
+            # Unusually long header, checked again once the file is complete
+        else:
+            if width * height > self.max_pixels:
+                self.reject(self.too_many_pixels())
+            self.checked = True
+        self.header = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.reject(self.too_large(), stop=True)
+        if self.header is not None:
+            self.inspect(raw_data)
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        # Raising is not possible any more, rejected files are dropped
+        if self.format is None:
+            self.discard(UNSUPPORTED)
+            return None
+        self.file.seek(0)
+        if not self.checked:
+            try:
+                with Image.open(self.file, formats=[self.format]) as image:
+                    width, height = image.size
+            except Image.DecompressionBombError:
+                self.discard(self.too_many_pixels())
+                return None
+            except (OSError, SyntaxError, ValueError):
+                self.discard(UNSUPPORTED)
+                return None
+            if width * height > self.max_pixels:
+                self.discard(self.too_many_pixels())
+                return None
+            self.file.seek(0)
+
+        self.file.size = file_size
+        self.file.sha256 = self.sha256.hexdigest()
+        return self.file
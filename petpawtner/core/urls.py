@@ -10,13 +10,20 @@ add url patterns as will be used in the view.py
 urlpatterns = [
     path('', views.index, name='index'),  # Landng page
     path('home/', views.home, name='home'),  # Home page
+    path('feed/', views.feed, name='feed'),  # Next page of the home feed
     path('signup/', views.signup, name='signup'),  # User signup
     path('settings/', views.settings, name='settings'),  # User settings
     path('profile/<str:pk>', views.profile, name='profile'),  # profile
+    path('profile/<str:pk>/posts/', views.profile_posts, name='profile_posts'),  # Next page of a profile's posts
+    path('profile/<str:pk>/follow/', views.follow, name='follow'),  # Follow or unfollow a profile
     path('add_pets/', views.add_pets, name='add_pets'),  # Add pets page
     path('signin/', views.signin, name='signin'),  # User signin
     path('signout/', views.signout, name='signout'),  # User signout
     path('search/', views.search, name='search'), # Search page
     path('post/', views.post, name='post'), # Post page
-    path('like_post/', views.like_post, name='like_post') # Like post
+    path('like_post/', views.like_post, name='like_post'), # Like post
+    path('like/', views.like, name='like'), # Toggle a like, answers JSON
+    path('inbox/', views.inbox, name='inbox'), # Conversations of the user
+    path('messages/<str:username>/', views.conversation, name='conversation'), # Messages with one user
+    path('metrics', views.metrics, name='metrics'), # Request metrics for Prometheus
 ]
@@ -1,10 +1,27 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User, auth
 from django.contrib import messages
-from django.http import HttpResponse
-from .models import Profile, Pet, Vet, Post, Like
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.template.loader import render_to_string
+from .models import Profile, Pet, Vet, Post, Like, Follow
+from .fragments import render_post_cards
+from .routers import replica_reads
+from .pagination import PROFILE_PAGE_SIZE, InvalidCursor, paginate
+from .messaging import conversations, thread
+from .services import mark_conversation_read, send_message, toggle_follow, toggle_like
+from . import accounts
+from . import metrics as request_metrics
+from . import search as search_index
+from . import timelines
+from .suggestions import suggest_profiles
+from .uploads import upload_error
+from .websocket import WEBSOCKET_PATH
 from django.contrib.auth.decorators import login_required
-import random
+from django.conf import settings as django_settings
+from django.db import IntegrityError
+from django.db.models import Q
+from asgiref.sync import sync_to_async
+import uuid
 
 
 
@@ -16,76 +33,150 @@ def index(request):
     return render(request, 'index.html')
 
 @login_required(login_url='signin')
+@replica_reads
 def home(request):
     """
     Define an home function that returns HttpResponse (home, the app home page)
     """
-    users_with_profile = User.objects.filter(profile__profileimg__isnull=False)
+    user_profile = request.profile
+    if not user_profile:
+        raise Http404('No profile')
+    # Only the first page is rendered, the rest is fetched through feed().
+    # Precomputed per profile, see core/timelines.py
+    posts, next_cursor = timelines.home_feed(user_profile)
+    # Picked from a cached pool, not from every user in the database
+    suggested_profiles = suggest_profiles(request.user)
 
-    
-    user_profile = Profile.objects.get(user=request.user)
-    posts = Post.objects.all()
-    random_user = random.choice(users_with_profile) if users_with_profile else None
+    context = {
+        'user_profile': user_profile,
+        'posts': posts,
+        # Cached per post, see core/fragments.py
+        'cards': render_post_cards(posts),
+        'next_cursor': next_cursor,
+        'suggested_profiles': suggested_profiles,
+    }
+    return render(request, 'home.html', context)
 
-    return render(request, 'home.html', {'user_profile': user_profile, 'posts': posts, 'random_user': random_user})
 
-def signup(request):
+@login_required(login_url='signin')
+@replica_reads
+def feed(request):
     """
-    Define signup function that returns POST form of signed up user to the database
+    Define a feed function that returns the next page of the home feed
+    as JSON, holding the rendered post cards and the cursor of the page after it
     """
-    if request.method == 'POST':
-        username = request.POST['username']
-        email = request.POST['email']
-        password = request.POST['password']
-        password2 = request.POST['password2']
-
-        if password == password2:
-            if User.objects.filter(username=username).exists():
-                messages.info(request, 'Username Taken')
-                return render(request, 'signup.html')
-            elif User.objects.filter(email=email).exists():
-                messages.info(request, 'Email Taken')
-                return render(request, 'signup.html')
-            else:
-                user = User.objects.create_user(username=username, email=email, password=password)
-                user.save()
-
-                # Create a profile object for the user
-                Profile.objects.create(user=user)  # Create profile with default values
-
-                # Log user in and redirect to settings page
-                user_signin = auth.authenticate(username=username, password=password)
-                auth.login(request, user_signin)
-
-                # Redirect to settings page for profile completion
-                return redirect('settings')
-
-        else:
-            messages.info(request, 'Passwords do not match')
-            return render(request, 'signup.html')
-
-    else:
-        return render(request, 'signup.html')
+    try:
+        posts, next_cursor = timelines.home_feed(request.profile, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+
+    html = render_to_string('partials/feed_page.html', {'cards': render_post_cards(posts)}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+async def signup(request):
+    """
+    Define an async signup function that creates the user and its profile
+    from the POST form and logs them in. Hashing runs on the hash pool and
+    taken usernames or emails are found by the unique indexes, see
+    core/accounts.py
+    """
+    if request.method != 'POST':
+        return await sync_to_async(render)(request, 'signup.html')
+
+    username = request.POST['username']
+    email = request.POST['email']
+    password = request.POST['password']
+    password2 = request.POST['password2']
+
+    if password != password2:
+        messages.info(request, 'Passwords do not match')
+        return await sync_to_async(render)(request, 'signup.html')
+
+    try:
+        accounts.check_throttle(request, username)
+        user = await accounts.signup(username, email, password)
+    except accounts.Throttled:
+        messages.info(request, 'Too many attempts, try again later')
+        return await sync_to_async(render)(request, 'signup.html', status=429)
+    except IntegrityError:
+        taken = await sync_to_async(accounts.taken_field)(username)
+        messages.info(request, 'Username Taken' if taken == 'username' else 'Email Taken')
+        return await sync_to_async(render)(request, 'signup.html')
+
+    # Log the new user in without hashing the password again
+    await sync_to_async(auth.login)(request, user, backend=django_settings.AUTHENTICATION_BACKENDS[0])
+
+    # Redirect to settings page for profile completion
+    return redirect('settings')
+
+def profile_grid(username, cursor=None):
+    """
+    One page of the post grid of a profile. Only the columns of a grid
+    tile are loaded, captions can be long.
+    """
+    posts = Post.objects.filter(user__username=username).only('id', 'user_id', 'image', 'image_variants', 'created_at')
+    return paginate(posts, 'created_at', cursor, PROFILE_PAGE_SIZE)
+
 
 @login_required(login_url='signin')
+@replica_reads
 def profile(request, pk):
     """
     Define a profile function that returns profile.html where users can view their profile
     """
-    user_object = User.objects.get(username=pk)
-    user_profile = Profile.objects.get(user=user_object)
-    user_posts = Post.objects.filter(user=user_object)
-    user_post_len = len(user_posts)
-
+    # Fetch the profile and its user in one joined query
+    user_profile = get_object_or_404(Profile.objects.select_related('user'), user__username=pk)
+    user_object = user_profile.user
+    # Only the first page is rendered, the rest is fetched through profile_posts()
+    user_posts, next_cursor = profile_grid(pk)
+    following = bool(request.profile) and Follow.objects.filter(follower=request.profile, followee=user_profile).exists()
+
+    # The header counts come from the Profile counters, not from the posts
     context = {
         'user_object': user_object,
         'user_profile': user_profile,
         'user_posts': user_posts,
-        'user_post_len': user_post_len,
+        'next_cursor': next_cursor,
+        'following': following,
     }
     return render(request, 'profile.html', context)
 
 
+@login_required(login_url='signin')
+def follow(request, pk):
+    """
+    Define a follow function that follows or unfollows the profile of a
+    pet owner or vet through a POST and redirects back to it
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    user_profile = request.profile
+    if not user_profile:
+        raise Http404('No profile')
+    target = get_object_or_404(Profile, user__username=pk)
+    if target.pk == user_profile.pk:
+        return HttpResponseBadRequest('Cannot follow yourself')
+
+    toggle_follow(user_profile, target)
+    return redirect('profile', pk)
+
+
+@login_required(login_url='signin')
+@replica_reads
+def profile_posts(request, pk):
+    """
+    Define a profile_posts function that returns the next page of a profile's
+    post grid as JSON, holding the rendered tiles and the cursor of the page after it
+    """
+    try:
+        user_posts, next_cursor = profile_grid(pk, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+
+    html = render_to_string('partials/profile_posts.html', {'user_posts': user_posts}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
 @login_required(login_url='signin')
 def settings(request):
     """
@@ -97,15 +188,25 @@ def settings(request):
     where they can add profile of their pets before they are returned to home 
     page
     """
-    profile = Profile.objects.get(user=request.user)
-    
+    profile = request.profile
+    if not profile:
+        raise Http404('No profile')
+
     if request.method == 'POST':
+        # request.profile may be cached behind updates made outside save(),
+        # such as the image variants, which saving it would overwrite
+        profile = Profile.objects.get(pk=profile.pk)
         # Handle the form submission and update the profile
         role = request.POST.get('role')
         bio = request.POST.get('bio')
         location = request.POST.get('location')
         profileimg = request.FILES.get('profileimg')
 
+        error = upload_error(request, 'profileimg')
+        if error:
+            messages.error(request, error)
+            return redirect('settings')
+
         # Update the profile
         profile.role = role
         profile.bio = bio
@@ -138,9 +239,8 @@ def add_pets(request):
     Create a add_pets function that allows pet owners to add pet details.
     """
     if request.method == 'POST':
-        try:
-            profile = Profile.objects.get(user=request.user)
-        except Profile.DoesNotExist:
+        profile = request.profile
+        if not profile:
             messages.error(request, 'Profile does not exist.')
             return redirect('settings')
 
@@ -151,6 +251,11 @@ def add_pets(request):
         pet_location = request.POST.get('location')
         pet_profileimg = request.FILES.get('profileimg')
 
+        error = upload_error(request, 'profileimg')
+        if error:
+            messages.error(request, error)
+            return redirect('add_pets')
+
         Pet.objects.create(
             owner=profile,
             name=pet_name,
@@ -166,25 +271,31 @@ def add_pets(request):
     return render(request, 'add_pets.html')
 
 
-def signin(request):
+async def signin(request):
     """
-    define signin funtion that returns signin.html upon successfuly
-    uthenticating a user
+    Define an async signin function that logs a user in from the POST
+    form, checking the password on the hash pool, and returns signin.html
+    otherwise
     """
-    if request.method == 'POST':
-        username = request.POST['username']
-        password = request.POST['password']
+    if request.method != 'POST':
+        return await sync_to_async(render)(request, 'signin.html')
 
-        user = auth.authenticate(username=username, password=password)
+    username = request.POST['username']
+    password = request.POST['password']
 
-        if user is not None:
-            auth.login(request, user)
-            return redirect('home')
-        else:
-            messages.info(request, 'Invalid Credentials')
-            return redirect('signin')
-    else:
-        return render(request, 'signin.html')
+    try:
+        accounts.check_throttle(request, username)
+    except accounts.Throttled:
+        messages.info(request, 'Too many attempts, try again later')
+        return await sync_to_async(render)(request, 'signin.html', status=429)
+
+    user = await accounts.authenticate(username, password)
+    if user is None:
+        messages.info(request, 'Invalid Credentials')
+        return redirect('signin')
+
+    await sync_to_async(auth.login)(request, user, backend=django_settings.AUTHENTICATION_BACKENDS[0])
+    return redirect('home')
 
 
 @login_required(login_url='signin')
@@ -198,6 +309,11 @@ def post(request):
         image = request.FILES.get('image_upload')
         caption = request.POST.get('caption')
 
+        error = upload_error(request, 'image_upload')
+        if error:
+            messages.error(request, error)
+            return redirect('home')
+
         if not image or not caption:
             messages.error(request, 'Both image and caption are required!')
             return redirect('home')
@@ -221,47 +337,63 @@ def like_post(request):
     Define a like_post function that allows 
     users to like a post on the app.
     """
-    username = request.user.username  # Use the username, not the whole user object
     post_id = request.GET.get('post_id')
-    
-    # Fetch the post by ID
-    post = Post.objects.get(id=post_id)
 
-    # Check if the user has already liked the post
-    like_filter = Like.objects.filter(post_id=post_id, username=username).first()
-    
-    if like_filter is None:  # If no like exists, create a new one
-        new_like = Like.objects.create(post_id=post_id, username=username)
-        new_like.save()
-        post.no_of_likes += 1  # Increment the like count
-        post.save()
-    else:  # If a like exists, remove it (unlike)
-        like_filter.delete()
-        post.no_of_likes -= 1  # Decrement the like count
-        post.save()
+    try:
+        toggle_like(uuid.UUID(str(post_id)), request.user)
+    except (ValueError, Post.DoesNotExist):
+        raise Http404('Post does not exist')
     
     return redirect('home')
 
+
+async def like(request):
+    """
+    Define an async like function that toggles a like through a POST
+    and answers with the new like count and liked state as JSON,
+    so the like button updates in place without re-rendering the feed.
+    login_required does not wrap async views on this Django version,
+    so the session user is resolved here.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    user = await sync_to_async(auth.get_user)(request)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        post_id = uuid.UUID(request.POST.get('post_id', ''))
+        liked, no_of_likes = await sync_to_async(toggle_like)(post_id, user)
+    except (ValueError, Post.DoesNotExist):
+        return JsonResponse({'error': 'Post does not exist'}, status=404)
+
+    return JsonResponse({'post_id': str(post_id), 'liked': liked, 'no_of_likes': no_of_likes})
+
+
 @login_required(login_url='signin')
+@replica_reads
 def search(request):
     """
     Define a search function that allows users to search for pets or vets
     """
     query = request.GET.get('q', '')
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
 
-    pets = []
-    vets = []
-
-    if query:
-        # Search for pets by name or breed
-        pets = Pet.objects.filter(name__icontains=query) | Pet.objects.filter(breed__icontains=query)
-        
-        # Search for vets by username or specialty
-        vets = Vet.objects.filter(specialty__icontains=query)
+    # Ranked, prefix-matching search on pets (name, breed), vets
+    # (username, specialty) and profiles (username, bio, location)
+    results, has_next = search_index.search(query, page=page)
 
     context = {
-        'pets': pets,
-        'vets': vets,
+        'query': query,
+        'page': page,
+        'has_next': has_next,
+        'pets': results['pet'],
+        'vets': results['vet'],
+        'profiles': results['profile'],
     }
     
     return render(request, 'search.html', context)
@@ -275,3 +407,69 @@ def signout(request):
     """
     auth.logout(request)
     return redirect('signin')
+
+
+@login_required(login_url='signin')
+def inbox(request):
+    """
+    Define an inbox function that lists the conversations of the user,
+    most recently active first, with their unread message counts
+    """
+    user_profile = request.profile
+    if not user_profile:
+        raise Http404('No profile')
+    context = {
+        'user_profile': user_profile,
+        'conversations': conversations(user_profile),
+    }
+    return render(request, 'inbox.html', context)
+
+
+@login_required(login_url='signin')
+def conversation(request, username):
+    """
+    Define a conversation function that shows the messages between the
+    user and another user one page at a time and sends new messages
+    """
+    user_profile = request.profile
+    if not user_profile:
+        raise Http404('No profile')
+    other = get_object_or_404(Profile.objects.select_related('user'), user__username=username)
+    if other == user_profile:
+        return redirect('inbox')
+
+    if request.method == 'POST':
+        content = request.POST.get('content', '').strip()
+        if content:
+            send_message(user_profile, other, content)
+        return redirect('conversation', username=username)
+
+    cursor = request.GET.get('cursor')
+    try:
+        page, older_cursor = thread(user_profile, other, cursor)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    if not cursor and page:
+        # Opening the conversation reads what the other user sent, up to
+        # the newest message on screen
+        mark_conversation_read(user_profile, other, up_to=page[0].timestamp)
+
+    context = {
+        'user_profile': user_profile,
+        'other': other,
+        # Oldest first on the page, the newest message at the bottom
+        'thread_messages': page[::-1],
+        'older_cursor': older_cursor,
+        'websocket_path': WEBSOCKET_PATH,
+    }
+    return render(request, 'conversation.html', context)
+
+
+def metrics(request):
+    """
+    Define a metrics function that returns the request metrics of this
+    process in the Prometheus text format, to METRICS_ALLOWED_IPS only
+    """
+    if request.META.get('REMOTE_ADDR') not in django_settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(request_metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,105 @@
+"""
+WebSocket endpoint pushing new messages and read receipts.
+A plain ASGI application mounted by petpawtner/asgi.py next to Django:
+the client is authenticated from its session cookie, subscribed to the
+channel of its profile and every event is sent as a JSON text frame.
+Clients only listen, anything they send is ignored.
+One connection costs one extra task and a bounded event buffer, so a
+single worker holds thousands of idle connections.
+"""
+import asyncio
+import json
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.http import parse_cookie
+
+from .models import Profile
+from .realtime import get_broker, profile_channel
+
+
+WEBSOCKET_PATH = '/ws/messages/'
+
+# Close codes
+CLOSE_NOT_AUTHENTICATED = 4401
+CLOSE_FORBIDDEN_ORIGIN = 4403
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', ())}
+
+
+def origin_allowed(headers):
+    """
+    Browsers send cookies with cross-site WebSocket handshakes too, so
+    only pages served from the same host may connect
+    """
+    origin = headers.get('origin')
+    if origin is None:
+        # Not a browser
+        return True
+    return urlsplit(origin).netloc == headers.get('host')
+
+
+@sync_to_async
+def authenticate(headers):
+    """
+    Return the profile id of the session user, or None
+    """
+    cookies = parse_cookie(headers.get('cookie', ''))
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    engine = import_module(settings.SESSION_ENGINE)
+    # auth.get_user only needs the session, it also checks the password hash
+    user = auth.get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+    if not user.is_authenticated:
+        return None
+    # Loaded with the user by core.profiles.ProfileBackend
+    try:
+        return user.profile.pk
+    except Profile.DoesNotExist:
+        return None
+
+
+async def forward(subscription, send):
+    """
+    Send the events of a subscription until it is closed. A client whose
+    buffer overflowed is told to come back later.
+    """
+    async for event in subscription:
+        await send({'type': 'websocket.send', 'text': json.dumps(event)})
+    if subscription.overflowed:
+        await send({'type': 'websocket.close', 'code': CLOSE_TRY_AGAIN_LATER})
+
+
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    headers = _headers(scope)
+    if not origin_allowed(headers):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN_ORIGIN})
+        return
+    profile_id = await authenticate(headers)
+    if profile_id is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_AUTHENTICATED})
+        return
+
+    subscription = get_broker().subscribe(profile_channel(profile_id))
+    await send({'type': 'websocket.accept'})
+    sender = asyncio.ensure_future(forward(subscription, send))
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+    finally:
+        subscription.close()
+        sender.cancel()
@@ -13,4 +13,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'petpawtner.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up by get_asgi_application
+from core.websocket import WEBSOCKET_PATH, websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Serve WebSocket connections to WEBSOCKET_PATH with the real-time
+    endpoint and everything else with Django
+    """
+    if scope['type'] == 'websocket':
+        if scope['path'] == WEBSOCKET_PATH:
+            return await websocket_application(scope, receive, send)
+        await receive()
+        return await send({'type': 'websocket.close'})
+    return await django_application(scope, receive, send)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -27,6 +28,9 @@ SECRET_KEY = 'django-insecure-7rvscj07ldqr4rz-jdevn3gt&i2&zdhg2c70=!0b5i&g$hv59_
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Under manage.py test, background work runs inline
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 
@@ -44,11 +48,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,7 +64,8 @@ ROOT_URLCONF = 'petpawtner.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing renders for core.middleware.PerformanceMiddleware
+        'BACKEND': 'core.metrics.InstrumentedTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,13 +85,100 @@ WSGI_APPLICATION = 'petpawtner.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Configured from the environment. Connections are kept for CONN_MAX_AGE
+# seconds and checked before reuse instead of being opened per request.
+# SQLite (the default) suits a single node, SQLITE_PRAGMAS are applied to
+# every connection by core/database.py. DATABASE_ENGINE=postgresql connects
+# to POSTGRES_HOST, a PgBouncer pooling server connections in front of
+# PostgreSQL, see docker-compose.postgres.yml
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 60))
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'petpawtner'),
+            'USER': os.environ.get('POSTGRES_USER', 'petpawtner'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('POSTGRES_PORT', '6432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Transaction pooling gives each transaction any server
+            # connection, named cursors cannot outlive one
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('POSTGRES_POOLER', 'pgbouncer') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
 
+# Read replicas, listed in SQLITE_REPLICA_PATHS or POSTGRES_REPLICA_HOSTS
+# (comma separated). Views wrapped with core.routers.replica_reads read
+# from them, writes and everything else use the primary. Clients that
+# wrote read from the primary for REPLICA_STICKY_SECONDS, longer than
+# the replication lag
+DATABASE_REPLICAS = []
+if DATABASE_ENGINE == 'postgresql':
+    replica_settings = [{'HOST': host} for host in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if host]
+else:
+    replica_settings = [{'NAME': path} for path in os.environ.get('SQLITE_REPLICA_PATHS', '').split(',') if path]
+for number, replica in enumerate(replica_settings, 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {**DATABASES['default'], **replica, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+SQLITE_PRAGMAS = {
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'foreign_keys': 'ON',
+}
+# Stored in the database file itself, so only switched when asked for,
+# e.g. SQLITE_JOURNAL_MODE=WAL on a server
+if os.environ.get('SQLITE_JOURNAL_MODE'):
+    SQLITE_PRAGMAS['journal_mode'] = os.environ['SQLITE_JOURNAL_MODE']
+
+
+# The session user is loaded with its profile in one query, see
+# core/profiles.py. With a cache shared by every worker process
+# (SHARED_CACHE_LOCATION, see CACHES) both are kept there for
+# PROFILE_CACHE_SECONDS; a per-process cache would keep serving a profile
+# another process has changed, so without one nothing is cached
+AUTHENTICATION_BACKENDS = ['core.profiles.ProfileBackend']
+PROFILE_CACHE = 'shared' if os.environ.get('SHARED_CACHE_LOCATION') else None
+PROFILE_CACHE_SECONDS = int(os.environ.get('PROFILE_CACHE_SECONDS', 30))
+
+# Sessions are stored in the database, or with the shared cache read from
+# it and written through to the database.
+# SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies keeps them
+# in a signed cookie instead, with no lookup at all
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if PROFILE_CACHE else 'django.contrib.sessions.backends.db',
+)
+SESSION_CACHE_ALIAS = PROFILE_CACHE or 'default'
+
+# Password hashing of signup and signin runs on AUTH_HASH_WORKERS threads,
+# attempts are throttled per IP and per username as (attempts, seconds),
+# see core/accounts.py
+AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', os.cpu_count() or 1))
+AUTH_THROTTLE_IP = (int(os.environ.get('AUTH_THROTTLE_IP', 30)), 60)
+AUTH_THROTTLE_USERNAME = (int(os.environ.get('AUTH_THROTTLE_USERNAME', 10)), 300)
+# Reverse proxies in front of the application that append to X-Forwarded-For,
+# 1 with nginx.conf, so the throttled IP is the client and not the proxy
+AUTH_TRUSTED_PROXIES = int(os.environ.get('AUTH_TRUSTED_PROXIES', 0))
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -131,3 +226,100 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Who copies the bytes of media files, see core/media.py: '' streams them
+# from Python, 'x-accel-redirect' hands them to nginx through the internal
+# MEDIA_ACCEL_PREFIX location and 'x-sendfile' to Apache or lighttpd
+MEDIA_ACCEL = os.environ.get('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# collectstatic bundles, hashes and precompresses the static files when
+# STATIC_PIPELINE is on, see core/staticfiles.py. Pages then need the
+# collected files, so development serves the sources as they are.
+STATIC_PIPELINE = os.environ.get('STATIC_PIPELINE', str(not DEBUG)).lower() in ('1', 'true', 'yes')
+
+# The stylesheets and scripts of a page, loaded with {% bundle %}. CSS
+# bundles live next to their sources so relative url() keep resolving.
+STATIC_BUNDLES = {
+    'css/site.css': ['css/icons.css', 'css/uikit.css', 'css/style.css', 'css/tailwind.css'],
+    'js/site.js': ['js/tippy.all.min.js', 'js/jquery-3.3.1.min.js', 'js/uikit.js', 'js/simplebar.js', 'js/custom.js'],
+    'css2/timeline.css': ['css2/main.min.css', 'css2/style.css', 'css2/color.css', 'css2/responsive.css'],
+    'js2/timeline.js': ['js2/main.min.js', 'js2/script.js'],
+}
+
+# Uploads are stored once per content hash, see core/storage.py
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'core.staticfiles.BundlingStorage' if STATIC_PIPELINE
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+# Search backend for pets, vets and profiles, see core/search.py
+# The FTS5 index is SQLite only, other databases match with the ORM
+if DATABASE_ENGINE == 'sqlite':
+    SEARCH_BACKEND = 'core.search.SQLiteFTSBackend'
+else:
+    SEARCH_BACKEND = 'core.search.DatabaseSearchBackend'
+
+# Threads rendering resized variants of uploaded images, see core/images.py
+# 0 renders them inline, which tests use
+IMAGE_WORKERS = 0 if TESTING else 2
+
+# Home timelines are written on post creation by TIMELINE_WORKERS threads
+# (0 writes them inline, which tests use), keep about TIMELINE_LENGTH posts, and authors with
+# TIMELINE_CELEBRITY_FOLLOWERS followers are read at request time instead
+# of fanned out, see core/timelines.py
+TIMELINE_WORKERS = 0 if TESTING else 2
+TIMELINE_LENGTH = 800
+TIMELINE_CELEBRITY_FOLLOWERS = int(os.environ.get('TIMELINE_CELEBRITY_FOLLOWERS', 10_000))
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+
+# Uploads are streamed to temporary files and validated, see core/uploads.py
+FILE_UPLOAD_HANDLERS = ['core.uploads.ImageUploadHandler']
+MAX_UPLOAD_SIZE = 10 * 2 ** 20
+MAX_UPLOAD_PIXELS = 40_000_000
+
+# Rendered post cards are cached under CACHES[FRAGMENT_CACHE], see core/fragments.py.
+# Process-local by default, which tests use. In production share them between
+# workers, e.g. FRAGMENT_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# with FRAGMENT_CACHE_LOCATION=/var/tmp/petpawtner_fragments, or
+# django.core.cache.backends.memcached.PyMemcacheCache / redis.RedisCache
+# with FRAGMENT_CACHE_LOCATION=127.0.0.1:11211 / redis://127.0.0.1:6379
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': os.environ.get('FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', 'fragments'),
+        'TIMEOUT': 24 * 60 * 60,
+    },
+}
+FRAGMENT_CACHE = 'fragments'
+# Profiles and sessions, e.g. SHARED_CACHE_LOCATION=redis://127.0.0.1:6379 or
+# SHARED_CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+# with SHARED_CACHE_LOCATION=127.0.0.1:11211
+if PROFILE_CACHE:
+    CACHES[PROFILE_CACHE] = {
+        'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.environ['SHARED_CACHE_LOCATION'],
+    }
+
+# Fan-out of real-time events to WebSocket clients, see core/realtime.py.
+# LocalBroker only reaches connections of the same process
+REALTIME_BROKER = 'core.realtime.LocalBroker'
+REALTIME_QUEUE_SIZE = 100
+
+# Request metrics, see core/metrics.py. Every request is counted and timed,
+# PERF_SAMPLE_RATE of them also get their queries and template renders
+# timed. Sampled requests slower than PERF_SLOW_REQUEST_SECONDS are logged
+# with their SQL. /metrics answers METRICS_ALLOWED_IPS only
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', 1.0 if DEBUG else 0.05))
+PERF_SLOW_REQUEST_SECONDS = float(os.environ.get('PERF_SLOW_REQUEST_SECONDS', 0.5))
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
@@ -0,0 +1,254 @@
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core import accounts, metrics
+from core.middleware import PerformanceMiddleware, ProfileMiddleware, ReplicaStickinessMiddleware
+from core.models import Profile
+
+
+unique_ci = import_module('core.migrations.0013_user_unique_ci')
+
+
+def clear_throttles():
+    accounts.ip_throttle.clear()
+    accounts.username_throttle.clear()
+
+
+def create_unique_indexes():
+    # Tests run without migrations, create the indexes of 0013 in the
+    # class transaction so they are dropped with it
+    operation = unique_ci.Migration.operations[-1]
+    with connection.cursor() as cursor:
+        for sql in operation.sql:
+            cursor.execute(sql)
+
+
+class SignupTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_unique_indexes()
+
+    def setUp(self):
+        clear_throttles()
+        self.addCleanup(clear_throttles)
+        self.client = Client()
+        User.objects.create_user(username='testuser', email='testuser@example.com', password='testpassword')
+
+    def signup(self, username='newuser', email='newuser@example.com'):
+        return self.client.post(reverse('signup'), {
+            'username': username,
+            'email': email,
+            'password': 'newpassword',
+            'password2': 'newpassword',
+        })
+
+    def test_signup_hashes_the_password_once_and_logs_in(self):
+        with mock.patch('core.accounts.make_password', wraps=make_password) as hashed, \
+                mock.patch('django.contrib.auth.hashers.check_password') as checked:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.signup()
+
+        self.assertRedirects(response, reverse('settings'), fetch_redirect_response=False)
+        self.assertEqual(hashed.call_count, 1)
+        checked.assert_not_called()
+        user = User.objects.get(username='newuser')
+        self.assertTrue(user.check_password('newpassword'))
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+        # No uniqueness lookups before the insert
+        self.assertFalse([query for query in captured if query['sql'].startswith('SELECT') and ' FROM "auth_user"' in query['sql']])
+
+    def test_taken_names_are_found_by_the_indexes(self):
+        self.assertContains(self.signup(username='TestUser'), 'Username Taken')
+        self.assertContains(self.signup(email='TESTUSER@example.com'), 'Email Taken')
+        self.assertFalse(User.objects.filter(username__iexact='newuser').exists())
+        self.assertEqual(Profile.objects.count(), 0)
+
+    def test_indexes_reject_duplicates_regardless_of_case(self):
+        for username, email in [('TESTUSER', 'other@example.com'), ('other', 'TestUser@Example.com')]:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                User.objects.create(username=username, email=email)
+
+    def test_several_accounts_without_email(self):
+        User.objects.create(username='first', email='')
+        User.objects.create(username='second', email='')
+
+    @override_settings(AUTH_THROTTLE_IP=(2, 60))
+    def test_signups_of_an_ip_are_throttled(self):
+        self.signup(username='first', email='first@example.com')
+        self.client.logout()
+        self.signup(username='second', email='second@example.com')
+        self.client.logout()
+
+        response = self.signup(username='third', email='third@example.com')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Too many attempts', status_code=429)
+        self.assertFalse(User.objects.filter(username='third').exists())
+
+
+class UniqueIndexMigrationTestCase(TestCase):
+    def dedupe(self):
+        unique_ci.dedupe_users(apps, mock.Mock(connection=connection))
+
+    def test_shared_emails_stay_with_the_oldest_account(self):
+        first = User.objects.create(username='first', email='Dog@example.com')
+        second = User.objects.create(username='second', email='dog@example.com')
+        third = User.objects.create(username='third', email='')
+
+        self.dedupe()
+        create_unique_indexes()
+
+        self.assertEqual(
+            list(User.objects.filter(pk__in=[first.pk, second.pk, third.pk]).order_by('pk').values_list('email', flat=True)),
+            ['Dog@example.com', '', ''],
+        )
+
+    def test_case_variant_usernames_stop_the_migration(self):
+        User.objects.create(username='Rex')
+        User.objects.create(username='rex')
+        User.objects.create(username='fido')
+
+        with self.assertRaisesMessage(IntegrityError, 'differ only in case before migrating: Rex, rex'):
+            self.dedupe()
+
+
+class SigninTestCase(TestCase):
+    def setUp(self):
+        clear_throttles()
+        self.addCleanup(clear_throttles)
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        Profile.objects.create(user=self.user)
+
+    def signin(self, password='testpassword', username='testuser', **extra):
+        return self.client.post(reverse('signin'), {'username': username, 'password': password}, **extra)
+
+    def test_signin(self):
+        response = self.signin()
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_wrong_password_and_unknown_username(self):
+        for response in [self.signin(password='wrong'), self.signin(username='nobody')]:
+            self.assertRedirects(response, reverse('signin'), fetch_redirect_response=False)
+            self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_inactive_users_cannot_sign_in(self):
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertRedirects(self.signin(), reverse('signin'), fetch_redirect_response=False)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_outdated_hashes_are_upgraded(self):
+        self.signin()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha1$'))
+
+    @override_settings(AUTH_THROTTLE_USERNAME=(3, 300))
+    def test_attempts_on_a_username_are_throttled_across_ips(self):
+        for address in ['10.0.0.1', '10.0.0.2', '10.0.0.3']:
+            self.signin(password='wrong', REMOTE_ADDR=address)
+
+        response = self.signin(REMOTE_ADDR='10.0.0.4')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertEqual(self.signin(username='other', REMOTE_ADDR='10.0.0.4').status_code, 302)
+
+    @override_settings(AUTH_THROTTLE_IP=(2, 60), AUTH_TRUSTED_PROXIES=1)
+    def test_clients_behind_the_proxy_are_throttled_apart(self):
+        for _ in range(2):
+            self.signin(password='wrong', HTTP_X_FORWARDED_FOR='203.0.113.7')
+
+        self.assertEqual(self.signin(HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 429)
+        self.assertEqual(self.signin(HTTP_X_FORWARDED_FOR='203.0.113.8').status_code, 302)
+
+
+class AsyncStackTestCase(TestCase):
+    def setUp(self):
+        clear_throttles()
+        self.addCleanup(clear_throttles)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        Profile.objects.create(user=self.user)
+
+    def test_middleware_follows_the_handler(self):
+        async def async_view(request):
+            return HttpResponse()
+
+        for middleware in (PerformanceMiddleware, ReplicaStickinessMiddleware, ProfileMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(async_view)), middleware.__name__)
+            self.assertFalse(iscoroutinefunction(middleware(lambda request: HttpResponse())), middleware.__name__)
+
+    @override_settings(PERF_SAMPLE_RATE=1.0)
+    async def test_signin_is_awaited_through_the_stack(self):
+        metrics.registry.clear()
+        client = AsyncClient()
+
+        response = await client.post(reverse('signin'), {'username': 'testuser', 'password': 'testpassword'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('sessionid', response.cookies)
+        # Queries run through sync_to_async are still sampled
+        queries = [line for line in metrics.registry.render().splitlines() if line.startswith('petpawtner_db_queries_total{view="signin"}')]
+        self.assertGreater(float(queries[0].rsplit(' ', 1)[1]), 0)
+
+
+class ClientIPTestCase(SimpleTestCase):
+    def client_ip(self, forwarded=None):
+        extra = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded is not None else {}
+        return accounts.client_ip(RequestFactory().get('/', REMOTE_ADDR='127.0.0.1', **extra))
+
+    def test_without_proxies_the_peer_is_the_client(self):
+        self.assertEqual(self.client_ip('203.0.113.7'), '127.0.0.1')
+
+    @override_settings(AUTH_TRUSTED_PROXIES=1)
+    def test_behind_a_proxy_its_hop_is_the_client(self):
+        self.assertEqual(self.client_ip('203.0.113.7'), '203.0.113.7')
+        # Hops sent by the client itself are not trusted
+        self.assertEqual(self.client_ip('10.9.9.9, 203.0.113.7'), '203.0.113.7')
+        self.assertEqual(self.client_ip(), '127.0.0.1')
+
+    @override_settings(AUTH_TRUSTED_PROXIES=2)
+    def test_behind_two_proxies(self):
+        self.assertEqual(self.client_ip('10.9.9.9, 203.0.113.7, 10.0.0.2'), '203.0.113.7')
+        self.assertEqual(self.client_ip('203.0.113.7'), '203.0.113.7')
+
+
+@override_settings(AUTH_THROTTLE_IP=(2, 10))
+class SlidingWindowTestCase(SimpleTestCase):
+    def test_window_slides(self):
+        window = accounts.SlidingWindow('AUTH_THROTTLE_IP')
+
+        self.assertTrue(window.allow('ip', now=0))
+        self.assertTrue(window.allow('ip', now=5))
+        self.assertFalse(window.allow('ip', now=9))
+        self.assertTrue(window.allow('other', now=9))
+        # The first hit left the window
+        self.assertTrue(window.allow('ip', now=10.5))
+        self.assertFalse(window.allow('ip', now=14))
+
+    def test_expired_keys_are_pruned(self):
+        window = accounts.SlidingWindow('AUTH_THROTTLE_IP')
+        with mock.patch.object(accounts, 'THROTTLE_MAX_KEYS', 2):
+            window.allow('a', now=0)
+            window.allow('b', now=8)
+            window.allow('c', now=12)
+
+        self.assertEqual(set(window.hits), {'b', 'c'})
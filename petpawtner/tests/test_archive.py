@@ -0,0 +1,117 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth.models import User
+from core.messaging import thread
+from core.models import ArchivedMessage, Profile, Message
+from core.services import mark_conversation_read, send_message
+
+
+class MessageArchiveTestCase(TestCase):
+    def setUp(self):
+        self.owner = Profile.objects.create(user=User.objects.create_user(username='owner', password='x'))
+        self.vet = Profile.objects.create(user=User.objects.create_user(username='vet', password='x'), role='vet')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def message(self, content, days_ago, is_read=True):
+        message = send_message(self.owner, self.vet, content)
+        Message.objects.filter(pk=message.pk).update(
+            timestamp=timezone.now() - timedelta(days=days_ago), is_read=is_read,
+        )
+        return message
+
+    def archive(self, *args):
+        call_command('archive_messages', '--days=30', '--batch-size=2', *args, stdout=StringIO())
+
+    def test_mark_read_up_to_a_timestamp(self):
+        first = self.message('First', 3, is_read=False)
+        self.message('Second', 2, is_read=False)
+        self.message('Third', 1, is_read=False)
+        Profile.objects.filter(pk=self.vet.pk).update(unread_messages=3)
+        second = Message.objects.get(content='Second')
+
+        with self.assertNumQueries(4):
+            marked = mark_conversation_read(self.vet, self.owner, up_to=second.timestamp)
+
+        self.assertEqual(marked, 2)
+        self.assertEqual(list(Message.objects.filter(is_read=False).values_list('content', flat=True)), ['Third'])
+        self.assertEqual(Profile.objects.get(pk=self.vet.pk).unread_messages, 1)
+        self.assertTrue(Message.objects.get(pk=first.pk).is_read)
+
+    def test_old_read_messages_move_to_the_archive_table(self):
+        for i in range(5):
+            self.message(f'Old {i}', 60 - i)
+        self.message('Old but unread', 50, is_read=False)
+        self.message('Recent', 1)
+
+        self.archive()
+
+        self.assertEqual(
+            sorted(Message.objects.values_list('content', flat=True)),
+            ['Old but unread', 'Recent'],
+        )
+        self.assertEqual(ArchivedMessage.objects.count(), 5)
+        self.archive()
+        self.assertEqual(ArchivedMessage.objects.count(), 5)
+
+    def test_thread_walks_live_and_archived_messages(self):
+        for i in range(6):
+            self.message(f'Message {i}', 55 - i * 10)
+        self.archive()
+        self.assertEqual(Message.objects.count(), 3)
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = thread(self.owner, self.vet, cursor, page_size=2)
+            seen.extend(message.content for message in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [f'Message {i}' for i in reversed(range(6))])
+
+    def read_file(self, path):
+        with gzip.open(path, 'rt') as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_old_messages_move_to_a_compressed_file(self):
+        for i in range(5):
+            self.message(f'Old {i}', 60 - i)
+        self.message('Recent', 1)
+        path = os.path.join(self.directory, 'messages.jsonl.gz')
+
+        self.archive(f'--output={path}')
+
+        self.assertEqual([row['content'] for row in self.read_file(path)], [f'Old {i}' for i in range(5)])
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['Recent'])
+        self.assertFalse(ArchivedMessage.objects.exists())
+
+    def test_interrupted_file_archive_resumes(self):
+        written = [self.message(f'Written {i}', 60 - i) for i in range(2)]
+        self.message('Not yet', 40)
+        path = os.path.join(self.directory, 'messages.jsonl.gz')
+        member = gzip.compress(''.join(
+            json.dumps({'id': message.pk, 'content': message.content}) + '\n' for message in written
+        ).encode())
+        # The run died after its checkpoint, before deleting the batch,
+        # while writing the next member
+        with open(path, 'wb') as handle:
+            handle.write(member + b'\x1f\x8b partial')
+        with open(f'{path}.checkpoint', 'w') as handle:
+            json.dump({'offset': len(member), 'pending': [message.pk for message in written]}, handle)
+
+        self.archive(f'--output={path}')
+
+        self.assertEqual(
+            [row['content'] for row in self.read_file(path)],
+            ['Written 0', 'Written 1', 'Not yet'],
+        )
+        self.assertFalse(Message.objects.exists())
@@ -0,0 +1,77 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from core import benchmark, fixtures, search, timelines
+from core.models import Follow, Profile, Pet, Post, Like, Message, TimelineEntry
+
+
+class FixturesTestCase(TestCase):
+    def test_generated_dataset_is_consistent(self):
+        created = fixtures.generate(200, seed=1, batch_size=50)
+
+        self.assertEqual(created['posts'], Post.objects.count())
+        self.assertEqual(created['users'], Profile.objects.count())
+        self.assertEqual(created['likes'], Like.objects.count())
+        self.assertEqual(created['messages'], Message.objects.count())
+        self.assertEqual(created['pets'], Pet.objects.count())
+        self.assertEqual(created['follows'], Follow.objects.count())
+        self.assertEqual(created['timeline entries'], TimelineEntry.objects.count())
+        # The counters were computed while generating
+        out = StringIO()
+        call_command('recount', stdout=out)
+        call_command('reconcile_likes', stdout=out)
+        self.assertIn(' 0 profile(s) fixed', out.getvalue())
+        self.assertIn(' 0 post(s) fixed', out.getvalue())
+        # Authors are skewed towards the first users
+        self.assertEqual(Profile.objects.order_by('-post_count').first().user.username, 'user0')
+        self.assertEqual(Profile.objects.order_by('-follower_count').first().user.username, 'user0')
+        breed = Pet.objects.values_list('breed', flat=True).first()
+        self.assertTrue(search.search(breed, kinds=['pet'])[0]['pet'])
+        # Timelines are the ones the timeline code would write
+        profile = Profile.objects.filter(following_count__gt=0).last()
+        seeded = set(TimelineEntry.objects.filter(owner=profile).values_list('post', 'author', 'created_at'))
+        self.assertTrue(seeded)
+        timelines.rebuild(profile)
+        self.assertEqual(set(TimelineEntry.objects.filter(owner=profile).values_list('post', 'author', 'created_at')), seeded)
+
+    def test_same_seed_same_dataset(self):
+        fixtures.generate(50, seed=7)
+        first = list(Post.objects.order_by('pk').values_list('pk', 'caption', 'no_of_likes'))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+
+        fixtures.generate(50, seed=7)
+
+        self.assertEqual(list(Post.objects.order_by('pk').values_list('pk', 'caption', 'no_of_likes')), first)
+
+
+class BenchmarkTestCase(TestCase):
+    def test_endpoints_are_measured(self):
+        cache.clear()
+        fixtures.generate(100)
+        client = Client()
+        client.force_login(User.objects.get(username='user0'))
+
+        # The home page of a follower is read from its timeline
+        self.assertTrue(Profile.objects.get(user__username='user0').following_count)
+
+        for name, path in benchmark.endpoints('user0').items():
+            result = benchmark.measure(client, path, requests=3)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'], name)
+            self.assertGreater(result['queries'], 0, name)
+            self.assertGreater(result['peak_kib'], 0, name)
+
+    def test_regressions_against_a_baseline(self):
+        baseline = {'home': {'p50_ms': 10, 'p99_ms': 20, 'queries': 4, 'peak_kib': 100}}
+
+        steady = {'home': {'p50_ms': 12, 'p99_ms': 28, 'queries': 4, 'peak_kib': 110}}
+        self.assertEqual(benchmark.compare(steady, baseline, tolerance=0.25), [])
+
+        worse = {'home': {'p50_ms': 13, 'p99_ms': 20, 'queries': 5, 'peak_kib': 100}, 'search': steady['home']}
+        self.assertEqual(benchmark.compare(worse, baseline, tolerance=0.25), [
+            'home: 5 queries, baseline 4',
+            'home: p50_ms 13, baseline 10',
+        ])
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.models import Profile, Pet, Post, Message
+from core.services import toggle_like
+
+
+class ProfileCountersTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other = User.objects.create_user(username='otheruser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.other_profile = Profile.objects.create(user=self.other)
+
+    def counters(self):
+        profile = Profile.objects.get(pk=self.profile.pk)
+        return profile.post_count, profile.pet_count, profile.likes_received
+
+    def test_posts_and_pets_are_counted(self):
+        post = Post.objects.create(user=self.user, caption='First')
+        Post.objects.create(user=self.user, caption='Second')
+        pet = Pet.objects.create(owner=self.profile, name='Rex', breed='Beagle', age='2', location='Lagos')
+        self.assertEqual(self.counters(), (2, 1, 0))
+
+        post.caption = 'Edited'
+        post.save()
+        post.delete()
+        pet.delete()
+        self.assertEqual(self.counters(), (1, 0, 0))
+
+    def test_likes_received(self):
+        post = Post.objects.create(user=self.user, caption='Test Post')
+        toggle_like(post.id, self.other)
+        toggle_like(post.id, self.user)
+        self.assertEqual(self.counters(), (1, 0, 2))
+        toggle_like(post.id, self.other)
+        self.assertEqual(self.counters(), (1, 0, 1))
+
+        post.refresh_from_db()
+        post.delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_stale_profile_save_keeps_counters(self):
+        stale = Profile.objects.get(pk=self.profile.pk)
+        Post.objects.create(user=self.user, caption='Test Post')
+        stale.bio = 'Dog person'
+        stale.save()
+        self.assertEqual(self.counters(), (1, 0, 0))
+        self.assertEqual(Profile.objects.get(pk=self.profile.pk).bio, 'Dog person')
+
+    def test_recount_repairs_drift(self):
+        post = Post.objects.create(user=self.user, caption='Test Post')
+        Pet.objects.create(owner=self.profile, name='Rex', breed='Beagle', age='2', location='Lagos')
+        toggle_like(post.id, self.other)
+        Message.objects.create(sender=self.other_profile, receiver=self.profile, content='Hello')
+        Profile.objects.filter(pk=self.profile.pk).update(
+            post_count=7, pet_count=0, likes_received=3, unread_messages=5,
+        )
+
+        out = StringIO()
+        call_command('recount', '--batch-size=1', stdout=out)
+
+        self.assertIn('1 profile(s) fixed', out.getvalue())
+        self.assertEqual(self.counters(), (1, 1, 1))
+        self.assertEqual(Profile.objects.get(pk=self.profile.pk).unread_messages, 1)
+
+    def test_profile_header_reads_counters(self):
+        Profile.objects.filter(pk=self.profile.pk).update(post_count=1, pet_count=1, likes_received=0)
+        self.client.login(username='testuser', password='testpassword')
+
+        response = self.client.get(reverse('profile', args=['testuser']))
+
+        self.assertContains(response, '1 Post Of Their Pets')
+        self.assertContains(response, '1 Pet &middot; 0 Likes')
@@ -0,0 +1,57 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+
+class SQLitePragmasTestCase(TestCase):
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connect(self):
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(connection, 'foreign_keys'), 1)
+        self.assertNotIn('journal_mode', settings.SQLITE_PRAGMAS)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'FULL', 'busy_timeout': 250})
+    def test_file_database_uses_wal(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}, alias='pragmas')
+        self.addCleanup(wrapper.close)
+
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 2)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 250)
+
+
+class SettingsTestCase(SimpleTestCase):
+    def resolved(self, name, **environ):
+        # Settings are read once per process, evaluate them in a fresh one
+        code = f'import petpawtner.settings as settings; print(settings.{name})'
+        env = {**os.environ, **environ}
+        result = subprocess.run([sys.executable, '-c', code], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
+    def test_search_backend_follows_the_database(self):
+        self.assertEqual(self.resolved('SEARCH_BACKEND', DATABASE_ENGINE='sqlite'), 'core.search.SQLiteFTSBackend')
+        self.assertEqual(self.resolved('SEARCH_BACKEND', DATABASE_ENGINE='postgresql'), 'core.search.DatabaseSearchBackend')
+
+    def test_journal_mode_is_only_set_when_asked_for(self):
+        self.assertEqual(self.resolved("SQLITE_PRAGMAS.get('journal_mode')", SQLITE_JOURNAL_MODE=''), 'None')
+        self.assertEqual(self.resolved("SQLITE_PRAGMAS['journal_mode']", SQLITE_JOURNAL_MODE='WAL'), 'WAL')
+
+    def test_profiles_and_sessions_are_cached_only_when_shared(self):
+        self.assertEqual(self.resolved('PROFILE_CACHE', SHARED_CACHE_LOCATION=''), 'None')
+        self.assertEqual(self.resolved('SESSION_ENGINE', SHARED_CACHE_LOCATION=''), 'django.contrib.sessions.backends.db')
+        self.assertEqual(self.resolved("CACHES['shared']['LOCATION']", SHARED_CACHE_LOCATION='redis://cache:6379'), 'redis://cache:6379')
+        self.assertEqual(self.resolved('SESSION_ENGINE', SHARED_CACHE_LOCATION='redis://cache:6379'), 'django.contrib.sessions.backends.cached_db')
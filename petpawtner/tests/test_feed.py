@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from core.models import Profile, Post
+from core.pagination import FEED_PAGE_SIZE, decode_cursor, encode_cursor, paginate_feed
+
+
+class FeedPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        now = timezone.now()
+        self.posts = [
+            Post.objects.create(user=self.user, caption=f'Post {i}', image='post_images/sdog.png', created_at=now - timedelta(minutes=i))
+            for i in range(FEED_PAGE_SIZE * 2 + 3)
+        ]
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        self.assertEqual(decode_cursor(encode_cursor(post)), (post.created_at, post.id))
+
+    def test_pages_cover_feed_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = paginate_feed(Post.objects.all(), cursor)
+            self.assertLessEqual(len(page), FEED_PAGE_SIZE)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual([p.id for p in seen], [p.id for p in self.posts])
+
+    def test_ties_on_created_at_are_not_skipped(self):
+        Post.objects.update(created_at=timezone.now())
+        seen = set()
+        cursor = None
+        while True:
+            page, cursor = paginate_feed(Post.objects.all(), cursor)
+            seen.update(p.id for p in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(self.posts))
+
+    def test_home_renders_first_page_only(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['posts']), FEED_PAGE_SIZE)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_feed_view_returns_next_page(self):
+        self.client.login(username='testuser', password='testpassword')
+        cursor = self.client.get(reverse('home')).context['next_cursor']
+        response = self.client.get(reverse('feed'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn('Post %d' % FEED_PAGE_SIZE, data['html'])
+        self.assertNotIn('Post 0<', data['html'])
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_feed_view_invalid_cursor(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('feed'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.fragments import fragment_cache, render_post_cards
+from core.models import Profile, Post
+from core.services import toggle_like
+
+
+class PostCardCacheTestCase(TestCase):
+    def setUp(self):
+        fragment_cache().clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.post = Post.objects.create(user=self.user, caption='Walkies', image='post_images/sdog.png')
+        self.client.login(username='testuser', password='testpassword')
+
+    def card(self):
+        return render_post_cards([Post.objects.select_related('user').get(pk=self.post.pk)])[0]
+
+    def test_warm_cards_are_not_rendered_again(self):
+        self.client.get(reverse('home'))
+        with mock.patch('core.fragments.get_template') as get_template:
+            response = self.client.get(reverse('home'))
+            self.client.get(reverse('feed'))
+        get_template.assert_not_called()
+        self.assertContains(response, 'Walkies')
+
+    def test_card_is_cached_until_its_version_moves(self):
+        self.assertIn('Walkies', self.card())
+        # Bypasses the hooks, so the cached card is still served
+        Post.objects.filter(pk=self.post.pk).update(caption='Bath time')
+        self.assertIn('Walkies', self.card())
+
+        Post.objects.filter(pk=self.post.pk).update(version=self.post.version + 1)
+        self.assertIn('Bath time', self.card())
+
+    def test_like_and_unlike_refresh_the_card(self):
+        self.assertIn('0 Likes', self.card())
+        toggle_like(self.post.pk, self.user)
+        self.assertIn('Liked by 1 person', self.card())
+        toggle_like(self.post.pk, self.user)
+        self.assertIn('0 Likes', self.card())
+
+    def test_edit_refreshes_the_card(self):
+        self.card()
+        self.post.caption = 'Bath time'
+        self.post.save()
+
+        self.assertEqual(self.post.version, 1)
+        self.assertIn('Bath time', self.card())
+
+    def test_edit_does_not_lose_a_concurrent_like(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        toggle_like(self.post.pk, self.user)
+        stale.caption = 'Bath time'
+        stale.save()
+
+        self.assertEqual(stale.version, 2)
+
+    def test_username_change_refreshes_the_card(self):
+        self.card()
+        self.user.username = 'renamed'
+        self.user.save()
+
+        self.assertIn('renamed', self.card())
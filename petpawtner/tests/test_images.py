@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from PIL import Image
+from core.models import Profile, Post
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='photo.jpg', size=(1600, 1200)):
+    image = Image.new('RGB', size, 'orange')
+    exif = Image.Exif()
+    exif[0x010F] = 'PetCam'  # Make
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImageVariantsTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+
+    def test_variants_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.user, caption='Photo', image=make_image())
+        post.refresh_from_db()
+
+        self.assertEqual((post.image_width, post.image_height), (1600, 1200))
+        self.assertEqual(post.image_variants['source'], post.image.name)
+        self.assertEqual([v['width'] for v in post.image_variants['variants']], [320, 640, 1080])
+        for variant in post.image_variants['variants']:
+            with post.image.storage.open(variant['jpeg']) as handle, Image.open(handle) as image:
+                self.assertEqual(image.width, variant['width'])
+                self.assertEqual(len(image.getexif()), 0)
+            with post.image.storage.open(variant['webp']) as handle, Image.open(handle) as image:
+                self.assertEqual(image.format, 'WEBP')
+        self.assertIn('320w', post.jpeg_srcset)
+        self.assertIn('.webp 1080w', post.webp_srcset)
+        self.assertEqual(post.thumbnail_url, post.image.storage.url(post.image_variants['variants'][0]['jpeg']))
+
+    def test_small_image_is_not_upscaled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.user, caption='Photo', image=make_image(size=(200, 100)))
+        post.refresh_from_db()
+        self.assertEqual([v['width'] for v in post.image_variants['variants']], [200])
+
+    def test_stale_variants_are_not_served(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.user, caption='Photo', image=make_image())
+        post.refresh_from_db()
+        post.image = 'post_images/other.jpg'
+        self.assertEqual(post.jpeg_srcset, '')
+        self.assertTrue(post.needs_variants())
+
+    def test_missing_default_image_is_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image_variants, {})
+        self.assertEqual(self.profile.thumbnail_url, self.profile.profileimg.url)
+
+    @override_settings(IMAGE_WORKERS=2)
+    def test_upload_does_not_wait_for_resizing(self):
+        self.client.login(username='testuser', password='testpassword')
+        executor = mock.Mock()
+        with mock.patch('core.images.get_executor', return_value=executor):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('post'), {'image_upload': make_image(), 'caption': 'New Post'})
+        post = Post.objects.get(caption='New Post')
+        executor.submit.assert_called_once()
+        self.assertEqual(post.image_variants, {})
+
+    def test_backfill_command(self):
+        post = Post.objects.create(user=self.user, caption='Photo', image=make_image())
+        self.assertEqual(post.image_variants, {})
+        call_command('render_image_variants', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, 1600)
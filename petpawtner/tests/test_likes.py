@@ -0,0 +1,101 @@
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import AsyncClient, TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.models import Profile, Post, Like
+from core.services import toggle_like
+
+
+class ToggleLikeTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other = User.objects.create_user(username='otheruser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.post = Post.objects.create(user=self.user, caption='Test Post')
+
+    def test_like_then_unlike(self):
+        self.assertEqual(toggle_like(self.post.id, self.user), (True, 1))
+        self.assertEqual(toggle_like(self.post.id, self.other), (True, 2))
+        self.assertEqual(toggle_like(self.post.id, self.user), (False, 1))
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+    def test_counter_is_updated_in_database(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        toggle_like(self.post.id, self.user)
+        toggle_like(self.post.id, self.other)
+        # A stale in-memory copy does not feed into the counter
+        self.assertEqual(stale.no_of_likes, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.no_of_likes, 2)
+
+    def test_unknown_post(self):
+        with self.assertRaises(Post.DoesNotExist):
+            toggle_like('00000000000000000000000000000000', self.user)
+        self.assertFalse(Like.objects.exists())
+
+    def test_like_is_unique_per_user(self):
+        Like.objects.create(post=self.post, user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Like.objects.create(post=self.post, user=self.user)
+
+    def test_like_post_view_invalid_post_id(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('like_post'), {'post_id': 999})
+        self.assertEqual(response.status_code, 404)
+
+    def test_reconcile_likes_command(self):
+        Like.objects.create(post=self.post, user=self.user)
+        Like.objects.create(post=self.post, user=self.other)
+        empty = Post.objects.create(user=self.user, caption='No likes', no_of_likes=7)
+        out = StringIO()
+        call_command('reconcile_likes', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(self.post.no_of_likes, 2)
+        self.assertEqual(empty.no_of_likes, 0)
+        self.assertIn('2 post(s) fixed', out.getvalue())
+
+
+class LikeEndpointTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.post = Post.objects.create(user=self.user, caption='Test Post')
+
+    def test_like_returns_count_and_state(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.post(reverse('like'), {'post_id': self.post.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'post_id': str(self.post.id), 'liked': True, 'no_of_likes': 1})
+
+        response = self.client.post(reverse('like'), {'post_id': self.post.id})
+        self.assertEqual(response.json()['liked'], False)
+        self.assertEqual(response.json()['no_of_likes'], 0)
+
+    def test_like_requires_post(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('like'), {'post_id': self.post.id})
+        self.assertEqual(response.status_code, 405)
+
+    def test_like_requires_login(self):
+        response = self.client.post(reverse('like'), {'post_id': self.post.id})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Like.objects.exists())
+
+    def test_like_unknown_post(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.post(reverse('like'), {'post_id': 'not-a-post'})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_like_through_async_client(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.post(reverse('like'), {'post_id': str(self.post.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['no_of_likes'], 1)
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, Client, override_settings
+from django.utils.http import http_date
+from core import media
+
+
+CONTENT = bytes(range(256)) * 40
+
+
+class MediaServingTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL='')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = Client()
+        self.name = default_storage.save('post_images/dog.jpg', ContentFile(CONTENT))
+        self.url = f'/media/{self.name}'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_blobs_have_their_digest_as_etag_and_are_cached_forever(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(CONTENT).hexdigest()}"')
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_unchanged_since_is_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date())
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        size = len(CONTENT)
+        for header, start, end in [('bytes=0-9', 0, 9), ('bytes=100-', 100, size - 1), ('bytes=-16', size - 16, size - 1)]:
+            response = self.client.get(self.url, HTTP_RANGE=header)
+
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+            self.assertEqual(self.body(response), CONTENT[start:end + 1])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_other_files_are_revalidated(self):
+        os.makedirs(os.path.join(self.media_root, 'post_images'))
+        with open(os.path.join(self.media_root, 'post_images', 'legacy.png'), 'wb') as handle:
+            handle.write(CONTENT)
+
+        response = self.client.get('/media/post_images/legacy.png')
+
+        self.assertEqual(response['Cache-Control'], media.CACHE_CONTROL)
+        self.assertRegex(response['ETag'], r'^"[0-9a-f]+-[0-9a-f]+"$')
+
+    def test_missing_files(self):
+        self.assertEqual(self.client.get('/media/blobs/missing.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/media/blobs/').status_code, 404)
+
+    @override_settings(MEDIA_ACCEL='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_nginx_copies_the_bytes(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.content, b'')
+        # Conditional requests are still answered without the proxy
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @override_settings(MEDIA_ACCEL='x-sendfile')
+    def test_sendfile_copies_the_bytes(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, self.name))
+        self.assertEqual(response.content, b'')
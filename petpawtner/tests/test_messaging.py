@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from core.messaging import conversations, thread
+from core.models import Profile, Message
+from core.services import mark_conversation_read, send_message
+
+
+class MessagingTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.vet = Profile.objects.create(user=User.objects.create_user(username='vet', password='x'), role='vet')
+        self.owner = Profile.objects.create(user=User.objects.create_user(username='owner', password='x'))
+        self.client.login(username='testuser', password='testpassword')
+
+    def unread(self, profile):
+        return Profile.objects.values_list('unread_messages', flat=True).get(pk=profile.pk)
+
+    def test_inbox_lists_latest_message_per_conversation(self):
+        send_message(self.vet, self.profile, 'Bring Rex at 9')
+        send_message(self.profile, self.owner, 'Is Bella free on Sunday?')
+        send_message(self.vet, self.profile, 'Actually 10')
+        send_message(self.owner, self.vet, 'Not in this inbox')
+
+        with self.assertNumQueries(1):
+            rows = conversations(self.profile)
+
+        self.assertEqual([(row.other, row.latest.content, row.unread) for row in rows], [
+            (self.vet, 'Actually 10', 2),
+            (self.owner, 'Is Bella free on Sunday?', 0),
+        ])
+        self.assertEqual(rows[0].other.user.username, 'vet')
+
+    def test_unread_counter_follows_sends_and_reads(self):
+        send_message(self.vet, self.profile, 'One')
+        send_message(self.vet, self.profile, 'Two')
+        send_message(self.owner, self.profile, 'Three')
+        self.assertEqual(self.unread(self.profile), 3)
+
+        self.assertEqual(mark_conversation_read(self.profile, self.vet), 2)
+        self.assertEqual(self.unread(self.profile), 1)
+        self.assertEqual(mark_conversation_read(self.profile, self.vet), 0)
+        self.assertEqual(self.unread(self.profile), 1)
+
+    def test_saving_a_stale_profile_keeps_the_counter(self):
+        stale = Profile.objects.get(pk=self.profile.pk)
+        send_message(self.vet, self.profile, 'Hello')
+        stale.bio = 'Dog person'
+        stale.save()
+
+        self.assertEqual(self.unread(self.profile), 1)
+
+    def test_thread_pages_cover_conversation_newest_first(self):
+        now = timezone.now()
+        for i in range(7):
+            message = send_message(self.vet if i % 2 else self.profile, self.profile if i % 2 else self.vet, f'Message {i}')
+            Message.objects.filter(pk=message.pk).update(timestamp=now - timedelta(minutes=i))
+        send_message(self.owner, self.profile, 'Other conversation')
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = thread(self.profile, self.vet, cursor, page_size=3)
+            seen.extend(message.content for message in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [f'Message {i}' for i in range(7)])
+
+    def test_opening_conversation_marks_it_read(self):
+        send_message(self.vet, self.profile, 'Rex is due for a vaccine')
+        response = self.client.get(reverse('conversation', args=['vet']))
+
+        self.assertContains(response, 'Rex is due for a vaccine')
+        self.assertEqual(self.unread(self.profile), 0)
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+
+    def test_send_message_from_conversation(self):
+        response = self.client.post(reverse('conversation', args=['vet']), {'content': '  Hello doctor  '})
+
+        self.assertRedirects(response, reverse('conversation', args=['vet']))
+        message = Message.objects.get()
+        self.assertEqual((message.sender, message.receiver, message.content), (self.profile, self.vet, 'Hello doctor'))
+        self.assertEqual(self.unread(self.vet), 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('conversation', args=['vet']), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_inbox_page(self):
+        send_message(self.vet, self.profile, 'See you soon')
+        response = self.client.get(reverse('inbox'))
+
+        self.assertContains(response, '@vet')
+        self.assertContains(response, 'See you soon')
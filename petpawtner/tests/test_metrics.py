@@ -0,0 +1,87 @@
+import json
+
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.metrics import RequestMetrics, registry
+from core.models import Profile, Post
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0, PERF_SLOW_REQUEST_SECONDS=60)
+class PerformanceMetricsTestCase(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        Post.objects.create(user=self.user, caption='Test Post', image='post_images/sdog.png')
+        self.client.login(username='testuser', password='testpassword')
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def sample(self, text, series):
+        for line in text.splitlines():
+            if line.startswith(series + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        self.fail(f'{series} not exported')
+
+    def test_requests_are_exported(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+
+        text = self.scrape()
+
+        self.assertIn('# TYPE petpawtner_request_duration_seconds histogram', text)
+        self.assertEqual(self.sample(text, 'petpawtner_requests_total{method="GET",status="200",view="home"}'), 2)
+        self.assertEqual(self.sample(text, 'petpawtner_request_duration_seconds_count{view="home"}'), 2)
+        self.assertEqual(self.sample(text, 'petpawtner_request_duration_seconds_bucket{view="home",le="+Inf"}'), 2)
+        self.assertGreater(self.sample(text, 'petpawtner_db_queries_total{view="home"}'), 0)
+        self.assertGreater(self.sample(text, 'petpawtner_template_render_seconds_total{view="home"}'), 0)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_counted(self):
+        self.client.get(reverse('home'))
+
+        text = self.scrape()
+
+        self.assertEqual(self.sample(text, 'petpawtner_requests_total{method="GET",status="200",view="home"}'), 1)
+        self.assertNotIn('petpawtner_db_queries_total{view="home"}', text)
+
+    def test_duplicate_queries_are_detected(self):
+        with RequestMetrics() as sampled:
+            list(Post.objects.filter(user=self.user))
+            list(Post.objects.filter(user=self.user))
+            list(Profile.objects.filter(user=self.user))
+
+        self.assertEqual(len(sampled.queries), 3)
+        self.assertEqual(len(sampled.duplicates), 1)
+        self.assertIn('core_post', sampled.duplicates[0])
+
+    @override_settings(PERF_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('core.performance', 'WARNING') as logs:
+            self.client.get(reverse('home'))
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['event'], entry['view'], entry['status']), ('slow_request', 'home', 200))
+        self.assertEqual(len(entry['slowest_sql']), min(entry['queries'], 10))
+        self.assertIn('SELECT', entry['slowest_sql'][0]['sql'])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_are_local_only(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_values_are_rendered_exactly(self):
+        registry.clear()
+        registry.inc('petpawtner_requests_total', {'view': 'home'}, 1234567)
+        registry.inc('petpawtner_requests_total', {'view': 'feed'}, 0.1)
+        registry.inc('petpawtner_requests_total', {'view': 'feed'}, 0.2)
+
+        text = registry.render()
+
+        self.assertIn('petpawtner_requests_total{view="home"} 1234567\n', text)
+        self.assertIn(f'petpawtner_requests_total{{view="feed"}} {0.1 + 0.2!r}\n', text)
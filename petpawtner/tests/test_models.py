@@ -79,11 +79,13 @@ class PostModelTest(TestCase):
 class LikeModelTest(TestCase):
 
     def setUp(self):
-        self.like = Like.objects.create(post_id='12345', username='testuser')
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.post = Post.objects.create(user=self.user, caption='Test Caption')
+        self.like = Like.objects.create(post=self.post, user=self.user)
 
     def test_like_creation(self):
-        self.assertEqual(self.like.post_id, '12345')
-        self.assertEqual(self.like.username, 'testuser')
+        self.assertEqual(self.like.post, self.post)
+        self.assertEqual(self.like.user, self.user)
         self.assertEqual(str(self.like), 'testuser')
 
 
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import User
+from core.models import Profile, Post
+from core.pagination import PROFILE_PAGE_SIZE
+
+
+class ProfileGridTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other = User.objects.create_user(username='otheruser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        Profile.objects.create(user=self.other)
+        now = timezone.now()
+        self.posts = [
+            Post.objects.create(user=self.user, caption=f'Post {i}', image=f'post_images/dog{i}.png', created_at=now - timedelta(minutes=i))
+            for i in range(PROFILE_PAGE_SIZE * 2 + 3)
+        ]
+        Post.objects.create(user=self.other, caption='Not mine', image='post_images/cat.png')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_profile_renders_first_page_only(self):
+        response = self.client.get(reverse('profile', args=['testuser']))
+        self.assertEqual([p.id for p in response.context['user_posts']], [p.id for p in self.posts[:PROFILE_PAGE_SIZE]])
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, 'loading="lazy"', count=PROFILE_PAGE_SIZE)
+        self.assertContains(response, '%d Posts Of Their Pets' % len(self.posts))
+
+    def test_pages_cover_the_profile_posts(self):
+        cursor = self.client.get(reverse('profile', args=['testuser'])).context['next_cursor']
+        pages = []
+        while cursor:
+            data = self.client.get(reverse('profile_posts', args=['testuser']), {'cursor': cursor}).json()
+            pages.append(data['html'])
+            cursor = data['next_cursor']
+        self.assertEqual(len(pages), 2)
+        html = ''.join(pages)
+        for i in range(len(self.posts)):
+            if i < PROFILE_PAGE_SIZE:
+                self.assertNotIn(f'dog{i}.png', html)
+            else:
+                self.assertIn(f'dog{i}.png', html)
+        self.assertNotIn('cat.png', html)
+
+    def test_profile_with_a_single_page(self):
+        response = self.client.get(reverse('profile', args=['otheruser']))
+        self.assertEqual(len(response.context['user_posts']), 1)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertNotContains(response, 'id="load-more"')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('profile_posts', args=['testuser']), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('profile_posts', args=['testuser']))
+        self.assertEqual(response.status_code, 302)
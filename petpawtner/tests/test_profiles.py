@@ -0,0 +1,117 @@
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core import profiles
+from core.models import Profile
+from core.services import send_message
+
+
+# A shared cache as configured by SHARED_CACHE_LOCATION, locmem is enough in one process
+CACHED = override_settings(
+    PROFILE_CACHE='default', SESSION_CACHE_ALIAS='default',
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+)
+
+
+@CACHED
+class RequestProfileTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user, bio='Dog person')
+        self.client.login(username='testuser', password='testpassword')
+
+    def user_lookups(self, path):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        # Lookups of the user or its profile, not the joins of the view itself
+        return [query['sql'] for query in captured if ' FROM "auth_user"' in query['sql'] or ' FROM "core_profile"' in query['sql']]
+
+    def test_user_and_profile_are_loaded_in_one_query(self):
+        cache.clear()
+
+        queries = self.user_lookups(reverse('inbox'))
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('INNER JOIN "auth_user"', queries[0])
+
+    def test_cached_profile_needs_no_query(self):
+        self.client.get(reverse('inbox'))
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('index'))
+        self.assertEqual(self.user_lookups(reverse('inbox')), [])
+
+    def test_saving_the_profile_invalidates_it(self):
+        self.client.get(reverse('inbox'))
+
+        self.profile.bio = 'Cat person'
+        self.profile.save()
+
+        self.assertEqual(profiles.cached_profile(self.user.pk).bio, 'Cat person')
+
+    def test_password_change_ends_cached_sessions(self):
+        self.client.get(reverse('inbox'))
+
+        self.user.set_password('newpassword')
+        self.user.save()
+
+        self.assertRedirects(self.client.get(reverse('inbox')), '/signin/?next=/inbox/', fetch_redirect_response=False)
+
+    def test_new_messages_invalidate_the_unread_counter(self):
+        sender = Profile.objects.create(user=User.objects.create_user(username='other', password='pw'))
+        self.client.get(reverse('inbox'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            send_message(sender, self.profile, 'Woof')
+
+        self.assertEqual(profiles.cached_profile(self.user.pk).unread_messages, 1)
+
+    def test_users_without_a_profile(self):
+        User.objects.create_user(username='admin', password='adminpassword')
+        self.client.login(username='admin', password='adminpassword')
+
+        self.assertEqual(self.client.get(reverse('inbox')).status_code, 404)
+        self.assertRedirects(self.client.post(reverse('add_pets')), reverse('settings'), fetch_redirect_response=False)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        client = Client()
+        client.login(username='testuser', password='testpassword')
+        client.get(reverse('inbox'))
+
+        with self.assertNumQueries(0):
+            client.get(reverse('index'))
+        self.assertEqual(client.get(reverse('inbox')).status_code, 200)
+
+
+@override_settings(PROFILE_CACHE=None, SESSION_ENGINE='django.contrib.sessions.backends.db')
+class UncachedProfileTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user, bio='Dog person')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_every_request_loads_the_profile_in_one_query(self):
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(reverse('inbox')).status_code, 200)
+            lookups = [query['sql'] for query in captured if ' FROM "core_profile" INNER JOIN "auth_user"' in query['sql']]
+            self.assertEqual(len(lookups), 1)
+        self.assertFalse(cache.has_key(profiles.cache_key(self.user.pk)))
+
+    def test_changes_are_seen_at_once(self):
+        self.client.get(reverse('index'))
+
+        Profile.objects.filter(pk=self.profile.pk).update(bio='Cat person')
+
+        self.assertEqual(profiles.cached_profile(self.user.pk).bio, 'Cat person')
+        profiles.invalidate(self.user.pk)
+        self.assertIsNone(profiles.cached_profile(User.objects.create_user(username='admin').pk))
@@ -0,0 +1,84 @@
+"""
+Query budgets per view. The budgets must hold whatever the number of
+rows on the page, so a view or template that goes back to one query per
+row fails here.
+"""
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.models import Profile, Post, Pet, Vet
+from core.services import send_message
+from core.pagination import FEED_PAGE_SIZE
+from core.testing import QueryBudgetMixin
+
+
+HOME_BUDGET = 6
+FEED_BUDGET = 3
+PROFILE_BUDGET = 4
+PROFILE_POSTS_BUDGET = 3
+SEARCH_BUDGET = 8
+INBOX_BUDGET = 4
+CONVERSATION_BUDGET = 10
+
+
+# Sessions and profiles in a shared cache, as deployed with SHARED_CACHE_LOCATION
+@override_settings(
+    PROFILE_CACHE='default', SESSION_CACHE_ALIAS='default',
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+)
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        # Budgets are measured against a cold cache
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        for i in range(FEED_PAGE_SIZE):
+            author = User.objects.create_user(username=f'author{i}', password='testpassword')
+            profile = Profile.objects.create(user=author, role='vet' if i % 2 else 'owner')
+            Post.objects.create(user=author, caption=f'Post {i}', image='post_images/sdog.png')
+            Post.objects.create(user=self.user, caption=f'Own post {i}', image='post_images/sdog.png')
+            Pet.objects.create(owner=profile, name=f'Rex {i}', breed='Terrier', age='2', location='Lagos')
+            if i % 2:
+                Vet.objects.create(profile=profile, clinic_name='Clinic', specialty='Terrier care', years_of_experience=i)
+            send_message(profile, self.profile, f'Hello {i}')
+            send_message(self.profile, profile, f'Hi {i}')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_home_query_budget(self):
+        response = self.assertQueryBudget(HOME_BUDGET, self.client.get, reverse('home'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed_query_budget(self):
+        cursor = self.client.get(reverse('home')).context['next_cursor']
+        with self.assertQueryBudget(FEED_BUDGET):
+            response = self.client.get(reverse('feed'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_query_budget(self):
+        response = self.assertQueryBudget(PROFILE_BUDGET, self.client.get, reverse('profile', args=['testuser']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_posts_query_budget(self):
+        with self.assertQueryBudget(PROFILE_POSTS_BUDGET):
+            response = self.client.get(reverse('profile_posts', args=['testuser']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_query_budget(self):
+        response = self.assertQueryBudget(SEARCH_BUDGET, self.client.get, reverse('search'), {'q': 'Terrier'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_inbox_query_budget(self):
+        response = self.assertQueryBudget(INBOX_BUDGET, self.client.get, reverse('inbox'))
+        self.assertEqual(len(response.context['conversations']), FEED_PAGE_SIZE)
+
+    def test_conversation_query_budget(self):
+        response = self.assertQueryBudget(CONVERSATION_BUDGET, self.client.get, reverse('conversation', args=['author1']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget_fails_when_exceeded(self):
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(1):
+                list(User.objects.all())
+                list(Profile.objects.all())
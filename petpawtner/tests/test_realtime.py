@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from core.models import Profile
+from core.realtime import get_broker, profile_channel
+from core.services import mark_conversation_read, send_message
+from core.websocket import WEBSOCKET_PATH, websocket_application
+
+IDLE_CONNECTIONS = 2000
+# Memory allowed per idle connection, the test harness included
+CONNECTION_BUDGET = 16 * 1024
+
+
+class FakeSocket:
+    """
+    One client connection to the WebSocket application, driven by the test
+    """
+    def __init__(self, cookie=None, origin=None):
+        headers = [(b'host', b'testserver')]
+        if cookie:
+            headers.append((b'cookie', cookie.encode()))
+        if origin:
+            headers.append((b'origin', origin.encode()))
+        self.scope = {'type': 'websocket', 'path': WEBSOCKET_PATH, 'headers': headers}
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        self.sent = []
+        self.blocked = None
+        self.task = asyncio.ensure_future(websocket_application(self.scope, self.incoming.get, self.send))
+
+    async def send(self, message):
+        if self.blocked is not None:
+            await self.blocked.wait()
+        self.sent.append(message)
+
+    @property
+    def accepted(self):
+        return bool(self.sent) and self.sent[0]['type'] == 'websocket.accept'
+
+    @property
+    def events(self):
+        return [json.loads(message['text']) for message in self.sent if message['type'] == 'websocket.send']
+
+    async def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
+
+
+async def settle(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the connections')
+        await asyncio.sleep(0.01)
+
+
+class RealtimeTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='testpassword')
+        self.vet = User.objects.create_user(username='vet', password='testpassword')
+        self.owner_profile = Profile.objects.create(user=self.owner)
+        self.vet_profile = Profile.objects.create(user=self.vet, role='vet')
+        self.owner_cookie = self.session_cookie('owner')
+        self.vet_cookie = self.session_cookie('vet')
+
+    def session_cookie(self, username):
+        client = Client()
+        client.login(username=username, password='testpassword')
+        return f"sessionid={client.cookies['sessionid'].value}"
+
+    @sync_to_async
+    def send(self, sender, receiver, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return send_message(sender, receiver, content)
+
+    @sync_to_async
+    def read(self, profile, other):
+        with self.captureOnCommitCallbacks(execute=True):
+            return mark_conversation_read(profile, other)
+
+    async def test_anonymous_connection_is_refused(self):
+        socket = FakeSocket()
+        await socket.task
+        self.assertEqual(socket.sent, [{'type': 'websocket.close', 'code': 4401}])
+
+    async def test_cross_site_connection_is_refused(self):
+        socket = FakeSocket(self.owner_cookie, origin='https://evil.example')
+        await socket.task
+        self.assertEqual(socket.sent, [{'type': 'websocket.close', 'code': 4403}])
+
+    async def test_message_and_read_receipt_are_pushed(self):
+        owner = FakeSocket(self.owner_cookie, origin='http://testserver')
+        vet = FakeSocket(self.vet_cookie)
+        await settle(lambda: owner.accepted and vet.accepted)
+
+        await self.send(self.owner_profile, self.vet_profile, 'Rex is limping')
+        await settle(lambda: owner.events and vet.events)
+        event = vet.events[0]
+        self.assertEqual((event['type'], event['sender'], event['receiver'], event['content']),
+                         ('message', 'owner', 'vet', 'Rex is limping'))
+        self.assertEqual(owner.events, vet.events)
+
+        await self.read(self.vet_profile, self.owner_profile)
+        await settle(lambda: len(owner.events) == 2)
+        self.assertEqual(owner.events[1], {'type': 'read', 'reader': 'vet', 'count': 1})
+        self.assertEqual(len(vet.events), 1)
+
+        await owner.disconnect()
+        await vet.disconnect()
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    @override_settings(REALTIME_QUEUE_SIZE=5)
+    async def test_slow_client_is_dropped(self):
+        socket = FakeSocket(self.owner_cookie)
+        await settle(lambda: socket.accepted)
+
+        # The client stops reading, every send blocks
+        socket.blocked = asyncio.Event()
+        channel = profile_channel(self.owner_profile.pk)
+        for i in range(20):
+            get_broker().publish(channel, {'type': 'message', 'content': str(i)})
+        await asyncio.sleep(0.05)
+        # Dropped once its buffer was full, nothing more is kept for it
+        self.assertEqual(get_broker().subscriber_count(channel), 0)
+
+        socket.blocked.set()
+        await settle(lambda: socket.sent[-1]['type'] == 'websocket.close')
+        self.assertEqual(socket.sent[-1]['code'], 1013)
+        self.assertLessEqual(len(socket.events), 5)
+        await socket.disconnect()
+
+    async def test_thousands_of_idle_connections(self):
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            sockets = [FakeSocket(self.owner_cookie) for _ in range(IDLE_CONNECTIONS)]
+            await settle(lambda: all(socket.accepted for socket in sockets))
+            await asyncio.sleep(0.1)
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess((after - before) / IDLE_CONNECTIONS, CONNECTION_BUDGET)
+
+        await self.send(self.vet_profile, self.owner_profile, 'Hello everyone')
+        await settle(lambda: all(socket.events for socket in sockets))
+
+        for socket in sockets:
+            await socket.disconnect()
+        self.assertEqual(get_broker().subscriber_count(), 0)
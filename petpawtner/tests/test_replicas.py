@@ -0,0 +1,127 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TransactionTestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.middleware import STICKY_COOKIE
+from core.models import Profile, Post
+from core.services import send_message
+
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+# Rows are committed for real, nothing may be written into the project media
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=10, MEDIA_ROOT=MEDIA_ROOT)
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """
+    Two SQLite files stand in for the primary, swapped in as the default
+    database, and a replica. Replication is a copy of the primary file,
+    made only when a test asks for it, so anything read from the replica
+    is stale until then.
+    """
+    # The replica alias only exists once setUpClass registers it,
+    # the test runner sets up the default database
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.test_database = connections['default']
+        cls.test_database_settings = connections.settings['default']
+        cls.test_database.ensure_connection()
+        paths = {}
+        for alias in ('default', 'replica'):
+            paths[alias] = os.path.join(cls.directory, f'{alias}.sqlite3')
+            # Copy the schema of the test database
+            target = sqlite3.connect(paths[alias])
+            cls.test_database.connection.backup(target)
+            target.close()
+            connections.settings[alias] = {**cls.test_database_settings, 'NAME': paths[alias]}
+        connections['default'] = DatabaseWrapper(connections.settings['default'], 'default')
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in ('default', 'replica'):
+            connections[alias].close()
+        del connections['replica']
+        del connections.settings['replica']
+        connections.settings['default'] = cls.test_database_settings
+        connections['default'] = cls.test_database
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Rows are committed here, keep image variants out of it
+        patcher = mock.patch('core.images.schedule')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other = User.objects.create_user(username='otheruser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.other_profile = Profile.objects.create(user=self.other)
+        self.post = Post.objects.create(user=self.other, caption='Replicated post', image='post_images/sdog.png')
+        self.replicate()
+        self.client = Client()
+        self.client.login(username='testuser', password='testpassword')
+        # Logging in wrote the session, start outside the sticky window
+        self.client.cookies.pop(STICKY_COOKIE, None)
+
+    def replicate(self):
+        connections['replica'].close()
+        primary = connections['default']
+        primary.ensure_connection()
+        target = sqlite3.connect(connections['replica'].settings_dict['NAME'])
+        primary.connection.backup(target)
+        target.close()
+
+    def test_read_views_use_the_replica(self):
+        Post.objects.create(user=self.other, caption='Not replicated yet', image='post_images/sdog.png')
+
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Replicated post')
+        self.assertNotContains(response, 'Not replicated yet')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        self.replicate()
+        self.assertContains(self.client.get(reverse('home')), 'Not replicated yet')
+
+    def test_writer_reads_their_own_writes(self):
+        response = self.client.get(reverse('like_post'), {'post_id': self.post.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['posts'][0].no_of_likes, 1)
+
+        # Once the window is over the replica is read again, still stale
+        self.client.cookies.pop(STICKY_COOKIE)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['posts'][0].no_of_likes, 0)
+
+    def test_other_views_read_the_primary(self):
+        send_message(self.other_profile, self.profile, 'Not replicated yet')
+
+        response = self.client.get(reverse('inbox'))
+
+        self.assertContains(response, 'Not replicated yet')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        Post.objects.create(user=self.other, caption='Not replicated yet', image='post_images/sdog.png')
+
+        response = self.client.get(reverse('like_post'), {'post_id': self.post.id})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertContains(self.client.get(reverse('home')), 'Not replicated yet')
@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core import search
+from core.models import Profile, Pet, Vet
+
+
+class SearchIndexTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user, bio='Dog lover', location='Lagos')
+        self.vet_user = User.objects.create_user(username='drhabeeb', password='testpassword')
+        self.vet_profile = Profile.objects.create(user=self.vet_user, role='vet', location='Abuja')
+        self.vet = Vet.objects.create(profile=self.vet_profile, clinic_name='Paws Clinic', specialty='Retriever surgery', years_of_experience=5)
+        self.buddy = Pet.objects.create(owner=self.profile, name='Buddy', breed='Golden Retriever', age='2', location='Lagos')
+        self.rex = Pet.objects.create(owner=self.profile, name='Rex', breed='Terrier', age='3', location='Lagos', bio='Loves retrievers')
+
+    def test_ranked_by_weighted_columns(self):
+        results, has_next = search.search('retriever')
+        # A breed match outranks a bio match
+        self.assertEqual(results['pet'], [self.buddy, self.rex])
+        self.assertEqual(results['vet'], [self.vet])
+        self.assertFalse(has_next)
+
+    def test_older_documents_are_ranked_too(self):
+        backend = search.get_backend()
+        kind = search.SEARCHABLE['pet']
+        newer = [(self.rex.pk + i, ('Pet', '', 'Likes retrievers', '')) for i in range(1, 1200)]
+        backend.bulk_index(kind, newer, 'default')
+
+        # The oldest document is the best match of 1200
+        self.assertEqual(backend.search(kind, ['retriever'], 0, 1, 'default'), [self.buddy.pk])
+
+    def test_prefix_matching(self):
+        results, _ = search.search('gold ret')
+        self.assertEqual(results['pet'], [self.buddy])
+
+    def test_profiles_by_username_bio_and_location(self):
+        self.assertEqual(search.search('testus')[0]['profile'], [self.profile])
+        self.assertEqual(search.search('lover')[0]['profile'], [self.profile])
+        self.assertEqual(search.search('abuja')[0]['profile'], [self.vet_profile])
+
+    def test_syntax_characters_are_ignored(self):
+        results, _ = search.search('"buddy*) (')
+        self.assertEqual(results['pet'], [self.buddy])
+        self.assertEqual(search.search('*:"')[0]['pet'], [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.buddy.name = 'Max'
+        self.buddy.save()
+        self.assertEqual(search.search('buddy')[0]['pet'], [])
+        self.assertEqual(search.search('max')[0]['pet'], [self.buddy])
+        self.buddy.delete()
+        self.assertEqual(search.search('max')[0]['pet'], [])
+
+    def test_username_change_is_reindexed(self):
+        self.vet_user.username = 'drsmith'
+        self.vet_user.save()
+        self.assertEqual(search.search('drsmith')[0]['vet'], [self.vet])
+        self.assertEqual(search.search('drhabeeb')[0]['profile'], [])
+
+    def test_pagination(self):
+        for i in range(3):
+            Pet.objects.create(owner=self.profile, name=f'Spot {i}', breed='Beagle', age='1', location='Lagos')
+        first, has_next = search.search('beagle', kinds=['pet'], page_size=2)
+        second, last = search.search('beagle', kinds=['pet'], page=2, page_size=2)
+        self.assertTrue(has_next)
+        self.assertFalse(last)
+        self.assertEqual(len(first['pet']) + len(second['pet']), 3)
+        self.assertFalse(set(first['pet']) & set(second['pet']))
+
+    def test_rebuild_command(self):
+        search.get_backend().clear(search.SEARCHABLE['pet'], 'default')
+        self.assertEqual(search.search('buddy')[0]['pet'], [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.search('buddy')[0]['pet'], [self.buddy])
+
+    def test_search_view(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('search'), {'q': 'retriever'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Buddy')
+        self.assertContains(response, 'Paws Clinic')
+
+    def test_search_view_no_results(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('search'), {'q': 'Nonexistent'})
+        self.assertContains(response, 'No results found')
+
+
+@override_settings(SEARCH_BACKEND='core.search.DatabaseSearchBackend')
+class DatabaseSearchBackendTestCase(TestCase):
+    def setUp(self):
+        search.get_backend.cache_clear()
+        self.addCleanup(search.get_backend.cache_clear)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.buddy = Pet.objects.create(owner=self.profile, name='Buddy', breed='Golden Retriever', age='2')
+
+    def test_fallback_matches_every_token(self):
+        self.assertEqual(search.search('gold buddy')[0]['pet'], [self.buddy])
+        self.assertEqual(search.search('gold rex')[0]['pet'], [])
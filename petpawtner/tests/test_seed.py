@@ -0,0 +1,49 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.contrib.auth.models import User
+from core import fixtures
+from core.models import Profile, Post, Like, Message
+
+
+class SeedCommandTestCase(TestCase):
+    def test_seed_creates_the_dataset(self):
+        out = StringIO()
+        call_command('seed', posts=100, seed=3, batch_size=30, stdout=out)
+
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Message.objects.count(), 100)
+        self.assertEqual(Like.objects.count(), sum(Post.objects.values_list('no_of_likes', flat=True)))
+        self.assertIn('100 posts', out.getvalue())
+        # Every user logs in with the seeded password
+        self.assertTrue(self.client.login(username='user0', password=fixtures.PASSWORD))
+
+    def test_seeding_twice_is_refused(self):
+        call_command('seed', posts=10, stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('seed', posts=10, stdout=StringIO())
+
+    def test_counters_add_up_across_chunks(self):
+        with mock.patch.object(fixtures, 'CHUNK_POSTS', 15):
+            fixtures.generate(100, batch_size=7)
+
+        out = StringIO()
+        call_command('recount', stdout=out)
+        call_command('reconcile_likes', stdout=out)
+        self.assertIn(' 0 profile(s) fixed', out.getvalue())
+        self.assertIn(' 0 post(s) fixed', out.getvalue())
+        self.assertEqual(sum(Profile.objects.values_list('unread_messages', flat=True)),
+                         Message.objects.filter(is_read=False).count())
+
+    def test_posts_keep_their_backend_values(self):
+        fixtures.generate(20)
+
+        post = Post.objects.select_related('user').first()
+        self.assertEqual(post.image_variants, {})
+        self.assertEqual(post.version, 0)
+        self.assertEqual(Like.objects.filter(post=post).count(), post.no_of_likes)
+        self.assertTrue(User.objects.filter(pk=post.user_id).exists())
@@ -0,0 +1,131 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, Client, override_settings
+from PIL import Image
+from core import staticfiles
+
+
+PIPELINE = {
+    'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'core.staticfiles.BundlingStorage'},
+}
+BUNDLES = {
+    'css/page.css': ['css/a.css', 'css/b.css'],
+    'js/page.js': ['js/a.js', 'js/b.js'],
+}
+
+
+class StaticPipelineTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sources = tempfile.mkdtemp()
+        cls.root = tempfile.mkdtemp()
+        files = {
+            'css/a.css': '/* theme */\n.logo {\n    background: url("logo.png");\n}\n' * 40,
+            'css/b.css': '@import url("https://fonts.example.com/css?family=Inter;Muli");\np { content: "a  ;  b"; }\n',
+            'js/a.js': 'var a = 1\n',
+            'js/b.js': '(function () { return a })()\n',
+        }
+        for name, content in files.items():
+            os.makedirs(os.path.join(cls.sources, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(cls.sources, name), 'w') as handle:
+                handle.write(content)
+        Image.new('RGB', (64, 64), 'white').save(os.path.join(cls.sources, 'css', 'logo.png'), compress_level=0)
+
+        cls.settings = override_settings(
+            STATICFILES_DIRS=[cls.sources],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_ROOT=cls.root,
+            STATIC_BUNDLES=BUNDLES,
+            STORAGES=PIPELINE,
+        )
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.sources)
+        shutil.rmtree(cls.root)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+
+    def collected(self, name):
+        with open(os.path.join(self.root, name), 'rb') as handle:
+            return handle.read()
+
+    def bundle_tag(self, name):
+        return Template('{% load bundles %}{% bundle name %}').render(Context({'name': name}))
+
+    def bundle_url(self, name):
+        return re.search(r'(?:href|src)="([^"]+)"', self.bundle_tag(name)).group(1)
+
+    def test_bundles_are_one_hashed_file(self):
+        html = self.bundle_tag('css/page.css')
+
+        self.assertRegex(html, r'^<link rel="stylesheet" href="/static/css/page\.[0-9a-f]{12}\.css">$')
+        self.assertRegex(self.bundle_tag('js/page.js'), r'^<script src="/static/js/page\.[0-9a-f]{12}\.js"></script>$')
+
+    def test_bundles_are_joined_and_minified(self):
+        css = self.collected(self.bundle_url('css/page.css')[len('/static/'):]).decode()
+
+        self.assertTrue(css.startswith('@import url("https://fonts.example.com/css?family=Inter;Muli");'))
+        self.assertNotIn('theme', css)
+        self.assertIn('content: "a  ;  b";', css)
+        self.assertRegex(css, r'url\("logo\.[0-9a-f]{12}\.png"\)')
+        js = self.collected(self.bundle_url('js/page.js')[len('/static/'):]).decode()
+        self.assertIn('var a = 1\n\n;\n(function', js)
+
+    def test_text_files_are_precompressed(self):
+        name = self.bundle_url('css/page.css')[len('/static/'):]
+
+        self.assertEqual(gzip.decompress(self.collected(name + '.gz')), self.collected(name))
+
+    def test_images_are_optimized_losslessly(self):
+        name = next(
+            name for name in os.listdir(os.path.join(self.root, 'css'))
+            if staticfiles.HASHED_NAME.search(name) and name.endswith('.png')
+        )
+
+        self.assertLess(len(self.collected(f'css/{name}')), len(self.collected('css/logo.png')))
+
+    def test_precompressed_files_are_served_and_cached_forever(self):
+        url = self.bundle_url('css/page.css')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], staticfiles.IMMUTABLE_CACHE_CONTROL)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.collected(url[len('/static/'):]))
+
+    def test_identity_is_served_when_compression_is_refused(self):
+        url = self.bundle_url('css/page.css')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_unhashed_files_are_revalidated(self):
+        response = self.client.get('/static/css/a.css')
+
+        self.assertEqual(response['Cache-Control'], staticfiles.CACHE_CONTROL)
+
+
+class BundleTagTestCase(TestCase):
+    @override_settings(STATIC_BUNDLES=BUNDLES)
+    def test_sources_are_linked_without_the_pipeline(self):
+        html = Template("{% load bundles %}{% bundle 'js/page.js' %}").render(Context())
+
+        self.assertEqual(html, '<script src="/static/js/a.js"></script>\n<script src="/static/js/b.js"></script>')
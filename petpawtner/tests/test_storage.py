@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from PIL import Image
+from core import storage
+from core.models import Profile, Pet, Post, Blob
+from core.storage import ContentAddressedStorage
+
+
+def picture(color='orange'):
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def upload(content=None, name='dog_bg.JPG'):
+    return SimpleUploadedFile(name, content or picture(), content_type='image/jpeg')
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+
+    def blob_files(self):
+        found = []
+        for root, _, files in os.walk(os.path.join(self.media_root, 'blobs')):
+            found.extend(files)
+        return found
+
+    def test_identical_uploads_share_one_file(self):
+        first = Post.objects.create(user=self.user, caption='One', image=upload())
+        second = Post.objects.create(user=self.user, caption='Two', image=upload(name='dog_bg.JPG'))
+        pet = Pet.objects.create(owner=self.profile, name='Rex', breed='Terrier', age='2', profileimg=upload(name='other.jpg'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('blobs/'))
+        self.assertTrue(first.image.name.endswith('.jpg'))
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(Blob.objects.get(name=first.image.name).refcount, 3)
+        self.assertEqual(pet.profileimg.read(), picture())
+
+    def test_last_reference_deletes_the_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Post.objects.create(user=self.user, caption='One', image=upload())
+            second = Post.objects.create(user=self.user, caption='Two', image=upload())
+        name = first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+
+        variants = Blob.objects.get(name=name).variants['variants']
+        self.assertTrue(default_storage.exists(variants[0]['webp']))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(variants[0]['webp']))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_blob_collected_while_an_upload_reuses_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Post.objects.create(user=self.user, caption='One', image=upload())
+        name = first.image.name
+        save = ContentAddressedStorage._save
+
+        def save_then_collect(storage_, *args):
+            # The last reference goes away after the upload found the file
+            saved = save(storage_, *args)
+            Post.objects.filter(pk=first.pk).delete()
+            storage.collect(saved)
+            return saved
+
+        with mock.patch.object(ContentAddressedStorage, '_save', save_then_collect), \
+                self.captureOnCommitCallbacks(execute=True):
+            second = Post.objects.create(user=self.user, caption='Two', image=upload())
+
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+        self.assertEqual(default_storage.open(name).read(), picture())
+
+    def test_collected_blob_without_content(self):
+        storage.retain(default_storage.save('dog.jpg', ContentFile(picture())))
+        name = Blob.objects.get().name
+        storage.release(name)
+        storage.collect(name)
+
+        with self.assertRaises(FileNotFoundError):
+            storage.retain(name)
+
+    def test_variants_rendered_once_per_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Post.objects.create(user=self.user, caption='One', image=upload())
+        with mock.patch('core.images.render_variants') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                second = Post.objects.create(user=self.user, caption='Two', image=upload())
+        render.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_variants, second.image_variants)
+
+    def test_replacing_an_image_releases_the_old_one(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(user=self.user, caption='One', image=upload())
+        old = post.image.name
+        post = Post.objects.get(pk=post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.image = upload(picture('blue'))
+            post.save()
+        self.assertFalse(default_storage.exists(old))
+        self.assertEqual(Blob.objects.get().name, post.image.name)
+
+    def test_dedupe_media_command(self):
+        legacy = []
+        for name in ('post_images/dog_bg.JPG', 'post_images/dog_bg_0uZVZPx.JPG', 'pet_images/dog_bg_3X9xaCj.JPG'):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(b'legacy picture')
+            legacy.append(name)
+        unreferenced = legacy.pop()
+        posts = [Post.objects.create(user=self.user, caption=name, image=name) for name in legacy]
+        Post.objects.create(user=self.user, caption='Gone', image='post_images/missing.jpg')
+
+        out = StringIO()
+        call_command('dedupe_media', delete_originals=True, recount=True, stdout=out)
+
+        names = {post.image.name for post in Post.objects.filter(pk__in=[p.pk for p in posts])}
+        self.assertEqual(len(names), 1)
+        blob = names.pop()
+        self.assertEqual(Blob.objects.get(name=blob).refcount, 2)
+        self.assertEqual(len(self.blob_files()), 1)
+        for name in legacy + [unreferenced]:
+            self.assertFalse(default_storage.exists(name))
+        self.assertIn('Post: 2 file(s) moved', out.getvalue())
+
+        # Converted rows are skipped when the command runs again
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Post: 0 file(s) moved', out.getvalue())
+
+    def test_saving_content_without_a_name_hint(self):
+        name = default_storage.save('anything/else.PNG', ContentFile(b'bytes'))
+        self.assertRegex(name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
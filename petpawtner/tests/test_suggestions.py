@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from core.models import Profile
+from core.suggestions import SUGGESTION_COUNT, build_pool, suggest_profiles
+from core.testing import QueryBudgetMixin
+
+
+class SuggestionTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user, location='Lagos')
+        for i in range(10):
+            user = User.objects.create_user(username=f'user{i}', password='testpassword')
+            Profile.objects.create(user=user, location='Abuja')
+
+    def test_suggestions_are_distinct_and_exclude_viewer(self):
+        for _ in range(20):
+            suggestions = suggest_profiles(self.user)
+            self.assertEqual(len(suggestions), SUGGESTION_COUNT)
+            self.assertEqual(len({profile.pk for profile in suggestions}), SUGGESTION_COUNT)
+            self.assertNotIn(self.profile.pk, [profile.pk for profile in suggestions])
+
+    def test_pool_is_cached(self):
+        suggest_profiles(self.user)
+        with self.assertQueryBudget(0):
+            suggestions = suggest_profiles(self.user)
+            [profile.user.username for profile in suggestions]
+
+    def test_pool_is_bounded(self):
+        self.assertEqual(len(build_pool(size=5)), 5)
+        self.assertEqual(len(build_pool(size=3)), 3)
+
+    def test_fewer_users_than_suggestions(self):
+        Profile.objects.exclude(pk=self.profile.pk).delete()
+        self.assertEqual(suggest_profiles(self.user), [])
+
+    def test_empty_table(self):
+        Profile.objects.all().delete()
+        self.assertEqual(build_pool(), [])
+
+    def test_home_shows_suggestions(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['suggested_profiles']), SUGGESTION_COUNT)
+        self.assertContains(response, 'Abuja', count=SUGGESTION_COUNT)
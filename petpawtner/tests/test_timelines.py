@@ -0,0 +1,176 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core import timelines
+from core.models import Follow, Post, Profile, TimelineEntry
+from core.services import toggle_follow
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(TIMELINE_WORKERS=0, IMAGE_WORKERS=0, TIMELINE_CELEBRITY_FOLLOWERS=3, MEDIA_ROOT=MEDIA_ROOT)
+class TimelineTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.owner = self.make_profile('owner')
+        self.vet = self.make_profile('vet')
+        self.stranger = self.make_profile('stranger')
+        self.client.login(username='owner', password='testpassword')
+        self.now = timezone.now()
+        self.minutes = 0
+
+    def make_profile(self, username):
+        user = User.objects.create_user(username=username, password='testpassword')
+        return Profile.objects.create(user=user)
+
+    def post(self, profile, caption='Woof'):
+        # Every post is older than the one before, so the newest is first
+        self.minutes += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                user=profile.user, caption=caption, image='post_images/dog.png',
+                created_at=self.now - timedelta(minutes=self.minutes),
+            )
+
+    def follow(self, follower, followee):
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_follow(follower, followee)
+        follower.refresh_from_db()
+        followee.refresh_from_db()
+
+    def home(self, profile):
+        posts, cursor = timelines.home_feed(profile)
+        return posts
+
+    def test_posts_are_fanned_out_to_followers_and_author(self):
+        self.follow(self.owner, self.vet)
+
+        post = self.post(self.vet)
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.owner, post=post).exists())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.vet, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.stranger).exists())
+
+    def test_home_shows_the_followed_and_own_posts(self):
+        self.follow(self.owner, self.vet)
+        own = self.post(self.owner)
+        followed = self.post(self.vet)
+        self.post(self.stranger)
+
+        response = self.client.get(reverse('home'))
+
+        self.assertEqual([post.pk for post in response.context['posts']], [own.pk, followed.pk])
+
+    def test_a_timeline_page_is_one_range_scan(self):
+        self.follow(self.owner, self.vet)
+        self.post(self.vet)
+
+        # The followed celebrities, then the page joined with its posts
+        with self.assertNumQueries(2):
+            posts = self.home(self.owner)
+            self.assertEqual(posts[0].user.username, 'vet')
+
+    def test_profiles_following_nobody_see_every_post(self):
+        self.post(self.stranger)
+
+        self.assertEqual(len(self.home(self.owner)), 1)
+
+    def test_following_backfills_and_unfollowing_removes(self):
+        posts = [self.post(self.vet), self.post(self.vet)]
+
+        self.follow(self.owner, self.vet)
+        self.assertEqual((self.owner.following_count, self.vet.follower_count), (1, 1))
+        self.assertEqual(self.home(self.owner), posts)
+
+        self.follow(self.owner, self.vet)
+        self.assertEqual((self.owner.following_count, self.vet.follower_count), (0, 0))
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.owner).exists())
+
+    def test_first_follow_keeps_the_own_older_posts(self):
+        # Written before timelines were kept, never fanned out
+        own = Post.objects.create(
+            user=self.owner.user, caption='Before timelines', image='post_images/dog.png', created_at=self.now,
+        )
+        TimelineEntry.objects.filter(post=own).delete()
+        followed = self.post(self.vet)
+
+        self.follow(self.owner, self.vet)
+
+        self.assertEqual(self.home(self.owner), [own, followed])
+
+    def test_celebrities_are_read_instead_of_fanned_out(self):
+        self.follow(self.owner, self.vet)
+        before = self.post(self.vet, 'Before')
+        for username in ['fan1', 'fan2']:
+            self.follow(self.make_profile(username), self.vet)
+        own = self.post(self.owner)
+        after = self.post(self.vet, 'After')
+
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.owner, post=after).exists())
+        # Merged newest first, the entry fanned out before is not repeated
+        self.assertEqual(self.home(self.owner), [before, own, after])
+
+    def test_pages_merge_timeline_and_celebrity_posts(self):
+        self.follow(self.owner, self.vet)
+        for username in ['fan1', 'fan2']:
+            self.follow(self.make_profile(username), self.vet)
+        expected = [self.post(self.owner if i % 3 else self.vet) for i in range(25)]
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = timelines.home_feed(self.owner, cursor)
+            seen += page
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(reverse('feed'), {'cursor': self.client.get(reverse('home')).context['next_cursor']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_view(self):
+        response = self.client.post(reverse('follow', args=['vet']))
+
+        self.assertRedirects(response, reverse('profile', args=['vet']), fetch_redirect_response=False)
+        self.assertTrue(Follow.objects.filter(follower=self.owner, followee=self.vet).exists())
+        self.assertContains(self.client.get(reverse('profile', args=['vet'])), 'Unfollow')
+        self.assertEqual(self.client.post(reverse('follow', args=['owner'])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('follow', args=['vet'])).status_code, 405)
+
+    def test_backfill_command_rebuilds_timelines(self):
+        Follow.objects.create(follower=self.owner, followee=self.vet)
+        posts = Post.objects.bulk_create([
+            Post(user=self.vet.user, caption='Seeded', image='post_images/dog.png', created_at=self.now - timedelta(days=1)),
+            Post(user=self.stranger.user, caption='Seeded', image='post_images/dog.png', created_at=self.now - timedelta(days=1)),
+        ])
+
+        out = StringIO()
+        call_command('backfill_timelines', username=['owner'], stdout=out)
+
+        self.assertIn('Rebuilt 1 timeline(s) with 1 post(s)', out.getvalue())
+        self.assertEqual(list(TimelineEntry.objects.filter(owner=self.owner).values_list('post', flat=True)), [posts[0].pk])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_trim_command(self):
+        self.follow(self.owner, self.vet)
+        posts = [self.post(self.owner) for _ in range(5)]
+        # Left behind by an unfollow racing a fan-out
+        TimelineEntry.objects.create(owner=self.owner, post=self.post(self.stranger), author=self.stranger.user, created_at=self.now)
+
+        out = StringIO()
+        call_command('trim_timelines', stdout=out)
+
+        self.assertIn('Trimmed 2 old and 1 unfollowed', out.getvalue())
+        self.assertEqual(self.home(self.owner), posts[:3])
@@ -0,0 +1,194 @@
+import hashlib
+import shutil
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from PIL import Image
+from core.models import Profile, Post, Pet
+
+MEDIA_ROOT = tempfile.mkdtemp()
+BOUNDARY = 'PetPawtnerBoundary'
+MB = 2 ** 20
+# Peak Python allocations allowed while a large upload is handled
+MEMORY_BUDGET = 8 * MB
+
+
+def picture(fmt='JPEG', size=(40, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+class GeneratedBody:
+    """
+    Multipart body produced on the fly while the request reads it, so the
+    test itself never builds a multi-hundred-MB payload in memory.
+    The file is an image followed by zero padding up to file_size bytes.
+    """
+    def __init__(self, image, file_size, caption='Big'):
+        self.head = (
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="caption"\r\n\r\n{caption}\r\n'
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="image_upload"; filename="big.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'
+        ).encode() + image
+        self.padding = file_size - len(image)
+        self.tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+        self.length = len(self.head) + self.padding + len(self.tail)
+        self.position = 0
+        self.sha256 = hashlib.sha256(image)
+        zeros = bytes(MB)
+        for _ in range(self.padding // MB):
+            self.sha256.update(zeros)
+        self.sha256.update(bytes(self.padding % MB))
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length - self.position
+        size = min(size, self.length - self.position)
+        start, end = self.position, self.position + size
+        self.position = end
+
+        chunk = []
+        padding_start = len(self.head)
+        tail_start = padding_start + self.padding
+        if start < padding_start:
+            chunk.append(self.head[start:min(end, padding_start)])
+        if end > padding_start and start < tail_start:
+            chunk.append(bytes(min(end, tail_start) - max(start, padding_start)))
+        if end > tail_start:
+            chunk.append(self.tail[max(start - tail_start, 0):end - tail_start])
+        return b''.join(chunk)
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImageUploadTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.profile = Profile.objects.create(user=self.user)
+        self.client.login(username='testuser', password='testpassword')
+
+    def errors(self, response):
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def stream(self, body):
+        """
+        Post a generated body through the test client and return the response
+        and the peak memory allocated while it was handled
+        """
+        tracemalloc.start()
+        try:
+            response = self.client.generic(
+                'POST', reverse('post'),
+                CONTENT_TYPE=f'multipart/form-data; boundary={BOUNDARY}',
+                CONTENT_LENGTH=str(body.length),
+                **{'wsgi.input': body},
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return response, peak
+
+    def test_image_is_hashed_while_streamed(self):
+        content = picture()
+        self.client.post(reverse('post'), {
+            'image_upload': SimpleUploadedFile('dog.jpg', content, content_type='image/jpeg'),
+            'caption': 'Dog',
+        })
+
+        post = Post.objects.get()
+        self.assertEqual(post.image.name.split('/')[-1], f'{hashlib.sha256(content).hexdigest()}.jpg')
+
+    def test_every_accepted_format(self):
+        for fmt in ('PNG', 'GIF', 'WEBP'):
+            with self.subTest(fmt=fmt):
+                response = self.client.post(reverse('post'), {
+                    'image_upload': SimpleUploadedFile(f'pet.{fmt.lower()}', picture(fmt)),
+                    'caption': fmt,
+                })
+                self.assertEqual(self.errors(response)[-1], 'Post created successfully!')
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_file_that_is_not_an_image_is_rejected(self):
+        response = self.client.post(reverse('post'), {
+            'image_upload': SimpleUploadedFile('dog.jpg', b'#!/bin/sh\necho not an image\n', content_type='image/jpeg'),
+            'caption': 'Dog',
+        })
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(self.errors(response), ['Only JPEG, PNG, GIF and WebP images can be uploaded.'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_truncated_image_is_rejected(self):
+        response = self.client.post(reverse('post'), {
+            'image_upload': SimpleUploadedFile('dog.png', picture('PNG')[:14]),
+            'caption': 'Dog',
+        })
+
+        self.assertEqual(self.errors(response), ['Only JPEG, PNG, GIF and WebP images can be uploaded.'])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(MAX_UPLOAD_PIXELS=1000)
+    def test_too_many_pixels_is_rejected(self):
+        response = self.client.post(reverse('post'), {
+            'image_upload': SimpleUploadedFile('dog.jpg', picture(size=(40, 30))),
+            'caption': 'Dog',
+        })
+
+        self.assertEqual(self.errors(response), ['Images must have at most 1,000 pixels.'])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(MAX_UPLOAD_SIZE=MB)
+    def test_pet_and_profile_images_are_checked(self):
+        big = picture() + bytes(2 * MB)
+        response = self.client.post(reverse('add_pets'), {
+            'name': 'Rex', 'breed': 'Lab', 'age': 2, 'bio': '', 'location': '',
+            'profileimg': SimpleUploadedFile('rex.jpg', big),
+        })
+        self.assertRedirects(response, reverse('add_pets'), fetch_redirect_response=False)
+        self.assertFalse(Pet.objects.exists())
+
+        response = self.client.post(reverse('settings'), {
+            'role': 'owner', 'bio': 'Hi', 'location': 'Lagos',
+            'profileimg': SimpleUploadedFile('me.jpg', big),
+        })
+        self.assertRedirects(response, reverse('settings'), fetch_redirect_response=False)
+        self.assertEqual(self.errors(response)[-1], 'Images must be smaller than 1.0\xa0MB.')
+
+    def test_oversized_upload_is_stopped_early(self):
+        body = GeneratedBody(picture(), 300 * MB)
+        response, peak = self.stream(body)
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(self.errors(response), ['Images must be smaller than 10.0\xa0MB.'])
+        self.assertFalse(Post.objects.exists())
+        # Reading stopped right after the limit, not at the end of the body
+        self.assertLess(body.position, 11 * MB)
+        self.assertLess(peak, MEMORY_BUDGET)
+
+    @override_settings(MAX_UPLOAD_SIZE=512 * MB)
+    def test_large_upload_is_streamed_to_disk(self):
+        body = GeneratedBody(picture(), 300 * MB)
+        response, peak = self.stream(body)
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        post = Post.objects.get()
+        self.assertEqual(post.image.size, 300 * MB)
+        self.assertIn(body.sha256.hexdigest(), post.image.name)
+        self.assertLess(peak, MEMORY_BUDGET)